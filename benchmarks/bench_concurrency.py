@@ -0,0 +1,74 @@
+"""并发更新处理基准：模拟慢速 Telegram API 下的吞吐量
+
+对比 PTB 默认的逐个处理（SimpleUpdateProcessor(1)）与 KeyedUpdateProcessor，
+并校验同一用户的更新始终按到达顺序处理。
+
+用法: python -m benchmarks.bench_concurrency [用户数] [每用户更新数] [API 延迟毫秒]
+"""
+import asyncio
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from telegram.ext import SimpleUpdateProcessor  # noqa: E402
+from bot.concurrency import KeyedUpdateProcessor  # noqa: E402
+
+
+def make_updates(users: int, per_user: int):
+    """按轮询方式交错生成各用户的更新，模拟真实到达顺序"""
+    updates = []
+    for seq in range(per_user):
+        for user_id in range(1, users + 1):
+            updates.append(SimpleNamespace(
+                update_id=len(updates),
+                effective_user=SimpleNamespace(id=user_id),
+                effective_chat=SimpleNamespace(id=user_id),
+                seq=seq,
+            ))
+    return updates
+
+
+async def run(processor, updates, api_delay: float):
+    handled = {}
+
+    async def handler(update):
+        # 模拟一次慢速的 Bot API 调用（例如 send_media_group）
+        await asyncio.sleep(api_delay)
+        handled.setdefault(update.effective_user.id, []).append(update.seq)
+
+    async with processor:
+        started = time.perf_counter()
+        tasks = [
+            asyncio.create_task(processor.process_update(update, handler(update)))
+            for update in updates
+        ]
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+    ordered = all(seqs == sorted(seqs) for seqs in handled.values())
+    return elapsed, ordered
+
+
+async def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    per_user = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    api_delay = (float(sys.argv[3]) if len(sys.argv) > 3 else 100) / 1000
+    updates = make_updates(users, per_user)
+    print(f"{users} 个用户 × {per_user} 条更新，API 延迟 {api_delay * 1000:.0f} ms")
+    print(f"{'处理器':<28} {'耗时(s)':>8} {'更新/秒':>10} {'用户内有序':>10}")
+
+    for name, processor in (
+        ("SimpleUpdateProcessor(1)", SimpleUpdateProcessor(1)),
+        ("KeyedUpdateProcessor(16)", KeyedUpdateProcessor(16)),
+        ("KeyedUpdateProcessor(64)", KeyedUpdateProcessor(64)),
+        ("KeyedUpdateProcessor(256)", KeyedUpdateProcessor(256)),
+    ):
+        elapsed, ordered = await run(processor, updates, api_delay)
+        print(f"{name:<28} {elapsed:>8.2f} {len(updates) / elapsed:>10.1f} {str(ordered):>10}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
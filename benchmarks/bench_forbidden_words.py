@@ -0,0 +1,67 @@
+"""违禁词匹配基准：逐词子串扫描 vs Aho-Corasick 自动机
+
+用法: python -m benchmarks.bench_forbidden_words
+"""
+import random
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bot.forbidden_matcher import build_matcher  # noqa: E402
+
+SIZES = (10, 1_000, 10_000)
+REPEAT = 200
+
+SAMPLE_TEXT = """吃🐔雷报
+老师花名：小红
+联系方式：@example
+时间：2024-05-01 晚上
+地址：某市某区某街道
+花费：800
+样貌身材：和照片差距很大，身材一般
+槽点：迟到半小时，态度敷衍，全程看手机
+经历：整体体验很差，不推荐，大家避雷
+验证留名：匿名网友
+出击证明见评论区（聊天记录或付款记录）
+"""
+
+
+def make_words(count: int, seed: int = 42):
+    """生成随机的中文违禁词表"""
+    rng = random.Random(seed)
+    words = set()
+    while len(words) < count:
+        length = rng.randint(2, 4)
+        words.add(''.join(chr(rng.randint(0x4e00, 0x9fa5)) for _ in range(length)))
+    return sorted(words)
+
+
+def naive_contains(words, text):
+    """旧实现：逐个违禁词做子串扫描"""
+    text = text.lower()
+    found = []
+    for word in words:
+        if word in text:
+            found.append(word)
+    return bool(found)
+
+
+def main():
+    print(f"{'词数':>8} {'逐词扫描(µs)':>14} {'自动机(µs)':>12} {'构建(ms)':>10} {'加速比':>8}")
+    for size in SIZES:
+        words = make_words(size)
+        build_time = timeit.timeit(lambda: build_matcher({"bench": words}), number=1)
+        matcher = build_matcher({"bench": words})
+
+        naive = timeit.timeit(lambda: naive_contains(words, SAMPLE_TEXT), number=REPEAT) / REPEAT
+        automaton = timeit.timeit(lambda: matcher.find_all(SAMPLE_TEXT), number=REPEAT) / REPEAT
+        print(
+            f"{size:>8} {naive * 1e6:>14.1f} {automaton * 1e6:>12.1f} "
+            f"{build_time * 1e3:>10.1f} {naive / automaton:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""本地模拟的 Telegram Bot API 服务（基准测试用）
+
+实现 getUpdates（长轮询 + offset 确认）、getMe、sendMessage、sendMediaGroup、
+answerCallbackQuery，其余方法一律返回成功。可配置每次调用的延迟和 429 注入比例，
+并记录每个方法的调用次数及发往私聊的回复，供负载生成器计算端到端延迟。
+
+单独运行: python -m benchmarks.fake_bot_api --port 8081 --delay-ms 50 --error-rate 0.05
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import Counter, defaultdict, deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from aiohttp import web
+
+BOT_USER = {"id": 10000, "is_bot": True, "first_name": "SubmitBot", "username": "submit_bench_bot"}
+
+
+class FakeBotApi:
+    """Bot API 模拟服务"""
+
+    def __init__(self, delay: float = 0.0, error_rate: float = 0.0, retry_after: int = 1, seed: int = 0):
+        self.delay = delay
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self._random = random.Random(seed)
+
+        self._updates: Deque[Dict[str, Any]] = deque()
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._new_update = asyncio.Event()
+
+        self.calls: Counter = Counter()
+        self.throttled: Counter = Counter()
+        self.channel_posts = 0
+        # 发往私聊的回复: chat_id -> [时间戳]
+        self.replies: Dict[int, List[float]] = defaultdict(list)
+        self.on_reply: Optional[Callable[[int, float], None]] = None
+
+        self.app = web.Application()
+        self.app.router.add_route('*', '/bot{token}/{method}', self.handle)
+        self._runner: Optional[web.AppRunner] = None
+
+    # 更新注入
+
+    def push_update(self, payload: Dict[str, Any]) -> int:
+        """加入一个待 getUpdates 拉取的更新（payload 不含 update_id）"""
+        update_id = next(self._update_ids)
+        self._updates.append({"update_id": update_id, **payload})
+        self._new_update.set()
+        return update_id
+
+    @property
+    def pending_updates(self) -> int:
+        return len(self._updates)
+
+    # HTTP 服务
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8081) -> str:
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        return f"http://{host}:{port}"
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    @staticmethod
+    async def _params(request: web.Request) -> Dict[str, Any]:
+        params: Dict[str, Any] = dict(request.query)
+        if request.content_type == 'application/json':
+            params.update(await request.json())
+        elif request.can_read_body:
+            form = await request.post()
+            for key, value in form.items():
+                if isinstance(value, str):
+                    try:
+                        params[key] = json.loads(value)
+                    except ValueError:
+                        params[key] = value
+        return params
+
+    @staticmethod
+    def _ok(result: Any) -> web.Response:
+        return web.json_response({"ok": True, "result": result})
+
+    def _message(self, chat_id, **fields) -> Dict[str, Any]:
+        try:
+            chat_id = int(chat_id)
+        except (TypeError, ValueError):
+            pass
+        chat_type = 'private' if isinstance(chat_id, int) and chat_id > 0 else 'channel'
+        return {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": chat_type},
+            "from": BOT_USER,
+            **fields,
+        }
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        params = await self._params(request)
+        self.calls[method] += 1
+
+        if method == 'getUpdates':
+            return self._ok(await self._get_updates(params))
+
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if method.startswith('send') and self.error_rate and self._random.random() < self.error_rate:
+            self.throttled[method] += 1
+            return web.json_response({
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }, status=429)
+
+        if method == 'getMe':
+            return self._ok(BOT_USER)
+        if method == 'sendMessage':
+            chat_id = params.get('chat_id')
+            self._record_send(chat_id)
+            return self._ok(self._message(chat_id, text=params.get('text', '')))
+        if method == 'sendMediaGroup':
+            chat_id = params.get('chat_id')
+            self._record_send(chat_id)
+            media = params.get('media') or []
+            group_id = str(next(self._message_ids))
+            return self._ok([
+                self._message(chat_id, media_group_id=group_id, photo=[{
+                    "file_id": item.get('media', 'file'), "file_unique_id": f"u{group_id}{index}",
+                    "width": 1, "height": 1,
+                }])
+                for index, item in enumerate(media)
+            ])
+        return self._ok(True)
+
+    def _record_send(self, chat_id):
+        try:
+            chat_id = int(chat_id)
+        except (TypeError, ValueError):
+            self.channel_posts += 1
+            return
+        if chat_id > 0:
+            now = time.perf_counter()
+            self.replies[chat_id].append(now)
+            if self.on_reply:
+                self.on_reply(chat_id, now)
+        else:
+            self.channel_posts += 1
+
+    async def _get_updates(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        offset = int(params.get('offset') or 0)
+        limit = int(params.get('limit') or 100)
+        timeout = float(params.get('timeout') or 0)
+
+        # offset 之前的更新视为已确认
+        while self._updates and self._updates[0]['update_id'] < offset:
+            self._updates.popleft()
+        if not self._updates and timeout:
+            self._new_update.clear()
+            try:
+                await asyncio.wait_for(self._new_update.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return list(itertools.islice(self._updates, limit))
+
+
+async def _serve(args):
+    api = FakeBotApi(delay=args.delay_ms / 1000, error_rate=args.error_rate)
+    url = await api.start(args.host, args.port)
+    print(f"模拟 Bot API 已启动: {url}（设置 TELEGRAM_API_BASE_URL={url}）")
+    while True:
+        await asyncio.sleep(3600)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟 Telegram Bot API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--delay-ms', type=float, default=0, help="每次 API 调用的延迟")
+    parser.add_argument('--error-rate', type=float, default=0, help="send* 方法返回 429 的比例")
+    asyncio.run(_serve(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
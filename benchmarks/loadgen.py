@@ -0,0 +1,309 @@
+"""端到端负载测试：本地模拟 Bot API + 真实的 create_bot 处理链路
+
+生成（或从 JSONL 文件回放）更新流，经模拟服务的 getUpdates 交给机器人处理，
+统计投稿吞吐、端到端回复延迟、handle_submission 延迟分位数和进程峰值 RSS。
+
+用法:
+    python -m benchmarks.loadgen --users 200 --reports 2 --albums 1 --callbacks 1 --spam 1
+    python -m benchmarks.loadgen --replay updates.jsonl --delay-ms 30 --error-rate 0.02
+
+回放文件每行一个 Telegram Update JSON（可省略 update_id）。
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Any, Deque, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.fake_bot_api import FakeBotApi  # noqa: E402
+
+SPAM_BURST = 15
+
+REPORT_TEMPLATE = """吃🐔雷报
+老师花名：{name}
+联系方式：@{contact}
+时间：2024-05-{day:02d} 晚上
+地址：{city}市{district}区{street}街道{number}号
+花费：{price}
+样貌身材：{look}
+槽点：{complaint}
+经历：{story}
+验证留名：{signer}
+出击证明见评论区（聊天记录或付款记录）"""
+
+RECOMMEND_TEMPLATE = """网友分享
+老师花名：{name}
+联系方式：@{contact}
+价格：{price}
+地址：{city}市{district}区{street}街道{number}号
+服务：{service}
+评价：{story}"""
+
+_WORDS = "清新 热情 准时 耐心 专业 一般 迟到 敷衍 细致 温柔 冷淡 健谈 安静 爽快 贴心 认真".split()
+_PLACES = "东城 西城 南山 北湖 江岸 河口 新港 老街 长安 光明".split()
+
+
+def _random_text(rng: random.Random, template: str) -> str:
+    """生成内容互不相同的投稿，避免被去重拦截"""
+    return template.format(
+        name=''.join(rng.choice("小大阿晓") + rng.choice("红兰雪月花玉婷娜")),
+        contact=f"user{rng.getrandbits(32):x}",
+        day=rng.randint(1, 28),
+        city=rng.choice(_PLACES), district=rng.choice(_PLACES), street=rng.choice(_PLACES),
+        number=rng.randint(1, 999),
+        price=rng.randint(300, 3000),
+        look=' '.join(rng.sample(_WORDS, 3)),
+        complaint=' '.join(rng.sample(_WORDS, 4)),
+        service=' '.join(rng.sample(_WORDS, 3)),
+        story=' '.join(rng.sample(_WORDS, 8)) + f" #{rng.getrandbits(40):x}",
+        signer=f"网友{rng.randint(1, 99999)}",
+    )
+
+
+class ScenarioBuilder:
+    """生成合成更新流"""
+
+    def __init__(self, seed: int = 1):
+        self.rng = random.Random(seed)
+        self._message_id = 0
+        self._group_id = 0
+
+    def _user(self, user_id: int) -> Dict[str, Any]:
+        return {"id": user_id, "is_bot": False, "first_name": f"u{user_id}"}
+
+    def _message(self, user_id: int, **fields) -> Dict[str, Any]:
+        self._message_id += 1
+        return {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": self._user(user_id),
+            **fields,
+        }
+
+    def start_command(self, user_id: int) -> Dict[str, Any]:
+        return {"message": self._message(
+            user_id, text="/start", entities=[{"type": "bot_command", "offset": 0, "length": 6}]
+        )}
+
+    def callback(self, user_id: int) -> Dict[str, Any]:
+        return {"callback_query": {
+            "id": str(self.rng.getrandbits(48)),
+            "from": self._user(user_id),
+            "chat_instance": str(user_id),
+            "data": self.rng.choice(["boom_report", "recommend"]),
+            "message": self._message(user_id, text="选择下方按钮获取对应模板"),
+        }}
+
+    def text_report(self, user_id: int) -> Dict[str, Any]:
+        template = self.rng.choice([REPORT_TEMPLATE, RECOMMEND_TEMPLATE])
+        return {"message": self._message(user_id, text=_random_text(self.rng, template))}
+
+    def album(self, user_id: int, size: int) -> List[Dict[str, Any]]:
+        self._group_id += 1
+        caption = _random_text(self.rng, RECOMMEND_TEMPLATE)
+        updates = []
+        for index in range(size):
+            file_uid = f"f{self.rng.getrandbits(64):x}"
+            fields = {
+                "media_group_id": f"g{self._group_id}",
+                "photo": [{"file_id": f"id-{file_uid}", "file_unique_id": file_uid, "width": 800, "height": 600}],
+            }
+            if index == 0:
+                fields["caption"] = caption
+            updates.append({"message": self._message(user_id, **fields)})
+        return updates
+
+    def build(self, users: int, reports: int, albums: int, callbacks: int, spam: int):
+        """返回 [(更新, 是否期望一条私聊回复, 是否为投稿)]，各用户的更新交错排列"""
+        per_user: List[List[tuple]] = []
+        for user_id in range(1, users + 1):
+            stream = [(self.start_command(user_id), True, False)]
+            stream += [(self.callback(user_id), True, False) for _ in range(callbacks)]
+            stream += [(self.text_report(user_id), True, True) for _ in range(reports)]
+            for _ in range(albums):
+                pieces = self.album(user_id, self.rng.randint(2, 10))
+                stream.append((pieces[0], True, True))
+                stream += [(piece, False, False) for piece in pieces[1:]]
+            per_user.append(stream)
+        for offset in range(spam):
+            # 刷屏用户：短时间内连续投稿，超过限额的会收到限流提示
+            user_id = users + 1 + offset
+            per_user.append([(self.text_report(user_id), True, True) for _ in range(SPAM_BURST)])
+
+        merged = []
+        while any(per_user):
+            for stream in per_user:
+                if stream:
+                    merged.append(stream.pop(0))
+        return merged
+
+
+def load_replay(path: str):
+    """读取回放文件，私聊消息（相册只计第一条）和回调都期望一条回复"""
+    seen_groups = set()
+    merged = []
+    with open(path, encoding='utf-8') as handle:
+        for line in handle:
+            if not line.strip():
+                continue
+            update = json.loads(line)
+            update.pop('update_id', None)
+            message = update.get('message') or {}
+            group_id = message.get('media_group_id')
+            expects = not group_id or group_id not in seen_groups
+            if group_id:
+                seen_groups.add(group_id)
+            is_submission = expects and bool(message) and not (message.get('text') or '').startswith('/')
+            merged.append((update, expects, is_submission))
+    return merged
+
+
+def _histogram_quantile(child, quantile: float) -> float:
+    """由直方图分桶估计分位数（取所在分桶上界）"""
+    target = quantile * child.count
+    cumulative = 0
+    for bound, count in zip(child.bounds + (float('inf'),), child.counts):
+        cumulative += count
+        if cumulative >= target:
+            return bound
+    return float('inf')
+
+
+def _percentile(values: List[float], quantile: float) -> float:
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(quantile * len(ordered)))]
+
+
+def _configure_environment(args, api_url: str, workdir: str):
+    """必须在导入 config/bot 之前设置环境变量"""
+    os.environ.setdefault('TELEGRAM_BOT_TOKEN', '123456:BENCHMARK')
+    os.environ['TELEGRAM_API_BASE_URL'] = api_url
+    os.environ.setdefault('BOOM_CHANNEL_ID', '-1001')
+    os.environ.setdefault('RECORDING_CHANNEL_ID', '-1002')
+    os.environ['BOT_MODE'] = 'polling'
+    os.environ['SUBMISSION_DB'] = str(Path(workdir) / 'submissions.db')
+    os.environ['STATS_PATH'] = str(Path(workdir) / 'stats.json')
+    # 不发送"已收到"回复，回复延迟按最终结果计算
+    os.environ.setdefault('PIPELINE_ACK', 'false')
+
+    import config
+    if args.unthrottled:
+        # 放开出站限流，测量机器人自身的处理能力而非 Telegram 的配额
+        config.SEND_RATE.update({
+            'CHANNEL_PER_MINUTE': 10 ** 9, 'CHANNEL_BURST': 10 ** 6,
+            'PRIVATE_PER_SECOND': 10 ** 9, 'GLOBAL_PER_SECOND': 10 ** 9,
+        })
+    config.SEND_RATE['RETRY_BASE_DELAY'] = 0.05
+
+
+async def run(args):
+    api = FakeBotApi(delay=args.delay_ms / 1000, error_rate=args.error_rate, retry_after=args.retry_after)
+    api_url = await api.start(port=args.port)
+    workdir = tempfile.mkdtemp(prefix='submit_bot_bench_')
+    _configure_environment(args, api_url, workdir)
+
+    from bot import bot_state, create_bot, stop_bot
+    from bot import metrics
+    from bot.tenants import DEFAULT_TENANT
+
+    if args.replay:
+        stream = load_replay(args.replay)
+    else:
+        stream = ScenarioBuilder(args.seed).build(args.users, args.reports, args.albums, args.callbacks, args.spam)
+    expected = sum(1 for _, expects, _ in stream if expects)
+    submissions = sum(1 for _, _, is_submission in stream if is_submission)
+
+    # 按用户记录每条期望回复的注入时间，收到回复时按先进先出配对
+    injected: Dict[int, Deque[float]] = defaultdict(deque)
+    latencies: List[float] = []
+    done = asyncio.Event()
+
+    def on_reply(chat_id: int, now: float):
+        queue = injected.get(chat_id)
+        if queue:
+            latencies.append(now - queue.popleft())
+        if len(latencies) >= expected:
+            done.set()
+
+    api.on_reply = on_reply
+    started_bot = time.perf_counter()
+    await create_bot()
+    startup = time.perf_counter() - started_bot
+
+    started = time.perf_counter()
+    for index, (update, expects, _) in enumerate(stream):
+        if expects:
+            chat = (update.get('message') or update.get('callback_query', {}).get('message') or {}).get('chat', {})
+            injected[chat.get('id')].append(time.perf_counter())
+        api.push_update(update)
+        if args.rate and index % 10 == 9:
+            await asyncio.sleep(10 / args.rate)
+
+    try:
+        await asyncio.wait_for(done.wait(), timeout=args.timeout)
+    except asyncio.TimeoutError:
+        print(f"⚠️  超时：收到 {len(latencies)}/{expected} 条回复")
+    elapsed = time.perf_counter() - started
+
+    await stop_bot()
+    await api.stop()
+
+    handle = metrics.HANDLE_SUBMISSION_SECONDS.labels(DEFAULT_TENANT)
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    # 标签为 (租户, 结果)，按结果汇总
+    outcomes: Dict[str, int] = {}
+    for (_tenant, outcome), child in metrics.SUBMISSIONS._children.items():
+        outcomes[outcome] = outcomes.get(outcome, 0) + int(child.value)
+
+    print(f"更新数 {len(stream)}，其中投稿 {submissions}，期望回复 {expected}，启动耗时 {startup:.2f}s")
+    print(f"总耗时 {elapsed:.2f}s，投稿吞吐 {submissions / elapsed:.1f} 条/秒，频道发帖 {api.channel_posts} 次")
+    print(f"端到端回复延迟  p50 {_percentile(latencies, 0.5) * 1000:.1f} ms  "
+          f"p99 {_percentile(latencies, 0.99) * 1000:.1f} ms")
+    print(f"handle_submission 延迟（分桶上界）  p50 ≤ {_histogram_quantile(handle, 0.5) * 1000:.2f} ms  "
+          f"p99 ≤ {_histogram_quantile(handle, 0.99) * 1000:.2f} ms  （共 {handle.count} 次）")
+    print(f"投稿结果 {outcomes}")
+    print(f"API 调用 {dict(api.calls)}，注入 429 {dict(api.throttled)}")
+    for name, request in (bot_state.requests or {}).items():
+        pool = request.stats()
+        print(f"连接池 {name}: 请求 {pool['requests']}，新建连接 {pool['new_connections']}，"
+              f"复用 {pool['reused_connections']}，等待连接 平均 {pool['pool_wait_avg'] * 1000:.2f} ms "
+              f"最大 {pool['pool_wait_max'] * 1000:.2f} ms")
+    if bot_state.stats:
+        print(bot_state.stats.render())
+    print(f"峰值 RSS {peak_rss_mb:.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="submit_bot 端到端负载测试")
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--reports', type=int, default=2, help="每个用户的文字投稿数")
+    parser.add_argument('--albums', type=int, default=1, help="每个用户的相册投稿数")
+    parser.add_argument('--callbacks', type=int, default=1, help="每个用户的模板按钮点击数")
+    parser.add_argument('--spam', type=int, default=1, help=f"刷屏用户数（每人连续 {SPAM_BURST} 条）")
+    parser.add_argument('--replay', help="回放 JSONL 更新文件，替代合成场景")
+    parser.add_argument('--rate', type=float, default=0, help="注入速率（更新/秒），0 表示一次性注入")
+    parser.add_argument('--delay-ms', type=float, default=0, help="模拟 API 调用延迟")
+    parser.add_argument('--error-rate', type=float, default=0, help="send* 返回 429 的比例")
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--throttled', dest='unthrottled', action='store_false',
+                        help="保留真实的出站限流配置（默认放开）")
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--timeout', type=float, default=120)
+    parser.add_argument('--seed', type=int, default=1)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
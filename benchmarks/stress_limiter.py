@@ -0,0 +1,68 @@
+"""限流器内存压力测试：100 万个不同用户 ID，模拟数周运行
+
+用法: python -m benchmarks.stress_limiter [用户数]
+"""
+import sys
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bot.limiter import RateLimiter  # noqa: E402
+
+
+class FakeClock:
+    """可手动推进的单调时钟"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def main():
+    total_users = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    days = 21
+    clock = FakeClock()
+    limiter = RateLimiter(max_messages=10, time_window=600, cooldown_time=900,
+                          sweep_interval=300, clock=clock)
+
+    tracemalloc.start()
+    users_per_day = total_users // days
+    peak_entries = 0
+    baseline = tracemalloc.get_traced_memory()[0]
+    step = 86400 / users_per_day
+
+    print(f"{'天数':>4} {'活跃记录':>10} {'当前内存(MB)':>14} {'峰值内存(MB)':>14}")
+    user_id = 0
+    for day in range(1, days + 1):
+        for _ in range(users_per_day):
+            user_id += 1
+            # 每个用户一天内只出现一次，随后永不再来
+            for _ in range(3):
+                limiter.try_acquire(user_id)
+            clock.now += step
+            peak_entries = max(peak_entries, len(limiter))
+        current, peak = tracemalloc.get_traced_memory()
+        print(f"{day:>4} {len(limiter):>10} {(current - baseline) / 2**20:>14.2f} "
+              f"{(peak - baseline) / 2**20:>14.2f}")
+
+    print(f"共 {user_id} 个用户，最大同时记录 {peak_entries} 条")
+
+    # 突发：所有用户在 5 分钟内同时出现，随后全部空闲
+    burst_step = 300 / total_users
+    for burst_user in range(total_users):
+        limiter.try_acquire(-burst_user - 1)
+        clock.now += burst_step
+    current, peak = tracemalloc.get_traced_memory()
+    print(f"突发 {total_users} 个用户后记录 {len(limiter)} 条，内存 {(current - baseline) / 2**20:.2f} MB")
+
+    clock.now += limiter.TIME_WINDOW + limiter.COOLDOWN_TIME
+    evicted = limiter.sweep()
+    current, _ = tracemalloc.get_traced_memory()
+    print(f"全部空闲后清理 {evicted} 条，剩余 {len(limiter)} 条，内存 {(current - baseline) / 2**20:.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,89 +1,428 @@
 import asyncio
+import signal
+import time
 from dataclasses import dataclass
-from typing import List, Optional
-from telegram.ext import Application, CallbackQueryHandler
-from fastapi import FastAPI
-from config import TELEGRAM_BOT_TOKEN
-from utils import logger, reset_initialization
+from typing import Dict, List, Optional
+from telegram import Update
+from telegram.ext import Application, CallbackQueryHandler, TypeHandler
+from config import (
+    BOT_MODE, WEBHOOK_URL, DROP_PENDING_UPDATES, CONCURRENT_UPDATES, TELEGRAM_API_BASE_URL,
+    STATE_BACKEND, SHUTDOWN_TIMEOUT, HTTP_API, HTTP_UPDATES, STATS, SUBMISSION_STORE,
+)
+from utils import logger, process_uptime, reset_initialization
 from bot.bot_instance import set_application, get_bot
 from bot.commands import register_commands
-from bot.handlers import register_handlers
+from bot.runtime import build_snapshot, reload_snapshot, remove_listener, set_snapshot
+from bot.handlers import SubmissionHandler, register_handlers
 from bot.callbacks import handle_callback_query
-app = FastAPI()
+from bot.sender import OutboundScheduler
+from bot.health import HealthMonitor
+from bot.store import SubmissionStore
+from bot.state_backend import Lease, StateBackend, create_state_backend
+from bot.transport import InstrumentedHTTPXRequest
+from bot.concurrency import KeyedUpdateProcessor
+from bot.admission import AdmissionController, critical
+from bot.debug import loop_lag_monitor
+from bot.offsets import UpdateOffsetTracker
+from bot.stats import SubmissionStats
+from bot.tenants import DEFAULT_TENANT, TenantConfig, default_tenant
+from bot import metrics
 
 
 @dataclass
 class BotState:
+    tenant: Optional[TenantConfig] = None
     application: Optional[Application] = None
+    scheduler: Optional[OutboundScheduler] = None
+    health: Optional[HealthMonitor] = None
+    store: Optional[SubmissionStore] = None
+    submission_handler: Optional[SubmissionHandler] = None
+    state: Optional[StateBackend] = None
+    poll_lease: Optional[Lease] = None
+    instance_lease: Optional[Lease] = None
+    offsets: Optional[UpdateOffsetTracker] = None
+    admission: Optional[AdmissionController] = None
+    requests: Optional[Dict[str, InstrumentedHTTPXRequest]] = None
+    stats: Optional[SubmissionStats] = None
+    accepting: bool = False  # 是否接收新的 webhook 更新
     tasks: List[asyncio.Task] = None
     
     def __post_init__(self):
         if self.tasks is None:
             self.tasks = []
 
+# 各租户的状态，bot_state 为默认租户（只运行一个机器人时即为全部）
 bot_state = BotState()
+bot_states: Dict[str, BotState] = {DEFAULT_TENANT: bot_state}
 
-async def create_bot():
-    """创建并初始化bot"""
+# 所有租户共用：发送 API 调用的连接池、准入控制与进程级后台任务
+_api_request: Optional[InstrumentedHTTPXRequest] = None
+_admission: Optional[AdmissionController] = None
+shared_tasks: List[asyncio.Task] = []
+
+
+def tenant_states() -> Dict[str, BotState]:
+    """已创建机器人的租户"""
+    return {tenant_id: state for tenant_id, state in bot_states.items() if state.application is not None}
+
+
+def managed_tasks() -> List[asyncio.Task]:
+    """进程级与各租户的后台任务"""
+    return shared_tasks + [task for state in bot_states.values() for task in state.tasks]
+
+
+def _shared_api_request() -> InstrumentedHTTPXRequest:
+    global _api_request
+    if _api_request is None:
+        _api_request = InstrumentedHTTPXRequest.from_settings('api', HTTP_API)
+    return _api_request
+
+
+def _shared_admission() -> AdmissionController:
+    global _admission
+    if _admission is None:
+        _admission = AdmissionController()
+    return _admission
+
+
+async def create_bot(tenant: Optional[TenantConfig] = None):
+    """创建并初始化一个租户的bot，tenant 为空时使用默认租户"""
+    started = time.monotonic()
+    tenant = tenant or default_tenant()
+    state = bot_states.setdefault(tenant.id, BotState())
+    state.tenant = tenant
     try:
         # 重置初始化状态
         reset_initialization()
         
-        # 创建新的Application实例
-        bot_state.application = (
+        # 创建新的Application实例，不同用户的更新并发处理，webhook 模式不需要 Updater
+        state.offsets = UpdateOffsetTracker()
+        # API 调用使用所有租户共用的连接池；getUpdates 长轮询始终占用一个连接，每个租户单独一个小连接池
+        state.requests = {
+            'api': _shared_api_request(),
+            'updates': InstrumentedHTTPXRequest.from_settings('updates', HTTP_UPDATES),
+        }
+        builder = (
             Application.builder()
-            .token(TELEGRAM_BOT_TOKEN)
-            .build()
+            .token(tenant.token)
+            .request(state.requests['api'])
+            .get_updates_request(state.requests['updates'])
+            .concurrent_updates(KeyedUpdateProcessor(CONCURRENT_UPDATES, state.offsets))
         )
+        if TELEGRAM_API_BASE_URL:
+            api_url = TELEGRAM_API_BASE_URL.rstrip('/')
+            builder = builder.base_url(f"{api_url}/bot").base_file_url(f"{api_url}/file/bot")
+        if BOT_MODE == 'webhook':
+            builder = builder.updater(None)
+        state.application = builder.build()
+        # 共用连接池按 Bot 地址区分各租户的 API 调用耗时
+        for request in state.requests.values():
+            request.add_tenant(state.application.bot.base_url, tenant.id)
+        # 命令与回调按 bot_data 中的租户 ID 取各自的快照
+        state.application.bot_data['tenant'] = tenant.id
+
+        # 构建违禁词匹配器与投稿类型注册表，配置有误时启动失败
+        set_snapshot(build_snapshot(tenant=tenant))
 
         # 设置全局实例并立即标记为已初始化
-        set_application(bot_state.application)
+        set_application(state.application, tenant.id)
 
         # 初始化机器人
-        await bot_state.application.initialize()
+        await state.application.initialize()
 
-        # 注册所有处理器
-        register_commands(bot_state.application)
-        bot_state.application.add_handler(CallbackQueryHandler(handle_callback_query))
-        register_handlers(bot_state.application)
-        logger.info("所有处理器注册完成")
+        # 注册所有处理器，最高优先级组记录最近处理的更新供健康检查使用
+        if state.health is None:
+            state.health = HealthMonitor(state)
+        state.application.add_handler(
+            TypeHandler(Update, state.health.record_update, block=False), group=-1
+        )
+        # 命令与按钮回调始终放行，投稿在负载过高时按优先级降载；并发上限由所有租户共享
+        state.admission = _shared_admission()
+        register_commands(state.application, state.admission)
+        state.application.add_handler(
+            CallbackQueryHandler(state.admission.guard(handle_callback_query, critical))
+        )
+        state.scheduler = OutboundScheduler()
+        metrics.OUTBOUND_PENDING.set_function(lambda: state.scheduler.pending, tenant.id)
+        metrics.OUTBOUND_SENT.set_function(lambda: state.scheduler.sent_count, tenant.id)
+        metrics.OUTBOUND_FAILED.set_function(lambda: state.scheduler.failed_count, tenant.id)
+        metrics.OUTBOUND_RETRIES.set_function(lambda: state.scheduler.retry_count, tenant.id)
+        metrics.COLD_START_SECONDS.set_function(lambda: state.health.cold_start or 0, tenant.id)
+        state.state = create_state_backend(tenant.data_path('state.db', STATE_BACKEND['PATH']))
+        await state.state.start()
+        # 存活租约：共享存储中本实例写入的未送达投稿只在本实例退出后才会被其他实例重放
+        state.instance_lease = state.state.instance_lease(STATE_BACKEND['LEASE_TTL'])
+        await state.instance_lease.acquire()
+        if state.state.shared and not any(
+            task.get_name() == 'instance_lease' and not task.done() for task in state.tasks
+        ):
+            state.tasks.append(asyncio.create_task(_instance_lease_loop(state), name='instance_lease'))
+        state.store = SubmissionStore(
+            tenant.data_path('submissions.db', SUBMISSION_STORE['PATH']), owner=state.state.instance_id,
+        )
+        await state.store.start()
+        # 读回上次处理到的更新位置，重复推送的更新直接跳过
+        state.offsets.store = state.store
+        await state.offsets.load()
+        # 投稿统计，/stats 命令从 bot_data 读取；共享后端时各实例的计数累加到共享库
+        shared_stats = state.state.stats_store()
+        state.stats = SubmissionStats(
+            path=None if shared_stats else tenant.data_path('stats.json', STATS['PATH']), shared=shared_stats,
+        )
+        state.stats.load()
+        state.application.bot_data['stats'] = state.stats
+        state.submission_handler = register_handlers(
+            state.application, state.scheduler, state.store, state.state,
+            state.admission, state.stats, tenant.id,
+        )
+        state.submission_handler.start()
+        logger.info(f"租户 {tenant.id} 的所有处理器注册完成")
         
-        # 启动机器人和轮询
-        await bot_state.application.start()
-        await bot_state.application.updater.start_polling(drop_pending_updates=True)
-        logger.info("机器人初始化完成并开始轮询")
+        # 启动机器人；webhook 模式下更新由 FastAPI 路由写入 update_queue
+        await state.application.start()
+        state.accepting = True
+        if BOT_MODE == 'webhook':
+            logger.info(f"租户 {tenant.id} 的机器人初始化完成，等待 webhook 推送更新")
+        else:
+            # 多个实例共享状态时只有持有租约的实例轮询，getUpdates 不允许并发调用
+            state.poll_lease = state.state.lease('poller', STATE_BACKEND['LEASE_TTL'])
+            await _update_polling(state)
+            if state.state.shared and not any(
+                task.get_name() == 'poll_lease' and not task.done() for task in state.tasks
+            ):
+                state.tasks.append(asyncio.create_task(_poll_lease_loop(state), name='poll_lease'))
 
-        return bot_state.application
+        # 重放已退出实例（包括本进程的上一次运行）未送达的投稿
+        if not any(task.get_name() == 'replay' and not task.done() for task in state.tasks):
+            state.tasks.append(asyncio.create_task(_replay_loop(state), name='replay'))
+
+        # 收到 SIGHUP 时热更新所有租户的违禁词、限流参数与投稿类型
+        _install_reload_signal()
+
+        if not any(task.get_name() == 'update_offsets' and not task.done() for task in state.tasks):
+            state.tasks.append(asyncio.create_task(state.offsets.run(), name='update_offsets'))
+
+        if not any(task.get_name() == 'stats_snapshot' and not task.done() for task in state.tasks):
+            state.tasks.append(asyncio.create_task(state.stats.run(), name='stats_snapshot'))
+
+        # 持续测量事件循环延迟，/debug/loop-lag 与 /metrics 读取；所有租户共用一个事件循环
+        if not any(task.get_name() == 'loop_lag' and not task.done() for task in shared_tasks):
+            shared_tasks.append(asyncio.create_task(loop_lag_monitor.run(), name='loop_lag'))
+
+        # 后台探测 Bot 状态，健康检查接口只读缓存
+        if not any(task.get_name() == 'health_probe' and not task.done() for task in state.tasks):
+            state.tasks.append(asyncio.create_task(state.health.run(), name='health_probe'))
+
+        logger.info(
+            f"启动完成: 租户 {tenant.id} 的 create_bot 耗时 {time.monotonic() - started:.2f} 秒，"
+            f"进程已运行 {process_uptime():.2f} 秒"
+        )
+        return state.application
 
     except Exception as e:
-        logger.error(f"创建bot实例时出错: {e}", exc_info=True)
+        logger.error(f"创建租户 {tenant.id} 的bot实例时出错: {e}", exc_info=True)
         raise
 
-async def start_bot():
+async def _update_polling(state: BotState):
+    """续期轮询租约，并按是否持有租约启动或停止轮询"""
+    updater = state.application.updater
+    if await state.poll_lease.acquire():
+        if not updater.running:
+            await updater.start_polling(drop_pending_updates=DROP_PENDING_UPDATES)
+            logger.info(f"租户 {state.tenant.id} 的机器人初始化完成并开始轮询（实例 {state.state.instance_id}）")
+    elif updater.running:
+        await updater.stop()
+        logger.warning(f"租户 {state.tenant.id} 的轮询租约已被其他实例持有，停止轮询")
+    else:
+        logger.info(f"其他实例正在轮询租户 {state.tenant.id}，本实例只处理共享状态")
+
+
+async def _poll_lease_loop(state: BotState):
+    """定期续期轮询租约，主实例退出后由其他实例接管"""
+    while True:
+        await asyncio.sleep(STATE_BACKEND['LEASE_TTL'] / 3)
+        try:
+            await _update_polling(state)
+        except Exception as e:
+            logger.error(f"更新轮询租约时出错: {e}", exc_info=True)
+
+
+async def _instance_lease_loop(state: BotState):
+    """定期续期本实例的存活租约"""
+    while True:
+        await asyncio.sleep(STATE_BACKEND['LEASE_TTL'] / 3)
+        try:
+            await state.instance_lease.acquire()
+        except Exception as e:
+            logger.error(f"续期实例存活租约时出错: {e}", exc_info=True)
+
+
+async def _replay_loop(state: BotState):
+    """启动时重放一次未送达的投稿；共享状态时定期检查，接管退出实例的投稿"""
+    while True:
+        try:
+            await _replay_once(state)
+        except Exception as e:
+            logger.error(f"重放未送达的投稿时出错: {e}", exc_info=True)
+        if not state.state.shared:
+            return
+        await asyncio.sleep(SUBMISSION_STORE['REPLAY_INTERVAL'])
+
+
+async def _replay_once(state: BotState):
+    """认领并重放未送达的投稿，持有 replay 租约直到这些投稿发送结束"""
+    ttl = STATE_BACKEND['LEASE_TTL']
+    lease = state.state.lease('replay', ttl)
+    if not await lease.acquire():
+        logger.debug("其他实例正在重放未送达的投稿，本实例跳过")
+        return
+    replay = None
+    try:
+        live = await state.state.live_instances()
+        replay = asyncio.ensure_future(state.submission_handler.replay_pending(state.application.bot, live))
+        while not replay.done():
+            await asyncio.wait({replay}, timeout=ttl / 3)
+            if not replay.done():
+                await lease.acquire()
+        replay.result()
+    finally:
+        # 停止时不再等待，已认领的投稿在本实例退出后可被重新认领
+        if replay is not None and not replay.done():
+            replay.cancel()
+        await lease.release()
+
+
+def _install_reload_signal():
+    loop = asyncio.get_running_loop()
+
+    def on_sighup():
+        task = loop.create_task(_reload_on_signal(), name='runtime_reload')
+        shared_tasks.append(task)
+        task.add_done_callback(lambda t: t in shared_tasks and shared_tasks.remove(t))
+
+    try:
+        loop.add_signal_handler(signal.SIGHUP, on_sighup)
+    except (AttributeError, NotImplementedError, RuntimeError, ValueError):
+        # Windows 或非主线程中不支持
+        logger.debug("当前环境不支持 SIGHUP 热更新")
+
+
+async def _reload_on_signal():
+    for tenant_id in tenant_states():
+        try:
+            await reload_snapshot(tenant_id)
+        except Exception as e:
+            logger.error(f"热更新租户 {tenant_id} 的运行时配置失败，继续使用旧配置: {e}", exc_info=True)
+
+
+async def start_bot(tenant: Optional[TenantConfig] = None):
     """启动机器人轮询（如果尚未启动）"""
     try:
-        if not bot_state.application or not bot_state.application.running:  # 增加实例存在性检查
-            bot_state.application = await create_bot()
-            if bot_state.application:
-                await bot_state.application.updater.start_polling(drop_pending_updates=True)
-                logger.info("机器人开始轮询")
+        state = bot_states.get(tenant.id if tenant else DEFAULT_TENANT)
+        if state is None or not state.application or not state.application.running:  # 增加实例存在性检查
+            return await create_bot(tenant)
         
-        return bot_state.application
+        return state.application
             
     except Exception as e:
         logger.error(f"启动机器人轮询时出错: {e}", exc_info=True)
         raise
 
-async def stop_bot():
-    """停止机器人"""
-    if bot_state.application:
+async def stop_bot(timeout: float = SHUTDOWN_TIMEOUT, tenant: Optional[str] = None):
+    """停止机器人：先停止接收更新，在 timeout 秒内处理完已接收的更新、
+    缓冲的媒体组和排队的出站消息，最后保存更新位置并关闭存储
+
+    tenant 为空时同时停止所有租户，并停止进程级后台任务。
+    """
+    if tenant is not None:
+        state = bot_states.get(tenant)
+        if state is not None:
+            await _stop_tenant(state, timeout)
+        return
+    await asyncio.gather(*(_stop_tenant(state, timeout) for state in tenant_states().values()))
+    for task in shared_tasks:
+        if not task.done():
+            task.cancel()
+    if shared_tasks:
+        await asyncio.gather(*shared_tasks, return_exceptions=True)
+        shared_tasks.clear()
+
+
+async def _stop_tenant(state: BotState, timeout: float):
+    if state.application:
+        started = time.monotonic()
+        deadline = started + timeout
+
+        def remaining() -> float:
+            return max(0.0, deadline - time.monotonic())
+
+        try:
+            # 先停止租约续期，避免停止过程中重新开始轮询
+            for task in state.tasks:
+                if task.get_name() in ('poll_lease', 'update_offsets', 'replay') and not task.done():
+                    task.cancel()
+            # 停止接收：轮询停止拉取，webhook 返回 503 让 Telegram 稍后重试
+            state.accepting = False
+            if state.application.updater and state.application.updater.running:
+                await state.application.updater.stop()
+            # 处理 update_queue 中已接收的更新
+            await state.application.stop()
+            if state.submission_handler:
+                await state.submission_handler.stop(remaining())
+            if state.scheduler:
+                await state.scheduler.stop(remaining())
+            if state.submission_handler:
+                remove_listener(state.submission_handler.apply_snapshot, state.tenant.id)
+            if state.offsets:
+                state.offsets.save()
+            if state.stats:
+                await state.stats.save()
+            if state.store:
+                await state.store.close()
+            if state.state:
+                if state.poll_lease:
+                    await state.poll_lease.release()
+                # 未送达的投稿已落盘，释放存活租约后其他实例可立即接管
+                for task in state.tasks:
+                    if task.get_name() == 'instance_lease' and not task.done():
+                        task.cancel()
+                if state.instance_lease:
+                    await state.instance_lease.release()
+                await state.state.close()
+            # 共用的 API 连接池在最后一个租户停止时才关闭
+            await state.application.shutdown()
+            logger.info(f"租户 {state.tenant.id} 的机器人已停止，用时 {time.monotonic() - started:.2f} 秒")
+        except Exception as e:
+            logger.error(f"停止租户 {state.tenant.id} 的机器人时出错: {e}", exc_info=True)
+
+
+async def set_webhook(tenant: str = DEFAULT_TENANT):
+    """向 Telegram 注册租户的 webhook 地址"""
+    state = bot_states[tenant]
+    if not WEBHOOK_URL:
+        raise ValueError("BOT_MODE=webhook 时必须配置 WEBHOOK_URL")
+    if not state.tenant.webhook_secret:
+        raise ValueError(f"BOT_MODE=webhook 时租户 {tenant} 必须配置 webhook secret，否则无法校验请求来源")
+
+    url = WEBHOOK_URL.rstrip('/') + state.tenant.webhook_path
+    await state.application.bot.set_webhook(
+        url=url,
+        secret_token=state.tenant.webhook_secret,
+        allowed_updates=Update.ALL_TYPES,
+        drop_pending_updates=False,
+    )
+    logger.info(f"已设置 webhook: {url}")
+
+
+async def delete_webhook(tenant: str = DEFAULT_TENANT):
+    """删除 webhook，之后可重新使用长轮询"""
+    state = bot_states.get(tenant)
+    if state is not None and state.application:
         try:
-            await bot_state.application.updater.stop()
-            await bot_state.application.stop()
-            await bot_state.application.shutdown()
-            logger.info("机器人已停止")
+            await state.application.bot.delete_webhook()
+            logger.info(f"已删除租户 {tenant} 的 webhook")
         except Exception as e:
-            logger.error(f"停止机器人时出错: {e}", exc_info=True)
+            logger.error(f"删除 webhook 时出错: {e}", exc_info=True)
 
 
 
@@ -92,7 +431,12 @@ __all__ = [
     'create_bot',
     'start_bot',
     'stop_bot',
+    'set_webhook',
+    'delete_webhook',
     'get_bot',
     'set_application',
-    'bot_state'
-]
\ No newline at end of file
+    'bot_state',
+    'bot_states',
+    'tenant_states',
+    'managed_tasks',
+]
@@ -0,0 +1,155 @@
+"""全局准入控制：并发上限、排队时间预算与优先级分级降载"""
+import asyncio
+from collections import deque
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+from config import ADMISSION
+from utils import sampled_logger
+from bot import metrics
+from bot.tenants import DEFAULT_TENANT, tenant_of
+
+
+class Priority(IntEnum):
+    """请求优先级，数值越小越优先"""
+    CRITICAL = 0   # /start、模板按钮等轻量交互，始终放行
+    NORMAL = 1     # 文字投稿、已在聚合中的相册后续文件
+    BULK = 2       # 新相册，负载高时最先被拒绝
+
+
+class AdmissionController:
+    """在所有处理器之前限制同时处理的请求数
+
+    并发名额未满时直接放行；已满时按优先级排队，名额释放后优先唤醒高优先级的请求。
+    排队超过该优先级的时间预算、或排队总数达到上限时拒绝（降载），由调用方快速回复
+    "繁忙"。排队已满时新来的高优先级请求会挤掉正在排队的最低优先级请求。
+    CRITICAL 请求计入并发数但从不排队。
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = ADMISSION['MAX_CONCURRENT'],
+        max_waiting: int = ADMISSION['MAX_WAITING'],
+        budgets: Optional[Dict[Priority, float]] = None,
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_waiting = max_waiting
+        self.budgets = budgets or {
+            Priority.NORMAL: ADMISSION['NORMAL_BUDGET'],
+            Priority.BULK: ADMISSION['BULK_BUDGET'],
+        }
+        self.active = 0
+        # 排队中的请求，future 结果为 True 表示获得名额，False 表示被挤掉
+        self._waiters: Dict[Priority, Deque[asyncio.Future]] = {
+            Priority.NORMAL: deque(),
+            Priority.BULK: deque(),
+        }
+
+        # 统计
+        self.admitted = 0
+        self.shed: Dict[str, int] = {priority.name.lower(): 0 for priority in Priority}
+
+        metrics.ADMISSION_ACTIVE.set_function(lambda: self.active)
+        metrics.ADMISSION_WAITING.set_function(lambda: self.waiting)
+
+    @property
+    def waiting(self) -> int:
+        return sum(len(waiters) for waiters in self._waiters.values())
+
+    def _record_shed(self, priority: Priority, tenant: str):
+        name = priority.name.lower()
+        self.shed[name] += 1
+        metrics.ADMISSION_SHED.labels(tenant, name).inc()
+        sampled_logger.warning("admission_shed", "负载过高，拒绝 %s 优先级请求（活跃 %d，排队 %d）",
+                               name, self.active, self.waiting)
+
+    def _has_waiters_at_or_above(self, priority: Priority) -> bool:
+        return any(self._waiters[p] for p in self._waiters if p <= priority)
+
+    def _evict_lowest(self, priority: Priority) -> bool:
+        """排队已满时挤掉一个优先级更低的排队请求，返回是否腾出了位置"""
+        for lower in sorted(self._waiters, reverse=True):
+            if lower <= priority:
+                break
+            waiters = self._waiters[lower]
+            while waiters:
+                future = waiters.pop()
+                if not future.done():
+                    future.set_result(False)
+                    return True
+        return False
+
+    async def acquire(self, priority: Priority, tenant: str = DEFAULT_TENANT) -> bool:
+        """申请处理名额，返回 False 表示应当拒绝该请求；tenant 只用于降载计数"""
+        if priority == Priority.CRITICAL or (
+            self.active < self.max_concurrent and not self._has_waiters_at_or_above(priority)
+        ):
+            self.active += 1
+            self.admitted += 1
+            return True
+
+        if self.waiting >= self.max_waiting and not self._evict_lowest(priority):
+            self._record_shed(priority, tenant)
+            return False
+
+        future = asyncio.get_running_loop().create_future()
+        waiters = self._waiters[priority]
+        waiters.append(future)
+        try:
+            granted = await asyncio.wait_for(future, self.budgets[priority])
+        except asyncio.TimeoutError:
+            granted = False
+        finally:
+            if future in waiters:
+                waiters.remove(future)
+        if granted:
+            self.admitted += 1
+        else:
+            self._record_shed(priority, tenant)
+        return granted
+
+    def release(self):
+        """释放名额并交给排队中优先级最高的请求"""
+        # CRITICAL 请求可能使 active 超过上限，超出部分释放后不再转交
+        if self.active > self.max_concurrent:
+            self.active -= 1
+            return
+        for priority in sorted(self._waiters):
+            waiters = self._waiters[priority]
+            while waiters:
+                future = waiters.popleft()
+                if not future.done():
+                    # 名额直接转交，active 不变
+                    future.set_result(True)
+                    return
+        self.active -= 1
+
+    def guard(
+        self,
+        callback: Callable[[Any, Any], Awaitable],
+        priority_of: Callable[[Any], Priority],
+        on_shed: Optional[Callable[[Any, Any], Awaitable]] = None,
+    ) -> Callable[[Any, Any], Awaitable]:
+        """包装 PTB 处理器回调，处理前先申请名额"""
+        async def guarded(update, context):
+            if not await self.acquire(priority_of(update), tenant_of(context)):
+                if on_shed:
+                    await on_shed(update, context)
+                return
+            try:
+                return await callback(update, context)
+            finally:
+                self.release()
+        return guarded
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'max_concurrent': self.max_concurrent,
+            'active': self.active,
+            'waiting': self.waiting,
+            'admitted': self.admitted,
+            'shed': dict(self.shed),
+        }
+
+
+def critical(update) -> Priority:
+    return Priority.CRITICAL
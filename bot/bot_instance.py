@@ -1,18 +1,20 @@
 from utils import logger
+from bot.tenants import DEFAULT_TENANT
 
-_application = None
+# 各租户的 Application 实例
+_applications = {}
 _initialized = False
 
-def get_bot():
+def get_bot(tenant: str = DEFAULT_TENANT):
     """获取bot实例"""
-    global _application
-    if not _application:
-        logger.error("机器人实例未初始化")
+    application = _applications.get(tenant)
+    if not application:
+        logger.error(f"租户 {tenant} 的机器人实例未初始化")
         return None
-    return _application.bot
+    return application.bot
 
-def set_application(app):
+def set_application(app, tenant: str = DEFAULT_TENANT):
     """设置应用实例"""
-    global _application, _initialized
-    _application = app
+    global _initialized
+    _applications[tenant] = app
     _initialized = True
\ No newline at end of file
@@ -1,7 +1,8 @@
 from telegram import Update
 from telegram.ext import ContextTypes
-from telegram.constants import ParseMode
 from utils import logger
+from bot.runtime import get_snapshot
+from bot.tenants import tenant_of
 
 
 async def handle_callback_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -9,44 +10,12 @@ async def handle_callback_query(update: Update, context: ContextTypes.DEFAULT_TY
     query = update.callback_query
 
     try:
-        # 解析回调数据
-        callback_data = query.data
-        if callback_data == 'boom_report':
-            template = """
-            *请按照以下模板提交雷报，出击证明1张or3张，也可自行发布在评论区，点击下方模板可直接复制* ⬇️：
-            `
-吃🐔雷报
-老师花名：
-联系方式：
-时间：
-地址：
-花费：
-样貌身材：
-槽点：
-经历：
-验证留名：
-
-出击证明见评论区（聊天记录或付款记录）
-            `
-*请填写完整后发送给我～*
-            """
-            await query.message.reply_text(text=template, parse_mode=ParseMode.MARKDOWN)
-
-        elif callback_data == 'recommend':
-            template = """
-            *请按照以下模板提交，图片1张or3张，也可自行发布在评论区，点击下方模板可直接复制* ⬇️：
-            `
-网友分享
-老师花名：
-联系方式：
-价格：
-地址：
-服务：
-评价：
-            `
-*请填写完整后发送给我～*
-            """
-            await query.message.reply_text(text=template, parse_mode=ParseMode.MARKDOWN)
+        # 按回调数据查分发表，模板消息在加载注册表时已生成
+        handler = get_snapshot(tenant_of(context)).registry.callbacks.get(query.data)
+        if handler:
+            await handler(query)
+        else:
+            logger.warning(f"未知的回调数据: {query.data}")
     except Exception as e:
         logger.error(f"处理回调查询时出错: {e}", exc_info=True)
         await query.message.reply_text("❌ 处理请求时出错，请稍后重试")
\ No newline at end of file
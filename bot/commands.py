@@ -1,33 +1,63 @@
+from typing import Optional
 from utils import logger
-from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram import Update
 from telegram.ext import CommandHandler, ContextTypes
+from bot.runtime import get_snapshot, reload_snapshot
+from bot.admission import AdmissionController, critical
+from bot.tenants import tenant_of
+
+
+def _is_admin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
+    """是否为当前租户的管理员"""
+    tenant = get_snapshot(tenant_of(context)).tenant
+    return tenant is not None and update.message.from_user.id in tenant.admin_user_ids
 
 
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """处理 /start 命令"""
     try:    
-        # 默认欢迎消息
-        welcome_message = (
-            f"👋 你好 {update.message.from_user.first_name}!\n\n"
-            "欢迎使用投稿机器人！你可以：\n"
-            "1. 投稿差评😤\n"
-            "2. 分享老师❤\n\n"
-            "选择下方按钮获取对应模板"
-        )
-        
-        keyboard = [
-            [InlineKeyboardButton("差评😤", callback_data='boom_report')],
-            [InlineKeyboardButton("分享❤", callback_data='recommend')],
-        ]
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
-            
-        await update.message.reply_text(welcome_message, reply_markup=reply_markup)
+        # 欢迎语与按钮在加载注册表时已生成
+        registry = get_snapshot(tenant_of(context)).registry
+        welcome_message = f"👋 你好 {update.message.from_user.first_name}!\n\n{registry.welcome_text}"
+        await update.message.reply_text(welcome_message, reply_markup=registry.keyboard)
     except Exception as e:
         logger.error(f"处理 /start 命令时出错: {e}", exc_info=True)
         await update.message.reply_text("❌ 处理请求时出错，请稍后重试")
 
-def register_commands(app):
-    """注册所有命令处理器"""
-    app.add_handler(CommandHandler("start", start_command))
+async def reload_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """处理 /reload 命令：热更新违禁词、限流参数与投稿类型（仅管理员）"""
+    if not _is_admin(update, context):
+        return
+    try:
+        snapshot = await reload_snapshot(tenant_of(context))
+        await update.message.reply_text(f"✅ 配置已重新加载\n{snapshot.summary()}")
+    except Exception as e:
+        logger.error(f"热更新运行时配置失败: {e}", exc_info=True)
+        await update.message.reply_text(f"❌ 重新加载失败，继续使用旧配置: {e}")
+
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """处理 /stats 命令：最近的投稿统计（仅管理员）"""
+    if not _is_admin(update, context):
+        return
+    try:
+        stats = context.application.bot_data.get('stats')
+        if stats is None:
+            await update.message.reply_text("❌ 投稿统计未启用")
+            return
+        stats = await stats.aggregate()
+        await update.message.reply_text(stats.render())
+    except Exception as e:
+        logger.error(f"处理 /stats 命令时出错: {e}", exc_info=True)
+        await update.message.reply_text("❌ 处理请求时出错，请稍后重试")
+
+
+def register_commands(app, admission: Optional[AdmissionController] = None):
+    """注册所有命令处理器，命令属于轻量交互，计入并发但始终放行"""
+    def guarded(callback):
+        return admission.guard(callback, critical) if admission else callback
+
+    app.add_handler(CommandHandler("start", guarded(start_command)))
+    app.add_handler(CommandHandler("reload", guarded(reload_command)))
+    app.add_handler(CommandHandler("stats", guarded(stats_command)))
 
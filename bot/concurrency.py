@@ -0,0 +1,90 @@
+"""并发处理更新，同时保证同一用户的更新按顺序处理"""
+import asyncio
+from typing import Awaitable, Dict, Hashable, Optional
+from telegram.ext import BaseUpdateProcessor
+from bot.offsets import UpdateOffsetTracker
+
+
+def update_key(update: object) -> Optional[Hashable]:
+    """更新的串行化键：同一用户（其媒体组的各个文件也来自该用户）共用一个键"""
+    user = getattr(update, 'effective_user', None)
+    if user is not None:
+        return ('user', user.id)
+    chat = getattr(update, 'effective_chat', None)
+    if chat is not None:
+        return ('chat', chat.id)
+    return None
+
+
+class _KeyLock:
+    __slots__ = ('lock', 'waiters')
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.waiters = 0
+
+
+class KeyedUpdateProcessor(BaseUpdateProcessor):
+    """按键串行化的更新处理器
+
+    不同用户的更新最多 max_concurrent_updates 个并发处理；同一用户的更新按到达
+    顺序逐个处理（asyncio.Lock 按 FIFO 唤醒等待者），因此同一相册的各个文件、
+    连续发送的投稿都不会乱序。没有用户/会话的更新不做串行化。
+
+    处理器内部的共享状态（RateLimiter、媒体组缓冲等）只在两次 await 之间修改，
+    在单线程事件循环中天然是原子的，无需额外加锁。
+    """
+
+    def __init__(self, max_concurrent_updates: int, tracker: Optional[UpdateOffsetTracker] = None):
+        super().__init__(max_concurrent_updates)
+        self._locks: Dict[Hashable, _KeyLock] = {}
+        self.tracker = tracker
+
+    @property
+    def active_keys(self) -> int:
+        """正在处理或排队中的键数量"""
+        return len(self._locks)
+
+    async def process_update(self, update: object, coroutine: Awaitable) -> None:
+        update_id = getattr(update, 'update_id', None)
+        if self.tracker is None or update_id is None:
+            await self._process_keyed(update, coroutine)
+            return
+        if self.tracker.should_skip(update_id):
+            # 上次运行已处理过，关闭协程避免 "never awaited" 警告
+            coroutine.close()
+            return
+        self.tracker.begin(update_id)
+        try:
+            await self._process_keyed(update, coroutine)
+        finally:
+            self.tracker.done(update_id)
+
+    async def _process_keyed(self, update: object, coroutine: Awaitable) -> None:
+        key = update_key(update)
+        if key is None:
+            await super().process_update(update, coroutine)
+            return
+
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = _KeyLock()
+        entry.waiters += 1
+        try:
+            # 先按键排队再占用并发名额，单个用户刷屏最多只占一个名额
+            async with entry.lock:
+                await super().process_update(update, coroutine)
+        finally:
+            entry.waiters -= 1
+            # 没有后续更新时释放该键，内存只与活跃用户数相关
+            if not entry.waiters:
+                del self._locks[key]
+
+    async def do_process_update(self, update: object, coroutine: Awaitable) -> None:
+        await coroutine
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
@@ -0,0 +1,149 @@
+"""线上排障工具：采样分析器、asyncio 任务快照与事件循环延迟监控
+
+采样分析器只在请求期间启动一个后台线程，平时没有任何开销；事件循环延迟由一个
+定期醒来的哨兵任务测量，每次只做一次时间比较和直方图累加。
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+from config import DEBUG
+from utils import logger
+from bot import metrics
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse(frame) -> str:
+    """把调用栈折叠为 flamegraph 格式，根在前、栈顶在后"""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return ";".join(labels)
+
+
+class SamplingProfiler:
+    """基于 sys._current_frames 的采样分析器
+
+    在独立线程中按固定间隔抓取目标线程的调用栈并计数，输出 flamegraph.pl /
+    speedscope 可直接读取的折叠栈文本。同一时间只允许一次采样。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def profile(self, seconds: float, interval: float, thread_ids: Optional[Iterable[int]] = None) -> str:
+        """阻塞采样 seconds 秒，返回折叠栈文本；已有采样在运行时抛出 RuntimeError"""
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("已有采样正在进行")
+        try:
+            targets = set(thread_ids) if thread_ids is not None else None
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            own = threading.get_ident()
+            stacks: Counter = Counter()
+            deadline = time.monotonic() + seconds
+            samples = 0
+            while time.monotonic() < deadline:
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own or (targets is not None and thread_id not in targets):
+                        continue
+                    thread_name = names.get(thread_id, str(thread_id))
+                    stacks[f"{thread_name};{_collapse(frame)}"] += 1
+                samples += 1
+                time.sleep(interval)
+            logger.info(f"采样分析完成: {seconds} 秒共 {samples} 次采样，{len(stacks)} 个不同调用栈")
+            return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+        finally:
+            self._lock.release()
+
+
+def _coroutine_stack(coro) -> List[str]:
+    """沿 cr_await 链展开协程栈，比 Task.get_stack 只给出最外层帧更完整"""
+    lines = []
+    while coro is not None:
+        frame = getattr(coro, 'cr_frame', None) or getattr(coro, 'gi_frame', None)
+        if frame is None:
+            if not hasattr(coro, 'cr_frame') and not hasattr(coro, 'gi_frame'):
+                # 等待的是 Future 等非协程对象
+                lines.append(f"<awaiting {type(coro).__name__}>")
+            break
+        lines.append(f"{frame.f_code.co_filename}:{frame.f_lineno} in {frame.f_code.co_name}")
+        coro = getattr(coro, 'cr_await', None) or getattr(coro, 'gi_yieldfrom', None)
+    return lines
+
+
+def dump_tasks(managed: Iterable[asyncio.Task] = ()) -> List[Dict[str, Any]]:
+    """列出事件循环中所有存活的任务及其协程栈，managed 中的任务会被标记"""
+    managed = set(managed)
+    current = asyncio.current_task()
+    tasks = []
+    for task in asyncio.all_tasks():
+        coro = task.get_coro()
+        tasks.append({
+            'name': task.get_name(),
+            'coroutine': getattr(coro, '__qualname__', repr(coro)),
+            'managed': task in managed,
+            'current': task is current,
+            'done': task.done(),
+            'cancelling': task.cancelling(),
+            'stack': _coroutine_stack(coro),
+        })
+    tasks.sort(key=lambda item: (not item['managed'], item['name']))
+    return tasks
+
+
+class LoopLagMonitor:
+    """事件循环延迟哨兵
+
+    每 interval 秒醒来一次，实际醒来时间比预期晚多少就是事件循环被阻塞的时长，
+    记入直方图（同时出现在 /metrics）。
+    """
+
+    def __init__(self, interval: float = DEBUG['LOOP_LAG_INTERVAL']):
+        self.interval = interval
+        self.histogram = metrics.LOOP_LAG_SECONDS.labels()
+        self.last = 0.0
+        self.max = 0.0
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self.last = lag
+            if lag > self.max:
+                self.max = lag
+            self.histogram.observe(lag)
+
+    def stats(self) -> Dict[str, Any]:
+        histogram = self.histogram
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(metrics.LOOP_LAG_SECONDS.bounds + (float('inf'),), histogram.counts):
+            cumulative += count
+            buckets['+Inf' if bound == float('inf') else str(bound)] = cumulative
+        return {
+            'interval': self.interval,
+            'samples': histogram.count,
+            'mean': histogram.sum / histogram.count if histogram.count else 0.0,
+            'last': self.last,
+            'max': self.max,
+            'buckets': buckets,
+        }
+
+
+profiler = SamplingProfiler()
+loop_lag_monitor = LoopLagMonitor()
@@ -0,0 +1,178 @@
+"""重复投稿检测：文本指纹（精确 + MinHash 近似）与媒体 file_unique_id 索引"""
+import hashlib
+import random
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Iterable, List, NamedTuple, Optional, Set, Tuple
+from bot.forbidden_matcher import normalize_text
+
+# MinHash 签名长度，按 LSH 分为 MINHASH_BANDS 段，每段 MINHASH_ROWS 个值
+MINHASH_PERMUTATIONS = 32
+MINHASH_BANDS = 8
+MINHASH_ROWS = MINHASH_PERMUTATIONS // MINHASH_BANDS
+# 字符 n-gram 长度（中文以双字词为主）
+SHINGLE_SIZE = 2
+
+_MASK64 = (1 << 64) - 1
+# 固定种子，保证同一文本在不同进程中得到相同签名
+_rng = random.Random(0x5EED)
+_PERMUTATIONS = [(_rng.getrandbits(64) | 1, _rng.getrandbits(64)) for _ in range(MINHASH_PERMUTATIONS)]
+
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def minhash(text: str) -> Tuple[int, ...]:
+    """计算归一化文本字符 n-gram 集合的 MinHash 签名"""
+    if len(text) <= SHINGLE_SIZE:
+        shingles = {text}
+    else:
+        shingles = {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+    hashes = [_hash64(shingle) for shingle in shingles]
+    return tuple(min((a * h + b) & _MASK64 for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def similarity(left: Tuple[int, ...], right: Tuple[int, ...]) -> float:
+    """由两个签名估计 Jaccard 相似度"""
+    return sum(1 for x, y in zip(left, right) if x == y) / MINHASH_PERMUTATIONS
+
+
+def _bands(signature: Tuple[int, ...]) -> List[Tuple[int, Tuple[int, ...]]]:
+    return [
+        (band, signature[band * MINHASH_ROWS:(band + 1) * MINHASH_ROWS])
+        for band in range(MINHASH_BANDS)
+    ]
+
+
+class DuplicateMatch(NamedTuple):
+    """命中的重复投稿"""
+    submission_id: str
+    reason: str  # 'exact'、'near' 或 'media'
+    similarity: float = 1.0
+
+
+class _Entry:
+    __slots__ = ('submission_id', 'exact', 'signature', 'file_uids', 'created', 'scope')
+
+    def __init__(self, submission_id: str, exact: Optional[int], signature: Optional[Tuple[int, ...]],
+                 file_uids: Tuple[str, ...], created: float, scope: Hashable = None):
+        self.submission_id = submission_id
+        self.scope = scope
+        self.exact = exact
+        self.signature = signature
+        self.file_uids = file_uids
+        self.created = created
+
+
+class DuplicateDetector:
+    """在时间窗口内检测重复投稿
+
+    每条投稿登记精确指纹、MinHash 签名的各个 LSH 分段以及媒体 file_unique_id，
+    查询时只需常数次字典查找；任一分段相同的投稿作为候选，再用签名估计相似度确认。
+    索引按插入顺序淘汰，条目数不超过 max_entries，且超过 window 秒的条目在访问时清除。
+
+    精确指纹与媒体对所有投稿生效；近似匹配只在同一 scope（例如同一用户）内进行，
+    不同用户按同一模板填写的相似内容不视为重复。
+    """
+
+    def __init__(
+        self,
+        window: float,
+        max_entries: int,
+        min_similarity: float = 0.8,
+        min_text_length: int = 10,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.window = window
+        self.max_entries = max_entries
+        self.min_similarity = min_similarity
+        self.min_text_length = min_text_length
+        self._clock = clock
+
+        self._entries: 'OrderedDict[str, _Entry]' = OrderedDict()
+        self._exact_index: Dict[int, str] = {}
+        self._band_index: Dict[Tuple[int, Tuple[int, ...]], Set[str]] = {}
+        self._media_index: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _fingerprints(self, text: Optional[str]) -> Tuple[Optional[int], Optional[Tuple[int, ...]]]:
+        key = normalize_text(text or "")
+        if not key:
+            return None, None
+        exact = _hash64(key)
+        # 过短的文本近似匹配误判率高，只做精确匹配
+        near = minhash(key) if len(key) >= self.min_text_length else None
+        return exact, near
+
+    def _expire(self):
+        cutoff = self._clock() - self.window
+        while self._entries:
+            entry = next(iter(self._entries.values()))
+            if entry.created > cutoff and len(self._entries) <= self.max_entries:
+                break
+            self.discard(entry.submission_id)
+
+    def find(self, text: Optional[str], file_unique_ids: Iterable[str] = (),
+             scope: Hashable = None) -> Optional[DuplicateMatch]:
+        """查找与给定内容重复的已登记投稿"""
+        self._expire()
+        for file_uid in file_unique_ids:
+            original = self._media_index.get(file_uid)
+            if original is not None:
+                return DuplicateMatch(original, 'media')
+
+        exact, near = self._fingerprints(text)
+        if exact is not None:
+            original = self._exact_index.get(exact)
+            if original is not None:
+                return DuplicateMatch(original, 'exact')
+        if near is not None:
+            best: Optional[DuplicateMatch] = None
+            for band in _bands(near):
+                for candidate_id in self._band_index.get(band, ()):
+                    candidate = self._entries[candidate_id]
+                    if candidate.scope != scope:
+                        continue
+                    score = similarity(candidate.signature, near)
+                    if score >= self.min_similarity and (best is None or score > best.similarity):
+                        best = DuplicateMatch(candidate_id, 'near', score)
+            return best
+        return None
+
+    def add(self, submission_id: str, text: Optional[str], file_unique_ids: Iterable[str] = (),
+            scope: Hashable = None):
+        """登记一条投稿"""
+        if submission_id in self._entries:
+            self.discard(submission_id)
+        exact, near = self._fingerprints(text)
+        file_uids = tuple(file_unique_ids)
+        self._entries[submission_id] = _Entry(submission_id, exact, near, file_uids, self._clock(), scope)
+        if exact is not None:
+            self._exact_index[exact] = submission_id
+        if near is not None:
+            for band in _bands(near):
+                self._band_index.setdefault(band, set()).add(submission_id)
+        for file_uid in file_uids:
+            self._media_index[file_uid] = submission_id
+        self._expire()
+
+    def discard(self, submission_id: str):
+        """移除一条投稿（例如投递失败后允许用户重新提交）"""
+        entry = self._entries.pop(submission_id, None)
+        if entry is None:
+            return
+        if entry.exact is not None and self._exact_index.get(entry.exact) == submission_id:
+            del self._exact_index[entry.exact]
+        if entry.signature is not None:
+            for band in _bands(entry.signature):
+                members = self._band_index.get(band)
+                if members is not None:
+                    members.discard(submission_id)
+                    if not members:
+                        del self._band_index[band]
+        for file_uid in entry.file_uids:
+            if self._media_index.get(file_uid) == submission_id:
+                del self._media_index[file_uid]
@@ -0,0 +1,148 @@
+"""合集模式：把一段时间内的纯文字投稿合并为一条频道消息发送"""
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+from utils import logger
+
+ChannelId = Union[int, str]
+
+# Telegram 单条消息的最大长度（按 UTF-16 码元计算）
+MESSAGE_LIMIT = 4096
+SEPARATOR = "\n\n➖➖➖➖➖\n\n"
+
+
+def telegram_length(text: str) -> int:
+    """Telegram 计算消息长度使用 UTF-16 码元，表情等字符占两个"""
+    return len(text.encode('utf-16-le')) // 2
+
+
+@dataclass
+class DigestEntry:
+    """合集中的一条投稿，所在的消息发送结束后调用 on_done(成功与否)"""
+    text: str
+    on_done: Callable[[bool], Awaitable[None]]
+    length: int = field(init=False)
+
+    def __post_init__(self):
+        self.length = telegram_length(self.text)
+
+
+def _default_header(count: int) -> str:
+    return f"📰 网友分享合集（{count} 条）\n\n"
+
+
+def pack_digest(entries: List[DigestEntry], header: Callable[[int], str] = _default_header,
+                limit: int = MESSAGE_LIMIT) -> List[Tuple[str, List[DigestEntry]]]:
+    """按顺序把投稿装入尽量少的消息，每条不超过 limit；投稿本身不拆开
+
+    header(条数) 生成每条消息的表头，按全部条数预留表头长度，拆分后的条数只会更少。
+    加上表头后单条就超出 limit 的投稿不加表头单独成一条消息，与未开启合集时的发送内容相同。
+    """
+    header_length = telegram_length(header(len(entries)))
+    separator_length = telegram_length(SEPARATOR)
+    messages: List[Tuple[str, List[DigestEntry]]] = []
+    current: List[DigestEntry] = []
+    length = header_length
+
+    def close():
+        if current:
+            messages.append((header(len(current)) + SEPARATOR.join(item.text for item in current), current))
+
+    for entry in entries:
+        if header_length + entry.length > limit:
+            close()
+            current, length = [], header_length
+            messages.append((entry.text, [entry]))
+            continue
+        added = entry.length + (separator_length if current else 0)
+        if current and length + added > limit:
+            close()
+            current, length, added = [], header_length, entry.length
+        current.append(entry)
+        length += added
+    close()
+    return messages
+
+
+@dataclass
+class _PendingDigest:
+    bot: Any
+    channel: ChannelId
+    entries: List[DigestEntry] = field(default_factory=list)
+    length: int = 0
+    timer: Optional[asyncio.TimerHandle] = None
+
+
+class DigestBuffer:
+    """按目标频道缓冲纯文字投稿
+
+    每个频道从第一条投稿起等待 window 秒，或缓冲满 max_items 条、或再加一条会超出
+    单条消息长度时（先到者为准）合并交给 on_publish(bot, 频道, 消息文本, 投稿列表) 发送。
+    """
+
+    def __init__(
+        self,
+        on_publish: Callable[[Any, ChannelId, str, List[DigestEntry]], Awaitable[None]],
+        window: float = 300,
+        max_items: int = 10,
+        header: Callable[[int], str] = _default_header,
+    ):
+        self.on_publish = on_publish
+        self.window = window
+        self.max_items = max_items
+        self.header = header
+        # 表头按满额条数预留长度
+        self._reserved = telegram_length(header(max_items)) + telegram_length(SEPARATOR)
+        self._pending: Dict[str, _PendingDigest] = {}
+        # 持有发送任务的引用，避免被垃圾回收
+        self._flush_tasks = set()
+
+    def __len__(self) -> int:
+        """缓冲中的投稿数"""
+        return sum(len(pending.entries) for pending in self._pending.values())
+
+    def add(self, bot: Any, channel: ChannelId, entry: DigestEntry):
+        key = str(channel)
+        pending = self._pending.get(key)
+        # 加入后会超出单条消息长度时，先把已缓冲的发出去
+        if pending and pending.length + entry.length + self._reserved > MESSAGE_LIMIT:
+            self._flush(key)
+            pending = None
+        if pending is None:
+            pending = self._pending[key] = _PendingDigest(bot, channel)
+            pending.timer = asyncio.get_running_loop().call_later(self.window, self._flush, key)
+        else:
+            pending.length += telegram_length(SEPARATOR)
+        pending.entries.append(entry)
+        pending.length += entry.length
+        if len(pending.entries) >= self.max_items:
+            self._flush(key)
+
+    def _flush(self, key: str):
+        pending = self._pending.pop(key, None)
+        if pending is None:
+            return
+        if pending.timer is not None:
+            pending.timer.cancel()
+        task = asyncio.get_running_loop().create_task(self._run_flush(pending))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def _run_flush(self, pending: _PendingDigest):
+        for text, entries in pack_digest(pending.entries, self.header):
+            try:
+                await self.on_publish(pending.bot, pending.channel, text, entries)
+            except Exception as e:
+                logger.error(f"发送频道 {pending.channel} 的合集时出错: {e}", exc_info=True)
+                for entry in entries:
+                    await entry.on_done(False)
+
+    async def flush_all(self):
+        """立即发出所有缓冲的合集并等待交给出站调度器"""
+        for key in list(self._pending):
+            self._flush(key)
+        if self._flush_tasks:
+            await asyncio.gather(*self._flush_tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {'channels': len(self._pending), 'buffered': len(self)}
@@ -0,0 +1,122 @@
+"""违禁词匹配引擎（Aho-Corasick 自动机）"""
+import re
+import unicodedata
+from collections import deque
+from typing import Dict, Iterable, List, NamedTuple
+
+# 匹配时忽略的字符：空白、标点、符号、下划线等（用户常用来拆分违禁词绕过过滤）
+_SEPARATOR_RE = re.compile(r'[\W_]+')
+
+
+def normalize_text(text: str) -> str:
+    """归一化文本：全角转半角、统一大小写、去除空白和标点"""
+    if not text:
+        return ""
+    # NFKC 会把全角字母/数字/标点折叠为半角形式
+    text = unicodedata.normalize('NFKC', text).casefold()
+    return _SEPARATOR_RE.sub('', text)
+
+
+class ForbiddenHit(NamedTuple):
+    """一次违禁词命中"""
+    word: str
+    category: str
+    end: int  # 命中在归一化文本中的结束位置（不含）
+
+
+class ForbiddenWordMatcher:
+    """将违禁词表编译为 Aho-Corasick 自动机，单次扫描找出所有命中"""
+
+    def __init__(self, words_by_category: Dict[str, Iterable[str]]):
+        # 状态转移表、失败指针、每个状态的输出（词表下标）
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[int]] = [[]]
+        self._words: List[str] = []
+        self._categories: List[str] = []
+
+        seen = set()
+        for category, words in words_by_category.items():
+            for word in words:
+                key = normalize_text(word)
+                if not key or key in seen:
+                    continue
+                seen.add(key)
+                self._add_word(key, word, category)
+        self._build_fail_links()
+
+    def __len__(self) -> int:
+        return len(self._words)
+
+    @property
+    def state_count(self) -> int:
+        """自动机状态数"""
+        return len(self._goto)
+
+    def _add_word(self, key: str, word: str, category: str):
+        state = 0
+        for ch in key:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = nxt
+        self._output[state].append(len(self._words))
+        self._words.append(word)
+        self._categories.append(category)
+
+    def _build_fail_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                # 合并失败指针上的输出，扫描时无需再沿失败链回溯
+                self._output[nxt] = self._output[nxt] + self._output[self._fail[nxt]]
+
+    def find_all(self, text: str) -> List[ForbiddenHit]:
+        """返回文本中所有违禁词命中（允许重叠）"""
+        key = normalize_text(text)
+        if not key or not self._words:
+            return []
+
+        goto, fail, output = self._goto, self._fail, self._output
+        hits = []
+        state = 0
+        for pos, ch in enumerate(key):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if output[state]:
+                for index in output[state]:
+                    hits.append(ForbiddenHit(self._words[index], self._categories[index], pos + 1))
+        return hits
+
+    def contains(self, text: str) -> bool:
+        """文本是否包含任意违禁词，命中第一个即返回"""
+        key = normalize_text(text)
+        if not key or not self._words:
+            return False
+
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for ch in key:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if output[state]:
+                return True
+        return False
+
+
+def build_matcher(words_by_category: Dict[str, Iterable[str]]) -> ForbiddenWordMatcher:
+    """根据分类词表构建匹配器"""
+    return ForbiddenWordMatcher(words_by_category)
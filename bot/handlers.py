@@ -1,209 +1,511 @@
-from datetime import datetime
-from bot.forbidden_words import ALL_FORBIDDEN_WORDS
-from config import BOOM_CHANNEL_ID, RECORDING_CHANNEL_ID
-from utils import logger
-from typing import Dict, List
-from telegram import Update, InputMediaPhoto, InputMediaVideo, Message
+from config import DEDUP, DIGEST, PIPELINE
+from utils import log_context, logger, sampled_logger, user_id_var
+import asyncio
+import html
+import logging
+import time
+from functools import partial
+from typing import Awaitable, Callable, Iterable, List, Optional, Tuple
+from telegram import Update, InputMediaPhoto, InputMediaVideo
+from telegram.error import BadRequest
 from telegram.ext import MessageHandler, filters, ContextTypes
-from bot.limiter import RateLimiter
-
-# 定义投稿模板必填字段
-REPORT_REQUIRED_FIELDS = [
-    "老师花名",
-    "联系方式", 
-    "时间",
-    "地址",
-    "花费",
-    "样貌身材",
-    "经历",
-    "验证留名",
-    "出击证明见评论区（聊天记录或付款记录）"
-]
-
-RECOMMEND_REQUIRED_FIELDS = [
-    "老师花名",
-    "联系方式",
-    "价格",
-    "地址",
-    "评价",
-    "服务"
-]
+from collections import OrderedDict
+from bot.admission import AdmissionController, Priority
+from bot.digest import DigestBuffer, DigestEntry
+from bot.media_group import MediaGroup, MediaItem
+from bot.sender import OutboundJob, OutboundScheduler
+from bot.routing import ChannelId
+from bot.pipeline import Pipeline, Stage, SubmissionContext
+from bot.dedup import DuplicateDetector
+from bot.state_backend import StateBackend
+from bot.stats import SubmissionStats
+from bot.tenants import DEFAULT_TENANT
+from bot.store import STATUS_DELIVERED, STATUS_FAILED, SubmissionRecord, SubmissionStore
+from bot import metrics
+from bot.runtime import RuntimeSnapshot, add_listener, get_snapshot
+from bot.templates import ParsedSubmission
+
+
+def parse_submission(text: str, snapshot: Optional[RuntimeSnapshot] = None) -> ParsedSubmission:
+    """按当前注册表解析投稿文本"""
+    return (snapshot or get_snapshot()).registry.parser.parse(text)
+
 
 def validate_template(text: str) -> tuple[bool, str]:
     """验证文本是否符合模板格式"""
-    if not text:
-        return False, "投稿内容不能为空"
-        
-    # 选择验证模板
-    required_fields = REPORT_REQUIRED_FIELDS if "吃🐔雷报" in text else RECOMMEND_REQUIRED_FIELDS
-    
-    # 检查每个必填字段
-    missing_fields = []
-    for field in required_fields:
-        # 支持多种冒号格式
-        colon_variants = ['：', ':', '∶', '︰', '﹕']
-        field_found = False
-        if f"{field}" in text:
-            field_found = True
-            break
-                
-        if not field_found:
-            missing_fields.append(field)
-            
-    if missing_fields:
-        return False, f"缺少必填字段: {', '.join(missing_fields)}"
-        
-    # 检查字段值是否为空或仅包含特殊字符
-    empty_fields = []
-    lines = text.split('\n')
-    for line in lines:
-        for field in required_fields:
-            for colon in colon_variants:
-                if line.startswith(f"{field}{colon}"):
-                    value = line.split(colon, 1)[1].strip()
-                    if not value or value in ['']:
-                        empty_fields.append(field)
-                        
-    if empty_fields:
-        return False, f"以下字段内容不能为空: {', '.join(set(empty_fields))}"
-        
-    return True, ""
+    parsed = parse_submission(text)
+    return parsed.is_valid, parsed.error_message
 
 
 class SubmissionHandler:
-    def __init__(self):
-        self.rate_limiter = RateLimiter()
-        self.media_groups: Dict[str, List[Message]] = {}
+    def __init__(self, scheduler: OutboundScheduler, store: Optional[SubmissionStore] = None,
+                 state: Optional[StateBackend] = None, stats: Optional[SubmissionStats] = None,
+                 tenant: str = DEFAULT_TENANT):
+        state = state or StateBackend()
+        self.tenant = tenant
+        self.stats = stats
+        # 各阶段耗时按租户区分，子指标在此创建一次
+        self._handle_seconds = metrics.HANDLE_SUBMISSION_SECONDS.labels(tenant)
+        self._rate_limit_seconds = metrics.STAGE_SECONDS.labels(tenant, "rate_limit")
+        self._validate_seconds = metrics.STAGE_SECONDS.labels(tenant, "validate_template")
+        self._forbidden_seconds = metrics.STAGE_SECONDS.labels(tenant, "contains_forbidden_words")
+        self._send_seconds = metrics.STAGE_SECONDS.labels(tenant, "send_channel")
+        self.rate_limiter = state.rate_limiter()
+        self.scheduler = scheduler
+        self.store = store
+        self.deduplicator = DuplicateDetector(
+            window=DEDUP['WINDOW'],
+            max_entries=DEDUP['MAX_ENTRIES'],
+            min_similarity=DEDUP['MIN_SIMILARITY'],
+        ) if DEDUP['ENABLED'] else None
+        self.media_groups = state.media_group_aggregator(self._publish_media_group)
+        metrics.MEDIA_GROUPS_BUFFERED.set_function(lambda: len(self.media_groups), tenant)
+        metrics.RATE_LIMITER_USERS.set_function(lambda: len(self.rate_limiter), tenant)
+        self.pipeline = self._build_pipeline()
+        self.digest = DigestBuffer(
+            self._publish_digest, window=DIGEST['WINDOW'], max_items=DIGEST['MAX_ITEMS'],
+        ) if DIGEST['ENABLED'] else None
+        metrics.DIGEST_BUFFERED.set_function(lambda: len(self.digest) if self.digest is not None else 0, tenant)
+        # 被降载拒绝的媒体组，同一相册只回复一次
+        self._shed_groups: 'OrderedDict[str, None]' = OrderedDict()
+        add_listener(self.apply_snapshot, tenant)
+        # 限流器按全局 RATE_LIMIT 创建，立即应用租户当前快照中的限流参数
+        self.apply_snapshot(get_snapshot(tenant))
+
+    def start(self):
+        """启动处理流水线"""
+        self.pipeline.start()
+
+    async def stop(self, timeout: float = 10):
+        """刷出缓冲的媒体组，处理完流水线中的投稿、发出缓冲的合集后停止"""
+        await self.media_groups.flush_all()
+        await self.pipeline.stop(timeout)
+        if self.digest is not None:
+            await self.digest.flush_all()
+
+    def priority_of(self, update: Update) -> Priority:
+        """准入优先级：新相册最重，最先被降载；已在聚合中的相册后续文件与文字投稿同级"""
+        message = update.message
+        group_id = message.media_group_id if message else None
+        if group_id and group_id not in self.media_groups:
+            return Priority.BULK
+        return Priority.NORMAL
+
+    async def on_shed(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """负载过高时快速回复繁忙，被拒绝的相册丢弃其余文件"""
+        message = update.message
+        try:
+            group_id = message.media_group_id
+            if group_id:
+                if group_id in self._shed_groups:
+                    return
+                self._shed_groups[group_id] = None
+                while len(self._shed_groups) > self.media_groups.max_groups:
+                    self._shed_groups.popitem(last=False)
+                await self.media_groups.reject(group_id)
+            if self.stats:
+                self.stats.record('shed', message.from_user.id)
+            await message.reply_text("⏳ 当前投稿较多，请稍后再试")
+        except Exception as e:
+            logger.error(f"回复繁忙提示失败: {e}", exc_info=True)
+
+    def apply_snapshot(self, snapshot: RuntimeSnapshot):
+        """热更新后应用新的限流参数，已有用户的令牌桶保留"""
+        limits = snapshot.rate_limit
+        self.rate_limiter.configure(limits['MAX_MESSAGES'], limits['TIME_WINDOW'], limits['COOLDOWN_TIME'])
 
     async def handle_submission(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """处理用户投稿"""
+        started = time.perf_counter()
         try:
             message = update.message
             user_id = message.from_user.id
-            # 检查发送频率
-            can_submit, error_msg = self.rate_limiter.can_submit(user_id)
+            group_id = message.media_group_id
+            # 本更新在独立的任务中处理，之后的日志都带上用户 ID
+            user_id_var.set(user_id)
+
+            item = MediaItem.from_message(message)
+            # 处理媒体组消息，等待静默期结束或文件数达到上限后统一处理；
+            # 只有媒体组的第一个文件计入发送频率
+            if group_id and item:
+                is_new = await self.media_groups.add(group_id, user_id, message.chat_id, context.bot, item)
+                if not is_new:
+                    return
+                can_submit, error_msg = await self._check_rate_limit(user_id)
+                if not can_submit:
+                    await self.media_groups.reject(group_id)
+                    await message.reply_text(f"❌ {error_msg}")
+                    return
+                logger.debug("等待媒体组 %s 的其他文件...", group_id)
+                return
+
+            # 检查发送频率并记录本次发送
+            can_submit, error_msg = await self._check_rate_limit(user_id)
             if not can_submit:
                 await message.reply_text(f"❌ {error_msg}")
                 return
-            
-            media = []
-            media_messages = []    
-            # 记录本次发送
-            self.rate_limiter.add_message(user_id)
+
             text = message.caption if message.caption else message.text
-            # 处理媒体组消息
-            if message.media_group_id:
-                # 初始化媒体组
-                if message.media_group_id not in self.media_groups:
-                    self.media_groups[message.media_group_id] = {
-                        'messages': [],
-                        'text': text,
-                        'timestamp': datetime.now()
-                    }
-                
-                # 添加到媒体组
-                self.media_groups[message.media_group_id]['messages'].append(message)
-                current_messages = self.media_groups[message.media_group_id]['messages']
-                if len(current_messages) < 3:
-                    logger.info(f"等待媒体组 {message.media_group_id} 的其他文件...")
-                    return
-                
-
-
-            if message.media_group_id and message.media_group_id in self.media_groups:
-                media_data = self.media_groups[message.media_group_id]
-                media_messages = sorted(media_data['messages'], key=lambda x: x.message_id)
-                text = media_data['text']
-            elif message.photo or message.video:
-                media_messages = [message]
-            # 验证模板格式
-            is_valid, error_msg = validate_template(text)
-            if is_valid:
-                # 检查违禁词
-                if contains_forbidden_words(text):
-                    logger.warning(f"用户 {user_id} 的投稿包含违禁词")
-                    await message.reply_text(
-                        "❌ 投稿内容包含违禁词！\n"
-                        "请修改后重新提交。\n"
-                        "注意: 请勿发布违规内容。"
-                    )
-                    return
-                
-                if media_messages:
-                    first_msg = media_messages[0]
-                    if first_msg.photo:
-                        media.append(
-                            InputMediaPhoto(
-                                media=first_msg.photo[-1].file_id,
-                                caption=text,
-                                parse_mode='HTML'
-                            )
-                        )
-                    elif first_msg.video:
-                        media.append(
-                            InputMediaVideo(
-                                media=first_msg.video.file_id,
-                                caption=text,
-                                parse_mode='HTML'
-                            )
-                        )
-                        
-                # 处理剩余媒体文件
-                for msg in media_messages[1:]:
-                    if msg.photo:
-                        media.append(InputMediaPhoto(media=msg.photo[-1].file_id))
-                    elif msg.video:
-                        media.append(InputMediaVideo(media=msg.video.file_id))
-                    
-                target_channel_id = BOOM_CHANNEL_ID if "吃🐔雷报" in text else RECORDING_CHANNEL_ID
-
-                if media:
-                    # 发送媒体组
-                    await context.bot.send_media_group(chat_id=target_channel_id, media=media)
-                else:
-                    await context.bot.send_message(
-                        chat_id=target_channel_id,
-                        text=text,
-                        parse_mode='HTML',
-                        disable_web_page_preview=False
-                    )
-                
-                if message.media_group_id:
-                    del self.media_groups[message.media_group_id]
-
-                logger.info(f"已转发来自用户 {user_id} 的投稿")
-                await update.message.reply_text(f"✅ 您的投稿已成功转发到频道 {target_channel_id}！")
-            else:
-                await update.message.reply_text(f"❌ 投稿失败，模板格式不正确！\n{error_msg}")
-                logger.info(error_msg)
+            await self.publish_submission(
+                context.bot, f"{message.chat_id}:{message.message_id}",
+                message.chat_id, user_id, text, [item] if item else []
+            )
         except Exception as e:
-            logger.error(f"转发消息失败: {e}")
+            self._count("error", update.effective_user.id if update.effective_user else None)
+            logger.error("转发消息失败: %s", e)
             await update.message.reply_text("❌ 投稿失败，请稍后重试！")
-        
-def contains_forbidden_words(text: str) -> bool:
+        finally:
+            self._handle_seconds.observe(time.perf_counter() - started)
+
+    async def _check_rate_limit(self, user_id: int) -> Tuple[bool, str]:
+        """检查发送频率并记录本次发送"""
+        stage_started = time.perf_counter()
+        can_submit, error_msg = await self.rate_limiter.acquire(user_id)
+        self._rate_limit_seconds.observe(time.perf_counter() - stage_started)
+        if not can_submit:
+            self._count("rate_limited", user_id)
+        return can_submit, error_msg
+
+    async def _publish_media_group(self, group: MediaGroup):
+        """媒体组聚合完成后的回调"""
+        try:
+            items = group.sorted_items()
+            await self.publish_submission(
+                group.bot, f"{group.chat_id}:{items[0].message_id}",
+                group.chat_id, group.user_id, group.caption, items
+            )
+        except Exception as e:
+            logger.error("转发媒体组 %s 失败: %s", group.group_id, e)
+            await group.bot.send_message(chat_id=group.chat_id, text="❌ 投稿失败，请稍后重试！")
+
+    async def publish_submission(self, bot, submission_id: str, chat_id: int, user_id: int,
+                                 text: Optional[str], items: List[MediaItem]):
+        """把投稿送入处理流水线，流水线繁忙时在此等待"""
+        with log_context(submission_id, user_id):
+            if PIPELINE['ACK']:
+                self.notify_user(bot, chat_id, "📥 已收到您的投稿，正在处理...")
+            await self.pipeline.submit(SubmissionContext(bot, submission_id, chat_id, user_id, text, items))
+
+    def _build_pipeline(self) -> Pipeline:
+        workers = PIPELINE['WORKERS']
+        queue_size = PIPELINE['QUEUE_SIZE']
+        return Pipeline([
+            Stage(name, handler, workers[name], queue_size, on_error=self._on_stage_error, tenant=self.tenant)
+            for name, handler in (
+                ('validate', self._stage_validate),
+                ('moderate', self._stage_moderate),
+                ('route', self._stage_route),
+                ('publish', self._stage_publish),
+            )
+        ])
+
+    async def _on_stage_error(self, ctx: SubmissionContext, error: Exception):
+        self._count("error", ctx.user_id, ctx.parsed.kind if ctx.parsed else None)
+        self._forget(ctx.submission_id)
+        await ctx.bot.send_message(chat_id=ctx.chat_id, text="❌ 投稿失败，请稍后重试！")
+
+    async def _stage_validate(self, ctx: SubmissionContext) -> Optional[SubmissionContext]:
+        """解析并验证模板格式"""
+        # 整个处理过程使用同一个快照，热更新不影响处理中的投稿
+        ctx.snapshot = get_snapshot(self.tenant)
+        stage_started = time.perf_counter()
+        ctx.parsed = parse_submission(ctx.text, ctx.snapshot)
+        self._validate_seconds.observe(time.perf_counter() - stage_started)
+        if not ctx.parsed.is_valid:
+            reason = 'missing_fields' if ctx.parsed.missing_fields or not ctx.text else 'empty_fields'
+            self._count("invalid", ctx.user_id, ctx.parsed.kind, reason=reason)
+            await ctx.bot.send_message(
+                chat_id=ctx.chat_id,
+                text=f"❌ 投稿失败，模板格式不正确！\n{ctx.parsed.error_message}"
+            )
+            logger.debug("模板格式不正确: %s", ctx.parsed.error_message)
+            return None
+        return ctx
+
+    async def _stage_moderate(self, ctx: SubmissionContext) -> Optional[SubmissionContext]:
+        """检查违禁词与重复投稿"""
+        stage_started = time.perf_counter()
+        forbidden = contains_forbidden_words(ctx.text, ctx.snapshot)
+        self._forbidden_seconds.observe(time.perf_counter() - stage_started)
+        if forbidden:
+            self._count("forbidden", ctx.user_id, ctx.parsed.kind)
+            logger.info("用户 %s 的投稿包含违禁词", ctx.user_id)
+            await ctx.bot.send_message(
+                chat_id=ctx.chat_id,
+                text=(
+                    "❌ 投稿内容包含违禁词！\n"
+                    "请修改后重新提交。\n"
+                    "注意: 请勿发布违规内容。"
+                )
+            )
+            return None
+
+        # 检查重复投稿，只比较字段内容，忽略模板本身的固定文字
+        if self.deduplicator is not None:
+            fingerprint_text = '\n'.join(ctx.parsed.fields.values()) or ctx.text
+            file_uids = [item.file_unique_id for item in ctx.items]
+            # 近似重复只与同一用户之前的投稿比较
+            duplicate = self.deduplicator.find(fingerprint_text, file_uids, scope=ctx.user_id)
+            if duplicate:
+                self._count("duplicate", ctx.user_id, ctx.parsed.kind)
+                logger.info(
+                    "用户 %s 的投稿与 %s 重复（%s，相似度 %.2f）",
+                    ctx.user_id, duplicate.submission_id, duplicate.reason, duplicate.similarity,
+                )
+                await ctx.bot.send_message(chat_id=ctx.chat_id, text="❌ 请勿重复投稿，相同内容已经提交过了")
+                return None
+            self.deduplicator.add(ctx.submission_id, fingerprint_text, file_uids, scope=ctx.user_id)
+        return ctx
+
+    async def _stage_route(self, ctx: SubmissionContext) -> Optional[SubmissionContext]:
+        """确定目标频道并落盘，重启后可重放未送达的投稿"""
+        ctx.record = SubmissionRecord(
+            id=ctx.submission_id,
+            user_id=ctx.user_id,
+            chat_id=ctx.chat_id,
+            kind=ctx.parsed.kind,
+            fields=ctx.parsed.fields,
+            text=ctx.text,
+            media=[(item.media_type, item.file_id) for item in ctx.items],
+            target_channel=ctx.snapshot.registry.channels[ctx.parsed.kind],
+        )
+        ctx.targets = ctx.snapshot.registry.targets(ctx.parsed.kind, ctx.parsed.fields)
+        if self.store:
+            self.store.record(ctx.record)
+        return ctx
+
+    async def _stage_publish(self, ctx: SubmissionContext) -> None:
+        """交给出站调度器发送；出站队列接近上限时等待，而不是拒绝"""
+        await self.scheduler.wait_for_capacity()
+        if not self.deliver(ctx.bot, ctx.record, ctx.targets):
+            await ctx.bot.send_message(chat_id=ctx.chat_id, text="❌ 当前投稿较多，请稍后重试！")
+        return None
+
+    def deliver(self, bot, record: SubmissionRecord, targets: Optional[List[ChannelId]] = None,
+                finished: Optional[asyncio.Future] = None) -> bool:
+        """把投稿同时发往所有目标频道，全部发送结束后汇总通知用户；队列已满时返回 False
+
+        finished 在投稿发送结束（或排队失败）时设置结果：是否至少送达一个频道。
+        """
+        user_id = record.user_id
+        if targets is None:
+            # 重放的投稿按当前路由表重新计算目标频道
+            router = get_snapshot(self.tenant).registry.router
+            targets = router.resolve(record.kind, record.fields, record.target_channel)
+        targets = targets or [record.target_channel]
+        media = build_input_media(record.media, record.text)
+
+        async def finish(report: DeliveryReport):
+            if report.succeeded:
+                self._count("delivered", user_id, record.kind, report.succeeded)
+                if self.store:
+                    self.store.mark(record.id, STATUS_DELIVERED)
+                logger.info("已转发来自用户 %s 的投稿到 %d/%d 个频道",
+                            user_id, len(report.succeeded), len(report.targets))
+            else:
+                self._count("failed", user_id, record.kind)
+                self._forget(record.id)
+                if self.store:
+                    self.store.mark(record.id, STATUS_FAILED)
+            self.notify_user(bot, record.chat_id, report.message())
+            if finished is not None and not finished.done():
+                finished.set_result(bool(report.succeeded))
+
+        report = DeliveryReport(targets, finish, self.tenant)
+        if self.digest is not None and not media and record.kind in DIGEST['TYPES']:
+            # 纯文字投稿加入各目标频道的合集，合集发出后再汇总通知用户；
+            # 投稿是用户输入的纯文本，转义后一条投稿中的 "<" 等字符不会让整个合集无法解析
+            text = html.escape(record.text, quote=False)
+            for channel in targets:
+                self.digest.add(bot, channel, DigestEntry(text, partial(report.done, channel)))
+            self.notify_user(
+                bot, record.chat_id, f"📥 您的投稿已加入合集，将在 {DIGEST['WINDOW'] / 60:g} 分钟内发布"
+            )
+            return True
+        # 每个频道各自排队，出站调度器按频道并发发送
+        jobs = [
+            OutboundJob(
+                chat_id=channel,
+                send=self._channel_send(bot, channel, record.text, media),
+                cost=max(1, len(media)),
+                description=f"用户 {user_id} 的投稿 {record.id} -> {channel}",
+                on_success=partial(report.done, channel, True),
+                on_failure=partial(report.done, channel, False),
+            )
+            for channel in targets
+        ]
+        # 主频道排不进队列时整条投稿视为失败，其余频道排不进只记为该频道失败
+        if not self.scheduler.submit(jobs[0]):
+            self._count("queue_full", user_id, record.kind)
+            sampled_logger.warning("queue_full", "出站队列已满，拒绝用户 %s 的投稿", user_id)
+            self._forget(record.id)
+            if self.store:
+                self.store.mark(record.id, STATUS_FAILED)
+            if finished is not None and not finished.done():
+                finished.set_result(False)
+            return False
+        for job in jobs[1:]:
+            if not self.scheduler.submit(job):
+                report.skip(job.chat_id)
+        return True
+
+    async def _publish_digest(self, bot, channel: ChannelId, text: str, entries: List[DigestEntry]):
+        """合集作为一条消息交给出站调度器，发送结果通知合集中的每条投稿"""
+        async def on_done(ok: bool, _result=None):
+            for entry in entries:
+                await entry.on_done(ok)
+
+        async def on_failure(error: Exception):
+            if isinstance(error, BadRequest) and len(entries) > 1:
+                # 合集整体被拒绝（例如某条投稿无法解析），逐条单独发送，只有出错的那条失败
+                logger.warning("频道 %s 的合集被拒绝，改为逐条发送 %d 条投稿: %s", channel, len(entries), error)
+                for entry in entries:
+                    await self._publish_digest(bot, channel, entry.text, [entry])
+                return
+            await on_done(False)
+
+        job = OutboundJob(
+            chat_id=channel,
+            send=self._channel_send(bot, channel, text, []),
+            description=f"频道 {channel} 的合集（{len(entries)} 条）",
+            on_success=partial(on_done, True),
+            on_failure=on_failure,
+        )
+        if not self.scheduler.submit(job):
+            sampled_logger.warning("queue_full", "出站队列已满，频道 %s 的合集未能发送", channel)
+            await on_done(False)
+
+    def _channel_send(self, bot, channel: ChannelId, text: Optional[str], media: list):
+        if media:
+            # 发送媒体组，每个文件都计入频道配额
+            send = partial(bot.send_media_group, chat_id=channel, media=media)
+        else:
+            send = partial(
+                bot.send_message,
+                chat_id=channel,
+                text=text,
+                parse_mode='HTML',
+                disable_web_page_preview=False
+            )
+
+        async def send_to_channel():
+            send_started = time.perf_counter()
+            try:
+                return await send()
+            finally:
+                self._send_seconds.observe(time.perf_counter() - send_started)
+        return send_to_channel
+
+    def _count(self, outcome: str, user_id: Optional[int] = None, kind: Optional[str] = None,
+               channels: Iterable[ChannelId] = (), reason: Optional[str] = None):
+        """记录一次投稿结果：Prometheus 计数与按天滚动的投稿统计"""
+        metrics.SUBMISSIONS.labels(self.tenant, outcome).inc()
+        if self.stats:
+            self.stats.record(reason or outcome, user_id, kind, channels)
+
+    def _forget(self, submission_id: str):
+        """投递失败的投稿从去重索引中移除，允许用户重新提交"""
+        if self.deduplicator is not None:
+            self.deduplicator.discard(submission_id)
+
+    async def replay_pending(self, bot, live_owners: Iterable[str] = ()):
+        """认领并重新投递已退出实例未送达的投稿，等待它们发送结束"""
+        if not self.store:
+            return
+        pending = await self.store.claim_pending(live_owners)
+        if not pending:
+            return
+        loop = asyncio.get_running_loop()
+        deliveries = [loop.create_future() for _ in pending]
+        replayed = sum(
+            1 for record, finished in zip(pending, deliveries) if self.deliver(bot, record, finished=finished)
+        )
+        logger.info(f"已重新投递 {replayed}/{len(pending)} 条未送达的投稿")
+        delivered = sum(await asyncio.gather(*deliveries))
+        logger.info(f"重放的投稿已送达 {delivered}/{len(pending)} 条")
+
+    def notify_user(self, bot, chat_id: int, text: str):
+        """通过出站调度器给用户发送通知"""
+        self.scheduler.submit(OutboundJob(
+            chat_id=chat_id,
+            send=partial(bot.send_message, chat_id=chat_id, text=text),
+            description=f"通知用户 {chat_id}",
+        ))
+
+
+class DeliveryReport:
+    """一条投稿在各目标频道的发送结果，全部结束后调用一次 on_complete"""
+
+    def __init__(self, targets: List[ChannelId], on_complete: Callable[['DeliveryReport'], Awaitable[None]],
+                 tenant: str = DEFAULT_TENANT):
+        self.targets = targets
+        self.tenant = tenant
+        self.on_complete = on_complete
+        self.succeeded: List[ChannelId] = []
+        self.failed: List[ChannelId] = []
+
+    @property
+    def finished(self) -> bool:
+        return len(self.succeeded) + len(self.failed) == len(self.targets)
+
+    async def done(self, channel: ChannelId, ok: bool, _result=None):
+        metrics.ROUTE_DELIVERIES.labels(self.tenant, "delivered" if ok else "failed").inc()
+        (self.succeeded if ok else self.failed).append(channel)
+        if self.finished:
+            await self.on_complete(self)
+
+    def skip(self, channel: ChannelId):
+        """出站队列已满、未能排队的频道；此时主频道仍在排队，不会在这里结束"""
+        metrics.ROUTE_DELIVERIES.labels(self.tenant, "queue_full").inc()
+        self.failed.append(channel)
+
+    def message(self) -> str:
+        if not self.succeeded:
+            return "❌ 投稿失败，请稍后重试！"
+        if len(self.targets) == 1:
+            return f"✅ 您的投稿已成功转发到频道 {self.succeeded[0]}！"
+        lines = [f"✅ 您的投稿已转发到 {len(self.succeeded)}/{len(self.targets)} 个频道："]
+        lines.extend(f"✅ {channel}" for channel in self.succeeded)
+        lines.extend(f"❌ {channel}（发送失败）" for channel in self.failed)
+        return "\n".join(lines)
+
+
+def build_input_media(items: List[Tuple[str, str]], caption: Optional[str]) -> list:
+    """将 (media_type, file_id) 列表转换为 send_media_group 参数，说明文字放在第一个文件上"""
+    media = []
+    for index, (media_type, file_id) in enumerate(items):
+        kwargs = {'caption': caption, 'parse_mode': 'HTML'} if index == 0 else {}
+        if media_type == 'photo':
+            media.append(InputMediaPhoto(media=file_id, **kwargs))
+        elif media_type == 'video':
+            media.append(InputMediaVideo(media=file_id, **kwargs))
+    return media
+
+
+def contains_forbidden_words(text: str, snapshot: Optional[RuntimeSnapshot] = None) -> bool:
     """检查文本是否包含违禁词"""
     if not text:
         return False
-        
-    text = text.lower()  # 转换为小写
-    found_words = []
-    
-    for word in ALL_FORBIDDEN_WORDS:
-        if word in text:
-            found_words.append(word)
-            
-    if found_words:
-        logger.warning(f"检测到违禁词: {', '.join(found_words)}")
+
+    hits = (snapshot or get_snapshot()).matcher.find_all(text)
+    if hits:
+        # 命中违禁词属于常见情况，采样输出
+        if logger.isEnabledFor(logging.WARNING):
+            found = sorted({f"{hit.word}({hit.category})" for hit in hits})
+            sampled_logger.warning("forbidden_words", "检测到违禁词: %s", ', '.join(found))
         return True
-        
-    return False
 
+    return False
 
 
-def register_handlers(app):
+def register_handlers(app, scheduler: OutboundScheduler, store: Optional[SubmissionStore] = None,
+                      state: Optional[StateBackend] = None,
+                      admission: Optional[AdmissionController] = None,
+                      stats: Optional[SubmissionStats] = None,
+                      tenant: str = DEFAULT_TENANT) -> SubmissionHandler:
     """注册所有非命令处理器"""
     logger.info("开始注册处理器")
-    submission_handler = SubmissionHandler()
+    submission_handler = SubmissionHandler(scheduler, store, state, stats, tenant)
     message_filter = (
         (filters.TEXT | filters.PHOTO | filters.VIDEO) 
         & filters.ChatType.PRIVATE
@@ -211,5 +513,9 @@ def register_handlers(app):
         & ~filters.UpdateType.EDITED_MESSAGE
         & ~filters.COMMAND
     )
-    app.add_handler(MessageHandler(message_filter, submission_handler.handle_submission))
+    callback = submission_handler.handle_submission
+    if admission:
+        callback = admission.guard(callback, submission_handler.priority_of, submission_handler.on_shed)
+    app.add_handler(MessageHandler(message_filter, callback))
     logger.info("处理器注册完成")
+    return submission_handler
@@ -0,0 +1,152 @@
+"""健康检查：后台探测 Bot 状态并缓存结果"""
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+from telegram import Update
+from telegram.ext import ContextTypes
+from config import BOT_MODE, HEALTH
+from utils import logger, process_uptime
+
+
+class HealthMonitor:
+    """定期调用 getMe 探测 Bot 状态，健康检查接口直接读取内存中的快照"""
+
+    def __init__(
+        self,
+        state,
+        interval: float = HEALTH['PROBE_INTERVAL'],
+        timeout: float = HEALTH['PROBE_TIMEOUT'],
+    ):
+        self.state = state
+        self.interval = interval
+        self.timeout = timeout
+        # 超过两个探测周期未成功刷新即视为过期
+        self.stale_after = interval * 2 + timeout
+
+        self.bot_ok = False
+        self.bot_id: Optional[int] = None
+        self.detail = "尚未探测"
+        self.checked_at: Optional[str] = None
+        self._checked_mono = 0.0
+        self.probe_latency: Optional[float] = None
+
+        # 最近处理的更新
+        self.last_update_id: Optional[int] = None
+        self._last_update_mono: Optional[float] = None
+        self.update_lag: Optional[float] = None
+        # 进程启动到处理第一个更新的耗时
+        self.cold_start: Optional[float] = None
+
+    async def probe(self):
+        """探测一次 Bot 状态并刷新快照"""
+        application = self.state.application
+        started = time.monotonic()
+        try:
+            if not application or not application.bot:
+                self.bot_ok = False
+                self.detail = "Bot 未初始化或未连接"
+            else:
+                me = await asyncio.wait_for(application.bot.get_me(), timeout=self.timeout)
+                self.bot_ok = bool(me and me.id)
+                self.bot_id = me.id if me else None
+                self.detail = f"Bot 正常运行 (ID: {self.bot_id})" if self.bot_ok else "getMe 返回为空"
+        except Exception as e:
+            self.bot_ok = False
+            self.detail = f"Bot 状态检查失败: {e}"
+            logger.error(f"健康检查 - Bot 状态检查失败: {e}")
+        self.probe_latency = time.monotonic() - started
+        self._checked_mono = time.monotonic()
+        self.checked_at = datetime.now(timezone.utc).isoformat()
+
+    def _seed_from_application(self) -> bool:
+        """直接使用 initialize() 时 getMe 的结果，启动时少一次 API 调用"""
+        application = self.state.application
+        try:
+            me = application.bot.bot
+        except Exception:
+            return False
+        self.bot_ok = True
+        self.bot_id = me.id
+        self.detail = f"Bot 正常运行 (ID: {self.bot_id})"
+        self._checked_mono = time.monotonic()
+        self.checked_at = datetime.now(timezone.utc).isoformat()
+        return True
+
+    async def run(self):
+        """后台探测循环"""
+        if self._seed_from_application():
+            await asyncio.sleep(self.interval)
+        while True:
+            await self.probe()
+            await asyncio.sleep(self.interval)
+
+    async def record_update(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """记录最近处理的更新（注册在最高优先级的处理器组，不阻塞后续处理器）"""
+        if self.cold_start is None:
+            self.cold_start = process_uptime()
+            logger.info(f"冷启动耗时 {self.cold_start:.2f} 秒（进程启动到处理第一个更新）")
+        self.last_update_id = update.update_id
+        self._last_update_mono = time.monotonic()
+        message = update.effective_message
+        if message and message.date:
+            self.update_lag = (datetime.now(timezone.utc) - message.date).total_seconds()
+
+    @property
+    def is_stale(self) -> bool:
+        return time.monotonic() - self._checked_mono > self.stale_after
+
+    def liveness(self) -> Dict[str, Any]:
+        """存活检查：进程与事件循环可以响应即视为存活"""
+        return {
+            "status": "alive",
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        }
+
+    def readiness(self) -> Dict[str, Any]:
+        """就绪检查：Bot 探测正常、快照未过期且更新接收通道在运行"""
+        application = self.state.application
+        running = bool(application and application.running)
+        if BOT_MODE == 'webhook':
+            receiving = running
+        else:
+            updater = application.updater if application else None
+            receiving = bool(updater and updater.running)
+
+        scheduler = self.state.scheduler
+        handler = self.state.submission_handler
+        since_last_update = (
+            time.monotonic() - self._last_update_mono if self._last_update_mono is not None else None
+        )
+        ready = self.bot_ok and not self.is_stale and running and receiving
+        tenant = self.state.tenant
+        return {
+            "status": "ready" if ready else "not_ready",
+            "tenant": tenant.id if tenant is not None else None,
+            "bot": {
+                "ok": self.bot_ok,
+                "id": self.bot_id,
+                "detail": self.detail,
+                "checked_at": self.checked_at,
+                "probe_latency": self.probe_latency,
+                "stale": self.is_stale,
+            },
+            "updates": {
+                "mode": BOT_MODE,
+                "application_running": running,
+                "receiving": receiving,
+                "last_update_id": self.last_update_id,
+                "seconds_since_last_update": since_last_update,
+                "last_update_lag": self.update_lag,
+                "cold_start_seconds": self.cold_start,
+            },
+            "outbound": {
+                "pending": scheduler.pending if scheduler else 0,
+                "sent": scheduler.sent_count if scheduler else 0,
+                "failed": scheduler.failed_count if scheduler else 0,
+            },
+            "pipeline": handler.pipeline.stats() if handler else {},
+            "admission": self.state.admission.stats() if self.state.admission else {},
+            "transport": {name: request.stats() for name, request in (self.state.requests or {}).items()},
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        }
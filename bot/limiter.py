@@ -1,43 +1,129 @@
-from collections import defaultdict
-from datetime import datetime, timedelta
-from typing import Dict, Tuple
+import math
+import time
+from typing import Callable, Dict, Optional, Tuple
 from config import RATE_LIMIT
 
+
+class _UserBucket:
+    """单个用户的令牌桶记录"""
+    __slots__ = ('tokens', 'updated', 'blocked_until')
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+        self.blocked_until = 0.0
+
+
 class RateLimiter:
-    def __init__(self):
-        # 用户消息计数器
-        self.message_counts: Dict[int, int] = defaultdict(int)
-        # 用户最后发送时间
-        self.last_message_time: Dict[int, datetime] = defaultdict(datetime.now)
-        # 用户冷却时间
-        self.cooldowns: Dict[int, datetime] = defaultdict(datetime.now)
-        
+    """基于令牌桶的用户投稿频率限制
+
+    每个用户的桶容量为 MAX_MESSAGES，在 TIME_WINDOW 秒内匀速补满；
+    令牌耗尽后进入 COOLDOWN_TIME 秒冷却。时间统一使用 time.monotonic()，
+    空闲到桶已补满且不在冷却中的用户会被定期清理，内存只与活跃用户数相关。
+    """
+
+    def __init__(
+        self,
+        max_messages: Optional[int] = None,
+        time_window: Optional[float] = None,
+        cooldown_time: Optional[float] = None,
+        sweep_interval: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
         # 配置
-        self.MAX_MESSAGES = RATE_LIMIT['MAX_MESSAGES']  # 最大消息数
-        self.TIME_WINDOW = RATE_LIMIT['TIME_WINDOW']  # 时间窗口(秒)
-        self.COOLDOWN_TIME = RATE_LIMIT['COOLDOWN_TIME']  # 冷却时间(秒)
+        self.MAX_MESSAGES = max_messages or RATE_LIMIT['MAX_MESSAGES']  # 最大消息数
+        self.TIME_WINDOW = time_window or RATE_LIMIT['TIME_WINDOW']  # 时间窗口(秒)
+        self.COOLDOWN_TIME = cooldown_time or RATE_LIMIT['COOLDOWN_TIME']  # 冷却时间(秒)
+        self.SWEEP_INTERVAL = sweep_interval or RATE_LIMIT.get('SWEEP_INTERVAL', 300)  # 清理间隔(秒)
+
+        self._clock = clock
+        # 每秒补充的令牌数
+        self._refill_rate = self.MAX_MESSAGES / self.TIME_WINDOW
+        # 用户令牌桶，只为真正发送过消息的用户创建
+        self._buckets: Dict[int, _UserBucket] = {}
+        self._next_sweep = clock() + self.SWEEP_INTERVAL
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def configure(self, max_messages: int, time_window: float, cooldown_time: float):
+        """更新限流参数，已有的令牌桶按新容量截断"""
+        self.MAX_MESSAGES = max_messages
+        self.TIME_WINDOW = time_window
+        self.COOLDOWN_TIME = cooldown_time
+        self._refill_rate = max_messages / time_window
+        for bucket in self._buckets.values():
+            bucket.tokens = min(bucket.tokens, max_messages)
+
+    def _refill(self, bucket: _UserBucket, now: float):
+        elapsed = now - bucket.updated
+        if elapsed > 0:
+            bucket.tokens = min(self.MAX_MESSAGES, bucket.tokens + elapsed * self._refill_rate)
+            bucket.updated = now
+
+    def _maybe_sweep(self, now: float):
+        if now >= self._next_sweep:
+            self.sweep(now)
 
     def can_submit(self, user_id: int) -> Tuple[bool, str]:
         """检查用户是否可以发送消息"""
-        now = datetime.now()
-        
+        now = self._clock()
+        self._maybe_sweep(now)
+
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            return True, ""
+
         # 检查是否在冷却中
-        if user_id in self.cooldowns and now < self.cooldowns[user_id]:
-            remaining = (self.cooldowns[user_id] - now).seconds
+        if now < bucket.blocked_until:
+            remaining = math.ceil(bucket.blocked_until - now)
             return False, f"您需要等待 {remaining} 秒后才能继续投稿"
-            
-        # 清理过期的消息计数
-        if (now - self.last_message_time[user_id]).seconds > self.TIME_WINDOW:
-            self.message_counts[user_id] = 0
-            
+
         # 检查消息频率
-        if self.message_counts[user_id] >= self.MAX_MESSAGES:
-            self.cooldowns[user_id] = now + timedelta(seconds=self.COOLDOWN_TIME)
+        self._refill(bucket, now)
+        if bucket.tokens < 1:
+            bucket.blocked_until = now + self.COOLDOWN_TIME
             return False, f"发送过于频繁，已被限制 {self.COOLDOWN_TIME/60} 分钟"
-            
+
         return True, ""
 
     def add_message(self, user_id: int):
         """记录用户消息"""
-        self.message_counts[user_id] += 1
-        self.last_message_time[user_id] = datetime.now()
\ No newline at end of file
+        now = self._clock()
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            self._buckets[user_id] = _UserBucket(self.MAX_MESSAGES - 1, now)
+            return
+        self._refill(bucket, now)
+        bucket.tokens = max(0.0, bucket.tokens - 1)
+
+    def try_acquire(self, user_id: int) -> Tuple[bool, str]:
+        """检查并记录一条消息"""
+        allowed, error_msg = self.can_submit(user_id)
+        if allowed:
+            self.add_message(user_id)
+        return allowed, error_msg
+
+    async def acquire(self, user_id: int) -> Tuple[bool, str]:
+        """与共享状态后端一致的异步接口，进程内实现直接调用 try_acquire"""
+        return self.try_acquire(user_id)
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """清理空闲用户，返回清理的记录数
+
+        令牌桶补满且冷却结束的记录与"从未见过"的用户等价，删除不影响限流结果。
+        """
+        if now is None:
+            now = self._clock()
+        idle_after = self.TIME_WINDOW
+        expired = [
+            user_id for user_id, bucket in self._buckets.items()
+            if now - bucket.updated >= idle_after and now >= bucket.blocked_until
+        ]
+        for user_id in expired:
+            del self._buckets[user_id]
+        # dict 删除元素后不会收缩哈希表，大量清理后重建以归还内存
+        if len(expired) > len(self._buckets):
+            self._buckets = dict(self._buckets)
+        self._next_sweep = now + self.SWEEP_INTERVAL
+        return len(expired)
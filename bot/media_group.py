@@ -0,0 +1,172 @@
+"""媒体组（相册）聚合"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, List, NamedTuple, Optional, Set
+from utils import logger, sampled_logger
+
+# Telegram 单个媒体组最多 10 个文件
+MAX_MEDIA_GROUP_ITEMS = 10
+
+
+class MediaItem(NamedTuple):
+    """缓冲中的单个媒体文件，只保留转发所需的字段"""
+    message_id: int
+    file_id: str
+    file_unique_id: str
+    media_type: str  # 'photo' 或 'video'
+    caption: Optional[str]
+
+    @classmethod
+    def from_message(cls, message) -> Optional['MediaItem']:
+        """从 PTB Message 提取媒体记录，非图片/视频消息返回 None"""
+        if message.photo:
+            photo = message.photo[-1]
+            return cls(message.message_id, photo.file_id, photo.file_unique_id, 'photo', message.caption)
+        if message.video:
+            video = message.video
+            return cls(message.message_id, video.file_id, video.file_unique_id, 'video', message.caption)
+        return None
+
+
+class MediaGroup:
+    """一个正在聚合的媒体组"""
+    __slots__ = ('group_id', 'user_id', 'chat_id', 'bot', 'items', 'created', 'timer')
+
+    def __init__(self, group_id: str, user_id: int, chat_id: int, bot: Any, created: float):
+        self.group_id = group_id
+        self.user_id = user_id
+        self.chat_id = chat_id
+        self.bot = bot
+        self.items: List[MediaItem] = []
+        self.created = created
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def caption(self) -> Optional[str]:
+        """媒体组的说明文字（Telegram 只在其中一条消息上携带）"""
+        for item in self.items:
+            if item.caption:
+                return item.caption
+        return None
+
+    def sorted_items(self) -> List[MediaItem]:
+        return sorted(self.items, key=lambda item: item.message_id)
+
+
+class MediaGroupAggregator:
+    """按 media_group_id 聚合相册消息
+
+    每个媒体组在静默 quiet_period 秒后或达到 max_items 个文件时（先到者为准）
+    交给 on_flush 处理。缓冲的媒体组数量不超过 max_groups，超出时丢弃最早的；
+    单个媒体组从第一条消息起最多缓冲 ttl 秒。已处理或被拒绝的媒体组在 ttl 内
+    记为已关闭，迟到的文件直接丢弃，不会作为没有说明文字的新媒体组再次发布。
+    """
+
+    def __init__(
+        self,
+        on_flush: Callable[[MediaGroup], Awaitable[None]],
+        quiet_period: float = 1.5,
+        max_items: int = MAX_MEDIA_GROUP_ITEMS,
+        max_groups: int = 1000,
+        ttl: float = 30,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.on_flush = on_flush
+        self.quiet_period = quiet_period
+        self.max_items = max_items
+        self.max_groups = max_groups
+        self.ttl = ttl
+        self._clock = clock
+        self._groups: 'OrderedDict[str, MediaGroup]' = OrderedDict()
+        # 持有 flush 任务的引用，避免被垃圾回收
+        self._flush_tasks: Set[asyncio.Task] = set()
+        # 已处理或被拒绝（例如触发限流）的媒体组，在 ttl 内丢弃其后续文件
+        self._closed: 'OrderedDict[str, float]' = OrderedDict()
+
+    def __contains__(self, group_id: str) -> bool:
+        return group_id in self._groups
+
+    def __len__(self) -> int:
+        return len(self._groups)
+
+    async def add(self, group_id: str, user_id: int, chat_id: int, bot: Any, item: MediaItem) -> bool:
+        """加入一条媒体消息，返回是否为新的媒体组；已处理或被拒绝的媒体组直接丢弃"""
+        now = self._clock()
+        if self._is_closed(group_id, now):
+            return False
+        group = self._groups.get(group_id)
+        is_new = group is None
+        if is_new:
+            self._evict_overflow()
+            group = MediaGroup(group_id, user_id, chat_id, bot, now)
+            self._groups[group_id] = group
+
+        group.items.append(item)
+        if len(group.items) >= self.max_items:
+            self._flush(group_id)
+        else:
+            self._schedule(group, now)
+        return is_new
+
+    async def reject(self, group_id: str):
+        """丢弃媒体组，并忽略其后续到达的文件"""
+        group = self._groups.pop(group_id, None)
+        if group is not None and group.timer is not None:
+            group.timer.cancel()
+        self._close(group_id)
+
+    def _close(self, group_id: str):
+        """记录已关闭的媒体组，最多保留 max_groups 个"""
+        self._closed[group_id] = self._clock() + self.ttl
+        self._closed.move_to_end(group_id)
+        while len(self._closed) > self.max_groups:
+            self._closed.popitem(last=False)
+
+    def _is_closed(self, group_id: str, now: float) -> bool:
+        while self._closed:
+            oldest, expires = next(iter(self._closed.items()))
+            if expires > now:
+                break
+            del self._closed[oldest]
+        return group_id in self._closed
+
+    def _schedule(self, group: MediaGroup, now: float):
+        if group.timer is not None:
+            group.timer.cancel()
+        # 静默期与剩余存活时间取较小值，持续有新文件的媒体组也会在 ttl 内刷出
+        delay = max(0.0, min(self.quiet_period, group.created + self.ttl - now))
+        loop = asyncio.get_running_loop()
+        group.timer = loop.call_later(delay, self._flush, group.group_id)
+
+    def _evict_overflow(self):
+        while len(self._groups) >= self.max_groups:
+            group_id, group = self._groups.popitem(last=False)
+            if group.timer is not None:
+                group.timer.cancel()
+            sampled_logger.warning("media_group_overflow", "媒体组缓冲已满，丢弃最早的媒体组 %s（%d 个文件）", group_id, len(group.items))
+
+    def _flush(self, group_id: str):
+        group = self._groups.pop(group_id, None)
+        if group is None:
+            return
+        if group.timer is not None:
+            group.timer.cancel()
+            group.timer = None
+        self._close(group_id)
+        task = asyncio.get_running_loop().create_task(self._run_flush(group))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def _run_flush(self, group: MediaGroup):
+        try:
+            await self.on_flush(group)
+        except Exception as e:
+            logger.error(f"处理媒体组 {group.group_id} 时出错: {e}", exc_info=True)
+
+    async def flush_all(self):
+        """立即刷出所有缓冲的媒体组并等待处理完成"""
+        for group_id in list(self._groups):
+            self._flush(group_id)
+        if self._flush_tasks:
+            await asyncio.gather(*self._flush_tasks, return_exceptions=True)
@@ -0,0 +1,248 @@
+"""Prometheus 文本格式指标
+
+热路径只做整数/浮点累加：带标签的指标在首次使用时创建子项并缓存，
+之后的 inc/observe 不再分配对象。
+"""
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from utils import queue_handler
+
+# 默认延迟分桶(秒)，覆盖本地处理的微秒级到 Telegram API 的秒级
+DEFAULT_BUCKETS = (
+    0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        REGISTRY.register(self)
+
+    def labels(self, *values):
+        """获取（首次时创建）对应标签的子指标"""
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        lines.extend(self._samples())
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+    type_name = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1):
+        self._default.inc(amount)
+
+    def _samples(self):
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"
+            for key, child in self._children.items()
+        ]
+
+
+class _HistogramChild:
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        # 每个分桶单独计数，输出时再累加
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(_Metric):
+    """固定分桶的直方图"""
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.bounds = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    def _samples(self):
+        lines = []
+        for key, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.bounds + (float('inf'),), child.counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class Gauge(_Metric):
+    """读取时通过回调取值的仪表，热路径零开销"""
+    type_name = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), type_name: Optional[str] = None):
+        super().__init__(name, documentation, labelnames)
+        if type_name:
+            self.type_name = type_name
+        self._functions: Dict[Tuple[str, ...], Callable[[], float]] = {}
+
+    def set_function(self, func: Callable[[], float], *labelvalues):
+        self._functions[tuple(str(value) for value in labelvalues)] = func
+
+    def _samples(self):
+        lines = []
+        for key, func in list(self._functions.items()):
+            try:
+                value = float(func())
+            except Exception:
+                continue
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric):
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 投稿处理
+SUBMISSIONS = Counter(
+    "submit_bot_submissions_total", "按结果统计的投稿数", ("tenant", "outcome")
+)
+HANDLE_SUBMISSION_SECONDS = Histogram(
+    "submit_bot_handle_submission_seconds", "handle_submission 单次处理耗时", ("tenant",)
+)
+STAGE_SECONDS = Histogram(
+    "submit_bot_stage_seconds", "投稿处理各阶段耗时", ("tenant", "stage")
+)
+
+# Telegram Bot API 调用
+TELEGRAM_API_SECONDS = Histogram(
+    "submit_bot_telegram_api_seconds", "Telegram Bot API 调用耗时", ("tenant", "method")
+)
+TELEGRAM_API_ERRORS = Counter(
+    "submit_bot_telegram_api_errors_total", "Telegram Bot API 调用异常数", ("tenant", "method")
+)
+TELEGRAM_POOL_WAIT_SECONDS = Histogram(
+    "submit_bot_telegram_pool_wait_seconds", "Bot API 请求等待连接池分配连接的耗时", ("pool",),
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 3.0, 10.0),
+)
+TELEGRAM_CONNECT_SECONDS = Histogram(
+    "submit_bot_telegram_connect_seconds", "新建 Bot API 连接（TCP + TLS）的耗时", ("pool",)
+)
+TELEGRAM_CONNECTIONS = Counter(
+    "submit_bot_telegram_connections_total", "Bot API 请求使用的连接，按新建/复用统计", ("pool", "state")
+)
+
+# 内存中的状态规模
+MEDIA_GROUPS_BUFFERED = Gauge("submit_bot_media_groups_buffered", "正在缓冲的媒体组数量", ("tenant",))
+RATE_LIMITER_USERS = Gauge("submit_bot_rate_limiter_users", "限流器中保存的用户记录数", ("tenant",))
+OUTBOUND_PENDING = Gauge("submit_bot_outbound_pending", "出站调度器排队中的发送任务数", ("tenant",))
+OUTBOUND_SENT = Gauge("submit_bot_outbound_sent_total", "出站调度器发送成功数", ("tenant",), type_name="counter")
+OUTBOUND_FAILED = Gauge("submit_bot_outbound_failed_total", "出站调度器最终失败数", ("tenant",), type_name="counter")
+OUTBOUND_RETRIES = Gauge("submit_bot_outbound_retries_total", "出站调度器重试次数", ("tenant",), type_name="counter")
+PIPELINE_QUEUE_DEPTH = Gauge("submit_bot_pipeline_queue_depth", "投稿流水线各阶段排队数", ("tenant", "stage"))
+PIPELINE_BUSY = Gauge("submit_bot_pipeline_busy_workers", "投稿流水线各阶段正在处理的工作协程数", ("tenant", "stage"))
+PIPELINE_PROCESSED = Gauge(
+    "submit_bot_pipeline_processed_total", "投稿流水线各阶段处理的条目数", ("tenant", "stage"), type_name="counter"
+)
+COLD_START_SECONDS = Gauge("submit_bot_cold_start_seconds", "进程启动到处理第一个更新的耗时", ("tenant",))
+ROUTE_DELIVERIES = Counter(
+    "submit_bot_route_deliveries_total", "按结果统计的各目标频道发送次数", ("tenant", "outcome")
+)
+DIGEST_BUFFERED = Gauge("submit_bot_digest_buffered", "合集模式下等待合并发送的投稿数", ("tenant",))
+ADMISSION_ACTIVE = Gauge("submit_bot_admission_active", "准入控制下正在处理的更新数")
+ADMISSION_WAITING = Gauge("submit_bot_admission_waiting", "准入控制下排队等待的更新数")
+ADMISSION_SHED = Counter("submit_bot_admission_shed_total", "负载过高被拒绝的更新数", ("tenant", "priority"))
+LOOP_LAG_SECONDS = Histogram(
+    "submit_bot_event_loop_lag_seconds", "事件循环延迟（哨兵任务实际唤醒时间比预期晚的时长）",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+LOG_DROPPED = Gauge("submit_bot_log_dropped_total", "日志队列写满而丢弃的日志数", type_name="counter")
+LOG_DROPPED.set_function(lambda: queue_handler.dropped)
+
+
+def render_metrics() -> str:
+    """输出 Prometheus 文本格式"""
+    return REGISTRY.render()
@@ -0,0 +1,98 @@
+"""记录已处理完的更新位置，重启后跳过已处理的更新"""
+import asyncio
+import heapq
+import time
+from typing import List, Optional, Set
+from utils import logger
+
+# 在投稿存储 meta 表中的键
+OFFSET_KEY = 'last_processed_update_id'
+OFFSET_TIME_KEY = 'last_processed_update_time'
+# 超过一周没有新更新时 Telegram 会随机选取下一个更新 ID，更早保存的水位不再可信
+RESTORE_MAX_AGE = 6 * 86400
+# 更新 ID 比读回的水位小这么多时，视为 Telegram 已重新编号
+RESTORE_MAX_GAP = 100000
+
+
+class UpdateOffsetTracker:
+    """跟踪已处理完的更新 ID 水位
+
+    更新并发处理、完成顺序不固定，水位取"所有不大于它的更新都已处理完"的最大 ID：
+    正在处理的更新用最小堆记录，最早开始的更新完成前水位不会越过它。水位定期写入
+    投稿存储，启动时读回，Telegram 重新推送（webhook 重试、轮询确认前进程退出等）
+    的已处理更新会被跳过。
+
+    读回的水位只用于启动时的积压：收到第一个更大的更新 ID、或更新 ID 远小于水位
+    （Telegram 重新编号）时即失效。它只避免重复处理，不保证不丢更新——轮询在
+    取回更新时即已确认，webhook 在更新入队后即返回 200，进程在处理完成前退出时
+    这些更新不会再次推送。
+    """
+
+    def __init__(self, store=None, flush_interval: float = 5.0):
+        self.store = store
+        self.flush_interval = flush_interval
+        self.watermark: Optional[int] = None  # 已处理完的最大连续更新 ID
+        self._restored: Optional[int] = None  # 启动时读回的水位
+        self._in_flight: List[int] = []
+        self._finished: Set[int] = set()
+        self._saved: Optional[int] = None
+        self.skipped = 0
+
+    async def load(self):
+        """从存储读回上次的水位"""
+        if not self.store:
+            return
+        value = await self.store.get_meta(OFFSET_KEY)
+        if value is None:
+            return
+        saved_at = await self.store.get_meta(OFFSET_TIME_KEY)
+        if saved_at is None or time.time() - float(saved_at) > RESTORE_MAX_AGE:
+            logger.info(f"上次保存的更新位置 {value} 已过期，不跳过任何更新")
+            return
+        self._restored = self.watermark = self._saved = int(value)
+        logger.info(f"上次处理到更新 {self._restored}，之前的更新将被跳过")
+
+    def should_skip(self, update_id: int) -> bool:
+        """是否为上次运行中已处理过的更新"""
+        if self._restored is None:
+            return False
+        if update_id > self._restored:
+            # 积压的重复更新已过去，之后不再比较
+            self._restored = None
+            return False
+        if self._restored - update_id > RESTORE_MAX_GAP:
+            logger.warning(f"更新 {update_id} 远小于上次处理到的 {self._restored}，更新 ID 已重新编号")
+            self._restored = None
+            self.watermark = None
+            return False
+        self.skipped += 1
+        return True
+
+    def begin(self, update_id: int):
+        heapq.heappush(self._in_flight, update_id)
+
+    def done(self, update_id: int):
+        self._finished.add(update_id)
+        # 弹出堆顶所有已完成的更新，水位推进到第一个仍在处理的更新之前
+        while self._in_flight and self._in_flight[0] in self._finished:
+            finished = heapq.heappop(self._in_flight)
+            self._finished.discard(finished)
+            if self.watermark is None or finished > self.watermark:
+                self.watermark = finished
+
+    def save(self):
+        """水位有变化时写入存储（随存储的下一次批量提交落盘）"""
+        if self.store and self.watermark is not None and self.watermark != self._saved:
+            self.store.set_meta(OFFSET_KEY, str(self.watermark))
+            self.store.set_meta(OFFSET_TIME_KEY, str(time.time()))
+            self._saved = self.watermark
+
+    async def run(self):
+        """定期保存水位"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self.save()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._in_flight)
@@ -0,0 +1,192 @@
+"""分阶段的投稿处理流水线
+
+各阶段之间用有界队列连接，每个阶段有固定数量的工作协程。下游处理不过来时
+上游的 put 会等待，压力一路传回更新处理，而不是无限制地堆积任务。
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from utils import log_context, logger
+from bot import metrics
+from bot.tenants import DEFAULT_TENANT
+
+# 吞吐量统计窗口(秒)
+THROUGHPUT_WINDOW = 10
+
+
+@dataclass
+class SubmissionContext:
+    """在流水线各阶段之间传递的一条投稿"""
+    bot: Any
+    submission_id: str
+    chat_id: int
+    user_id: int
+    text: Optional[str]
+    items: list
+    snapshot: Any = None          # 开始处理时的运行时快照
+    parsed: Any = None            # 模板解析结果
+    record: Any = None            # 待投递的 SubmissionRecord
+    targets: list = field(default_factory=list)  # 路由得到的全部目标频道
+    received_at: float = field(default_factory=time.monotonic)
+
+
+class Stage:
+    """流水线中的一个阶段
+
+    handler 返回下一阶段的输入，返回 None 表示该条目在本阶段结束（例如校验失败）。
+    """
+
+    def __init__(self, name: str, handler: Callable[[Any], Awaitable[Optional[Any]]],
+                 workers: int = 1, queue_size: int = 100,
+                 on_error: Optional[Callable[[Any, Exception], Awaitable[None]]] = None,
+                 tenant: str = DEFAULT_TENANT):
+        self.name = name
+        self.handler = handler
+        self.on_error = on_error
+        self.workers = workers
+        self.queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self.next: Optional['Stage'] = None
+        self._tasks: List[asyncio.Task] = []
+
+        # 统计
+        self.processed = 0
+        self.completed = 0   # 在本阶段结束的条目数
+        self.errors = 0
+        self.busy = 0
+        self._second_counts = [0] * THROUGHPUT_WINDOW
+        self._second_stamps = [0] * THROUGHPUT_WINDOW
+
+        self._latency = metrics.STAGE_SECONDS.labels(tenant, f"pipeline_{name}")
+        metrics.PIPELINE_QUEUE_DEPTH.set_function(self.queue.qsize, tenant, name)
+        metrics.PIPELINE_BUSY.set_function(lambda: self.busy, tenant, name)
+        metrics.PIPELINE_PROCESSED.set_function(lambda: self.processed, tenant, name)
+
+    async def put(self, item: Any):
+        """放入一个条目，队列已满时等待"""
+        await self.queue.put(item)
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        self._tasks = [
+            loop.create_task(self._worker(), name=f'pipeline_{self.name}_{index}')
+            for index in range(self.workers)
+        ]
+
+    def _count(self):
+        second = int(time.monotonic())
+        slot = second % THROUGHPUT_WINDOW
+        if self._second_stamps[slot] != second:
+            self._second_stamps[slot] = second
+            self._second_counts[slot] = 0
+        self._second_counts[slot] += 1
+        self.processed += 1
+
+    @property
+    def throughput(self) -> float:
+        """最近 THROUGHPUT_WINDOW 秒的平均处理速率（条/秒）"""
+        now = int(time.monotonic())
+        total = sum(
+            count for stamp, count in zip(self._second_stamps, self._second_counts)
+            if now - stamp < THROUGHPUT_WINDOW
+        )
+        return total / THROUGHPUT_WINDOW
+
+    async def _worker(self):
+        while True:
+            item = await self.queue.get()
+            self.busy += 1
+            started = time.perf_counter()
+            try:
+                with log_context(getattr(item, 'submission_id', None), getattr(item, 'user_id', None)):
+                    result = await self.handler(item)
+                    if result is None:
+                        self.completed += 1
+                    elif self.next is not None:
+                        await self.next.put(result)
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"流水线阶段 {self.name} 处理出错: {e}", exc_info=True)
+                if self.on_error:
+                    try:
+                        await self.on_error(item, e)
+                    except Exception as callback_error:
+                        logger.error(f"流水线错误回调出错: {callback_error}", exc_info=True)
+            finally:
+                self._latency.observe(time.perf_counter() - started)
+                self.busy -= 1
+                self._count()
+                self.queue.task_done()
+
+    async def join(self):
+        await self.queue.join()
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'workers': self.workers,
+            'queue_depth': self.queue.qsize(),
+            'queue_size': self.queue.maxsize,
+            'busy': self.busy,
+            'processed': self.processed,
+            'completed': self.completed,
+            'errors': self.errors,
+            'throughput': round(self.throughput, 2),
+        }
+
+
+class Pipeline:
+    """按顺序串联的多个阶段"""
+
+    def __init__(self, stages: List[Stage]):
+        self.stages = stages
+        for stage, following in zip(stages, stages[1:]):
+            stage.next = following
+        self._running = False
+
+    async def submit(self, item: Any):
+        """送入第一阶段，流水线繁忙时等待"""
+        await self.stages[0].put(item)
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    @property
+    def pending(self) -> int:
+        """各阶段排队及处理中的条目总数"""
+        return sum(stage.queue.qsize() + stage.busy for stage in self.stages)
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+        self._running = True
+
+    async def drain(self, timeout: float = 10) -> bool:
+        """等待已进入流水线的条目全部处理完，返回是否在 timeout 内完成"""
+        async def join_all():
+            for stage in self.stages:
+                await stage.join()
+        try:
+            await asyncio.wait_for(join_all(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def stop(self, timeout: float = 10):
+        """处理完已接收的条目后停止各阶段的工作协程"""
+        if not self._running:
+            return
+        if not await self.drain(timeout):
+            logger.warning(f"流水线停止时仍有 {self.pending} 条投稿未处理完")
+        for stage in self.stages:
+            await stage.stop()
+        self._running = False
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {stage.name: stage.stats() for stage in self.stages}
@@ -0,0 +1,143 @@
+"""投稿类型注册表：从配置文件读取，启动时编译为键盘、模板消息、回调分发表和解析器"""
+import json
+import os
+from dataclasses import dataclass, field
+from functools import partial
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Mapping, Optional, Union
+from telegram import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.constants import ParseMode
+from config import SUBMISSION_TYPES_PATH
+from utils import logger
+from bot.routing import RouteRule, RoutingEngine
+from bot.templates import TemplateParser
+
+
+@dataclass(frozen=True)
+class SubmissionType:
+    """一种投稿类型的定义"""
+    id: str                                # 同时作为按钮的 callback_data
+    label: str                             # 按钮文字
+    description: str                       # /start 欢迎语中的说明
+    instructions: str                      # 模板消息的说明文字
+    fields: List[str]                      # 必填字段
+    template_fields: List[str]             # 模板消息中列出的字段（可包含选填字段）
+    channel: Optional[Union[int, str]]     # 目标频道
+    marker: Optional[str] = None           # 出现该标记即识别为此类型
+    default: bool = False                  # 未命中任何标记时使用的类型
+    template_notes: List[str] = field(default_factory=list)   # 字段之后追加的固定行
+    valueless_fields: List[str] = field(default_factory=list)  # 只需出现、无需填写内容的字段
+
+    @classmethod
+    def from_config(cls, data: dict, env: Optional[Mapping[str, str]] = None) -> 'SubmissionType':
+        channel = data.get('channel')
+        if channel is None and data.get('channel_env'):
+            channel = (os.environ if env is None else env).get(data['channel_env'])
+        return cls(
+            id=data['id'],
+            label=data['label'],
+            description=data.get('description', data['label']),
+            instructions=data.get('instructions', ''),
+            fields=list(data['fields']),
+            template_fields=list(data.get('template_fields') or data['fields']),
+            channel=channel,
+            marker=data.get('marker'),
+            default=bool(data.get('default', False)),
+            template_notes=list(data.get('template_notes', [])),
+            valueless_fields=list(data.get('valueless_fields', [])),
+        )
+
+    def template_body(self) -> str:
+        """可直接复制的模板文本"""
+        lines = [self.marker] if self.marker else []
+        lines.extend(f"{name}：" for name in self.template_fields)
+        lines.extend(self.template_notes)
+        return '\n'.join(lines)
+
+
+@dataclass
+class TemplatePayload:
+    """预先生成的模板消息"""
+    text: str
+    parse_mode: str = ParseMode.MARKDOWN
+
+
+class SubmissionRegistry:
+    """编译后的投稿类型注册表，创建后只读，热更新时整体替换"""
+
+    def __init__(self, types: List[SubmissionType], welcome: str = "", welcome_footer: str = "",
+                 template_footer: str = "", routes: Optional[List[RouteRule]] = None):
+        if not types:
+            raise ValueError("至少需要定义一种投稿类型")
+        defaults = [item for item in types if item.default]
+        if len(defaults) > 1:
+            raise ValueError(f"只能有一个默认投稿类型: {', '.join(item.id for item in defaults)}")
+        ids = [item.id for item in types]
+        if len(set(ids)) != len(ids):
+            raise ValueError(f"投稿类型 id 重复: {ids}")
+
+        self.types: Dict[str, SubmissionType] = {item.id: item for item in types}
+        self.default_type = (defaults or types)[0]
+        self.channels: Dict[str, Optional[Union[int, str]]] = {item.id: item.channel for item in types}
+        for item in types:
+            if not item.channel:
+                logger.warning(f"投稿类型 {item.id} 未配置目标频道")
+
+        # /start 欢迎语与按钮
+        options = '\n'.join(f"{index}. {item.description}" for index, item in enumerate(types, 1))
+        self.welcome_text = f"{welcome}\n{options}\n\n{welcome_footer}".strip()
+        self.keyboard = InlineKeyboardMarkup(
+            [[InlineKeyboardButton(item.label, callback_data=item.id)] for item in types]
+        )
+
+        # 各类型的模板消息与回调分发表
+        self.templates: Dict[str, TemplatePayload] = {}
+        self.callbacks: Dict[str, Callable[[CallbackQuery], Awaitable]] = {}
+        for item in types:
+            payload = TemplatePayload(
+                f"*{item.instructions}* ⬇️：\n`\n{item.template_body()}\n`\n*{template_footer}*"
+            )
+            self.templates[item.id] = payload
+            self.callbacks[item.id] = partial(_send_template, payload)
+
+        # 投稿解析器
+        self.parser = TemplateParser(
+            required_fields={item.id: item.fields for item in types},
+            marker_kinds={item.marker: item.id for item in types if item.marker},
+            default_kind=self.default_type.id,
+            valueless_fields={name for item in types for name in item.valueless_fields},
+        )
+
+        # 按字段值转发到其他频道的路由表
+        self.router = RoutingEngine(routes or [], self.types)
+
+    def targets(self, kind: str, fields: Dict[str, str]) -> List[Union[int, str]]:
+        """投稿的全部目标频道，类型对应的主频道在前"""
+        return self.router.resolve(kind, fields, self.channels.get(kind))
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+
+async def _send_template(payload: TemplatePayload, query: CallbackQuery):
+    await query.message.reply_text(text=payload.text, parse_mode=payload.parse_mode)
+
+
+def load_registry(path: Union[str, Path] = SUBMISSION_TYPES_PATH,
+                  env: Optional[Mapping[str, str]] = None) -> SubmissionRegistry:
+    """读取投稿类型配置文件并编译；env 为 channel_env 的取值来源，默认读取环境变量"""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    types = [SubmissionType.from_config(item, env) for item in data['types']]
+    registry = SubmissionRegistry(
+        types,
+        welcome=data.get('welcome', ''),
+        welcome_footer=data.get('welcome_footer', ''),
+        template_footer=data.get('template_footer', ''),
+        routes=[RouteRule.from_config(item, env) for item in data.get('routes', [])],
+    )
+    logger.info(
+        f"已加载 {len(registry)} 种投稿类型: {', '.join(registry.types)}，路由规则 {len(registry.router)} 条"
+    )
+    return registry
+
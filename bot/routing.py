@@ -0,0 +1,151 @@
+"""投稿路由：按字段值把投稿同时转发到地区、专题频道
+
+路由规则在加载注册表时编译为索引：关键词规则按 (投稿类型, 字段) 合并为一个
+Aho-Corasick 自动机，数值区间规则按 (投稿类型, 字段) 切分为互不重叠的区段并
+预先算好每个区段命中的规则。解析一条投稿只需每个字段扫描一次、二分查找一次，
+与规则总数无关。
+"""
+import os
+import re
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Mapping, Optional, Set, Tuple, Union
+from utils import logger
+from bot.forbidden_matcher import ForbiddenWordMatcher, normalize_text
+
+ChannelId = Union[int, str]
+
+# 字段值中的第一个数字，支持 "1.5k"、"2w" 这类写法
+_NUMBER_RE = re.compile(r'(\d+(?:\.\d+)?)\s*([kKwW千万]?)')
+_UNITS = {'k': 1_000, 'K': 1_000, '千': 1_000, 'w': 10_000, 'W': 10_000, '万': 10_000}
+# 千分位分隔符："1,500"、"1，500"、"1 200" 中数字之间、后跟恰好三位数字的逗号或空白
+_THOUSANDS_RE = re.compile(r'(?<=\d)[,，\s](?=\d{3}(?!\d))')
+
+
+def parse_number(value: str) -> Optional[float]:
+    """取字段值中的第一个数字（去掉千分位分隔符），没有数字时返回 None"""
+    match = _NUMBER_RE.search(_THOUSANDS_RE.sub('', value or ''))
+    if not match:
+        return None
+    return float(match.group(1)) * _UNITS.get(match.group(2), 1)
+
+
+@dataclass(frozen=True)
+class RouteRule:
+    """一条路由规则：字段值包含任一关键词，或数值落在 [min, max) 区间时转发到 channel"""
+    name: str
+    channel: Optional[ChannelId]
+    field: str
+    types: Tuple[str, ...] = ()              # 适用的投稿类型，为空表示全部
+    keywords: Tuple[str, ...] = ()
+    min: Optional[float] = None
+    max: Optional[float] = None
+
+    @classmethod
+    def from_config(cls, data: dict, env: Optional[Mapping[str, str]] = None) -> 'RouteRule':
+        channel = data.get('channel')
+        if channel is None and data.get('channel_env'):
+            channel = (os.environ if env is None else env).get(data['channel_env'])
+        value_range = data.get('range') or [None, None]
+        if not isinstance(value_range, (list, tuple)) or len(value_range) != 2:
+            raise ValueError(f"路由规则 {data.get('name')} 的 range 需要 [下限, 上限] 两个值，得到 {value_range!r}")
+        rule = cls(
+            name=data['name'],
+            channel=channel,
+            field=data['field'],
+            types=tuple(data.get('types', ())),
+            keywords=tuple(data.get('contains', ())),
+            min=value_range[0],
+            max=value_range[1],
+        )
+        if not rule.keywords and rule.min is None and rule.max is None:
+            raise ValueError(f"路由规则 {rule.name} 需要 contains 或 range")
+        return rule
+
+
+class _RangeIndex:
+    """把若干 [min, max) 区间切分为互不重叠的区段，二分查找命中的规则"""
+
+    def __init__(self, rules: List[Tuple[int, Optional[float], Optional[float]]]):
+        self._bounds = sorted({bound for _, low, high in rules for bound in (low, high) if bound is not None})
+        # 区段 i 覆盖 [bounds[i-1], bounds[i])，首尾两段为无界区段
+        points = [float('-inf')] + self._bounds
+        self._segments: List[Tuple[int, ...]] = [
+            tuple(
+                index for index, low, high in rules
+                if (low is None or start >= low) and (high is None or start < high)
+            )
+            for start in points
+        ]
+
+    def lookup(self, value: float) -> Tuple[int, ...]:
+        return self._segments[bisect_right(self._bounds, value)]
+
+
+class _FieldIndex:
+    """同一 (投稿类型, 字段) 上所有规则的索引"""
+
+    def __init__(self, rules: List[Tuple[int, RouteRule]]):
+        keyword_rules: Dict[str, List[int]] = {}
+        for index, rule in rules:
+            for keyword in rule.keywords:
+                key = normalize_text(keyword)
+                if key:
+                    keyword_rules.setdefault(key, []).append(index)
+        # 自动机的分类即归一化后的关键词，多条规则共用同一关键词时一次命中全部返回
+        self._keyword_rules = keyword_rules
+        self._matcher = ForbiddenWordMatcher({key: [key] for key in keyword_rules}) if keyword_rules else None
+
+        ranges = [(index, rule.min, rule.max) for index, rule in rules
+                  if rule.min is not None or rule.max is not None]
+        self._ranges = _RangeIndex(ranges) if ranges else None
+
+    def lookup(self, value: str) -> Iterable[int]:
+        if self._matcher is not None:
+            for hit in self._matcher.find_all(value):
+                yield from self._keyword_rules[hit.category]
+        if self._ranges is not None:
+            number = parse_number(value)
+            if number is not None:
+                yield from self._ranges.lookup(number)
+
+
+class RoutingEngine:
+    """编译后的路由表，创建后只读，随注册表一起热更新"""
+
+    def __init__(self, rules: List[RouteRule], type_ids: Iterable[str]):
+        self.rules = rules
+        type_ids = list(type_ids)
+        grouped: Dict[Tuple[str, str], List[Tuple[int, RouteRule]]] = {}
+        for index, rule in enumerate(rules):
+            if not rule.channel:
+                logger.info(f"路由规则 {rule.name} 未配置目标频道，已忽略")
+                continue
+            unknown = set(rule.types) - set(type_ids)
+            if unknown:
+                raise ValueError(f"路由规则 {rule.name} 引用了不存在的投稿类型: {', '.join(sorted(unknown))}")
+            for type_id in rule.types or type_ids:
+                grouped.setdefault((type_id, rule.field), []).append((index, rule))
+
+        self._index: Dict[str, List[Tuple[str, _FieldIndex]]] = {}
+        for (type_id, field_name), field_rules in grouped.items():
+            self._index.setdefault(type_id, []).append((field_name, _FieldIndex(field_rules)))
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def resolve(self, kind: str, fields: Dict[str, str],
+                primary: Optional[ChannelId] = None) -> List[ChannelId]:
+        """返回投稿的全部目标频道：主频道在前，其余按规则声明顺序去重"""
+        matched: Set[int] = set()
+        for field_name, index in self._index.get(kind, ()):
+            value = fields.get(field_name)
+            if value:
+                matched.update(index.lookup(value))
+
+        targets: List[ChannelId] = [primary] if primary else []
+        for rule_index in sorted(matched):
+            channel = self.rules[rule_index].channel
+            if str(channel) not in {str(target) for target in targets}:
+                targets.append(channel)
+        return targets
@@ -0,0 +1,116 @@
+"""运行时配置快照：违禁词匹配器、投稿类型注册表与限流参数，支持不重启热更新
+
+快照创建后只读，每个租户各有一份。热更新在线程池中重新读取配置并构建新快照，完成后一次赋值替换；
+正在处理的投稿在开始时取得快照引用，会用旧快照处理完。热更新只覆盖快照中的内容（以及租户的管理员），
+config 中的其它配置在启动时读取，修改后需要重启。
+"""
+import asyncio
+import importlib
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+from utils import logger
+from bot.forbidden_matcher import ForbiddenWordMatcher, build_matcher
+from bot.registry import SubmissionRegistry, load_registry
+from bot.tenants import DEFAULT_TENANT, TenantConfig, find_tenant, load_forbidden_words
+
+
+@dataclass(frozen=True)
+class RuntimeSnapshot:
+    """一组同时生效的运行时配置"""
+    version: int
+    registry: SubmissionRegistry
+    matcher: ForbiddenWordMatcher
+    rate_limit: Dict[str, float]
+    build_seconds: float
+    tenant: Optional[TenantConfig] = None
+
+    @property
+    def tenant_id(self) -> str:
+        return self.tenant.id if self.tenant else DEFAULT_TENANT
+
+    def summary(self) -> str:
+        return (
+            f"租户 {self.tenant_id}，"
+            f"版本 {self.version}，构建耗时 {self.build_seconds * 1000:.1f} ms，"
+            f"违禁词 {len(self.matcher)} 个（自动机 {self.matcher.state_count} 个状态），"
+            f"投稿类型 {len(self.registry)} 种，"
+            f"限流 {self.rate_limit['MAX_MESSAGES']} 条/{self.rate_limit['TIME_WINDOW']} 秒，"
+            f"冷却 {self.rate_limit['COOLDOWN_TIME']} 秒"
+        )
+
+
+def build_snapshot(version: int = 1, reload_sources: bool = False,
+                   tenant: Optional[TenantConfig] = None) -> RuntimeSnapshot:
+    """读取租户配置并构建快照；reload_sources 为 True 时重新读取 .env、违禁词模块与租户配置
+
+    tenant 为空时使用默认租户。
+    """
+    started = time.perf_counter()
+    import config
+    from bot import forbidden_words
+    env = None
+    rate_limit = config.RATE_LIMIT
+    if reload_sources:
+        # 不重新加载 config 模块：其它模块导入的是启动时的值，重新加载也不会生效
+        env = config.read_env()
+        rate_limit = config.parse_rate_limit(env)
+        forbidden_words = importlib.reload(forbidden_words)
+        tenant = find_tenant(tenant.id if tenant else DEFAULT_TENANT, env)
+    elif tenant is None:
+        tenant = find_tenant(DEFAULT_TENANT)
+    if tenant.forbidden_words_path:
+        words = load_forbidden_words(tenant.forbidden_words_path)
+    else:
+        words = forbidden_words.FORBIDDEN_WORDS
+    matcher = build_matcher(words)
+    registry = load_registry(tenant.submission_types_path, tenant.channels if tenant.channels is not None else env)
+    rate_limit = {**rate_limit, **tenant.rate_limit}
+    return RuntimeSnapshot(version, registry, matcher, rate_limit, time.perf_counter() - started, tenant)
+
+
+# 各租户当前生效的快照
+_snapshots: Dict[str, RuntimeSnapshot] = {}
+# 快照替换后的回调，例如把新的限流参数应用到限流器
+_listeners: Dict[str, List[Callable[[RuntimeSnapshot], None]]] = {}
+_reload_locks: Dict[str, asyncio.Lock] = {}
+
+
+def get_snapshot(tenant: str = DEFAULT_TENANT) -> RuntimeSnapshot:
+    """租户当前生效的快照，首次访问时构建"""
+    snapshot = _snapshots.get(tenant)
+    if snapshot is None:
+        snapshot = _snapshots[tenant] = build_snapshot(tenant=find_tenant(tenant))
+    return snapshot
+
+
+def set_snapshot(snapshot: RuntimeSnapshot):
+    """替换快照所属租户的当前快照并通知该租户的监听者"""
+    _snapshots[snapshot.tenant_id] = snapshot
+    for listener in _listeners.get(snapshot.tenant_id, ()):
+        try:
+            listener(snapshot)
+        except Exception as e:
+            logger.error(f"应用运行时配置时出错: {e}", exc_info=True)
+
+
+def add_listener(listener: Callable[[RuntimeSnapshot], None], tenant: str = DEFAULT_TENANT):
+    """注册快照替换回调"""
+    _listeners.setdefault(tenant, []).append(listener)
+
+
+def remove_listener(listener: Callable[[RuntimeSnapshot], None], tenant: str = DEFAULT_TENANT):
+    listeners = _listeners.get(tenant, [])
+    if listener in listeners:
+        listeners.remove(listener)
+
+
+async def reload_snapshot(tenant: str = DEFAULT_TENANT) -> RuntimeSnapshot:
+    """重新读取配置并替换租户的快照，构建过程不占用事件循环；失败时保留旧快照并抛出异常"""
+    lock = _reload_locks.setdefault(tenant, asyncio.Lock())
+    async with lock:
+        current = get_snapshot(tenant)
+        snapshot = await asyncio.to_thread(build_snapshot, current.version + 1, True, current.tenant)
+        set_snapshot(snapshot)
+    logger.info(f"运行时配置已重新加载: {snapshot.summary()}")
+    return snapshot
@@ -0,0 +1,252 @@
+"""出站消息调度：按目标会话排队并遵守 Telegram 限流"""
+import asyncio
+import contextvars
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Union
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TimedOut
+from config import SEND_RATE
+from utils import logger, sampled_logger
+
+ChatId = Union[int, str]
+
+
+class TokenBucket:
+    """令牌桶，acquire 按调用顺序预约令牌，允许单次消耗超过桶容量"""
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._clock = clock
+        self.updated = clock()
+
+    def reserve(self, cost: float = 1) -> float:
+        """扣除令牌，返回需要等待的秒数"""
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= cost
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    async def acquire(self, cost: float = 1):
+        delay = self.reserve(cost)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def pause(self, seconds: float):
+        """收到 RetryAfter 时清空令牌，seconds 秒内不再放行"""
+        self.reserve(0)
+        self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+@dataclass
+class OutboundJob:
+    """一次待发送的请求"""
+    chat_id: ChatId
+    send: Callable[[], Awaitable[Any]]  # 执行实际的 Bot API 调用
+    cost: int = 1  # 消耗的消息配额，媒体组按文件数计算
+    description: str = ""
+    on_success: Optional[Callable[[Any], Awaitable[None]]] = None
+    on_failure: Optional[Callable[[Exception], Awaitable[None]]] = None
+    attempts: int = 0
+    enqueued_at: float = field(default_factory=time.monotonic)
+    # 提交时的上下文（投稿 ID、用户 ID），会话工作协程发送时恢复，日志归属到对应投稿
+    context: contextvars.Context = field(default_factory=contextvars.copy_context)
+
+
+def _retry_after_seconds(error: RetryAfter) -> float:
+    delay = error.retry_after
+    if isinstance(delay, timedelta):
+        return delay.total_seconds()
+    return float(delay)
+
+
+def _is_private_chat(chat_id: ChatId) -> bool:
+    return isinstance(chat_id, int) and chat_id > 0
+
+
+class OutboundScheduler:
+    """出站发送调度器
+
+    每个目标会话一个队列和一个令牌桶，另有一个全局令牌桶限制总发送速率。
+    遇到 RetryAfter 时暂停对应会话并按 Telegram 给出的时间重试，网络错误按
+    指数退避加随机抖动重试，两者合计最多重试 max_retries 次。每个会话的工作协程
+    在空闲一段时间后自动退出。
+    """
+
+    def __init__(
+        self,
+        channel_per_minute: float = SEND_RATE['CHANNEL_PER_MINUTE'],
+        channel_burst: float = SEND_RATE['CHANNEL_BURST'],
+        private_per_second: float = SEND_RATE['PRIVATE_PER_SECOND'],
+        global_per_second: float = SEND_RATE['GLOBAL_PER_SECOND'],
+        max_retries: int = SEND_RATE['MAX_RETRIES'],
+        retry_base_delay: float = SEND_RATE['RETRY_BASE_DELAY'],
+        max_pending: int = SEND_RATE['MAX_PENDING'],
+        idle_timeout: float = 60,
+    ):
+        self.channel_per_minute = channel_per_minute
+        self.channel_burst = channel_burst
+        self.private_per_second = private_per_second
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.max_pending = max_pending
+        self.idle_timeout = idle_timeout
+
+        self.global_bucket = TokenBucket(global_per_second, global_per_second)
+        self._queues: Dict[ChatId, asyncio.Queue] = {}
+        self._buckets: Dict[ChatId, TokenBucket] = {}
+        self._workers: Dict[ChatId, asyncio.Task] = {}
+        self._pending = 0
+        self._closed = False
+        # 排队数低于该值时 wait_for_capacity 返回，剩余容量留给用户通知
+        self.high_watermark = int(max_pending * SEND_RATE['HIGH_WATERMARK'])
+        self._capacity = asyncio.Event()
+        self._capacity.set()
+
+        # 统计
+        self.sent_count = 0
+        self.failed_count = 0
+        self.retry_count = 0
+
+    @property
+    def pending(self) -> int:
+        """排队及发送中的任务数"""
+        return self._pending
+
+    async def wait_for_capacity(self):
+        """等待排队数降到高水位以下"""
+        while self._pending >= self.high_watermark and not self._closed:
+            self._capacity.clear()
+            await self._capacity.wait()
+
+    def queue_depths(self) -> Dict[ChatId, int]:
+        """各目标会话的排队长度"""
+        return {chat_id: queue.qsize() for chat_id, queue in self._queues.items()}
+
+    def _bucket_for(self, chat_id: ChatId) -> TokenBucket:
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            if _is_private_chat(chat_id):
+                bucket = TokenBucket(self.private_per_second, 1)
+            else:
+                bucket = TokenBucket(self.channel_per_minute / 60, self.channel_burst)
+            self._buckets[chat_id] = bucket
+        return bucket
+
+    def submit(self, job: OutboundJob) -> bool:
+        """提交发送任务，队列已满或调度器已关闭时返回 False"""
+        if self._closed or self._pending >= self.max_pending:
+            return False
+
+        queue = self._queues.get(job.chat_id)
+        if queue is None:
+            queue = self._queues[job.chat_id] = asyncio.Queue()
+        queue.put_nowait(job)
+        self._pending += 1
+
+        worker = self._workers.get(job.chat_id)
+        if worker is None or worker.done():
+            self._workers[job.chat_id] = asyncio.get_running_loop().create_task(
+                self._chat_worker(job.chat_id, queue)
+            )
+        return True
+
+    async def _chat_worker(self, chat_id: ChatId, queue: asyncio.Queue):
+        bucket = self._bucket_for(chat_id)
+        try:
+            while True:
+                try:
+                    job = await asyncio.wait_for(queue.get(), timeout=self.idle_timeout)
+                except asyncio.TimeoutError:
+                    if queue.empty():
+                        return
+                    continue
+                # 工作协程由该会话的第一条任务创建，需换成当前任务的上下文
+                for var, value in job.context.items():
+                    var.set(value)
+                try:
+                    await self._deliver(job, bucket)
+                finally:
+                    self._pending -= 1
+                    if self._pending < self.high_watermark:
+                        self._capacity.set()
+        finally:
+            # 空闲退出时释放该会话的队列和令牌桶
+            if self._workers.get(chat_id) is asyncio.current_task():
+                del self._workers[chat_id]
+                if queue.empty():
+                    self._queues.pop(chat_id, None)
+                    self._buckets.pop(chat_id, None)
+
+    async def _deliver(self, job: OutboundJob, bucket: TokenBucket):
+        while True:
+            await bucket.acquire(job.cost)
+            await self.global_bucket.acquire(job.cost)
+            job.attempts += 1
+            try:
+                result = await job.send()
+            except RetryAfter as e:
+                if job.attempts > self.max_retries:
+                    await self._fail(job, e)
+                    return
+                delay = _retry_after_seconds(e)
+                self.retry_count += 1
+                sampled_logger.warning("retry_after", "发送到 %s 触发限流，%s 秒后重试: %s", job.chat_id, delay, job.description)
+                bucket.pause(delay)
+                continue
+            except (BadRequest, Forbidden) as e:
+                # 请求本身有误，重试无意义
+                await self._fail(job, e)
+                return
+            except (TimedOut, NetworkError) as e:
+                if job.attempts > self.max_retries:
+                    await self._fail(job, e)
+                    return
+                delay = self.retry_base_delay * (2 ** (job.attempts - 1))
+                delay += random.uniform(0, delay)
+                self.retry_count += 1
+                sampled_logger.warning(
+                    "send_retry", "发送到 %s 失败（第 %d 次），%.1f 秒后重试: %s", job.chat_id, job.attempts, delay, e
+                )
+                await asyncio.sleep(delay)
+                continue
+            except Exception as e:
+                await self._fail(job, e)
+                return
+
+            self.sent_count += 1
+            if job.on_success:
+                try:
+                    await job.on_success(result)
+                except Exception as e:
+                    logger.error(f"发送成功回调出错: {e}", exc_info=True)
+            return
+
+    async def _fail(self, job: OutboundJob, error: Exception):
+        self.failed_count += 1
+        logger.error("发送到 %s 最终失败: %s: %s", job.chat_id, job.description, error)
+        if job.on_failure:
+            try:
+                await job.on_failure(error)
+            except Exception as e:
+                logger.error(f"发送失败回调出错: {e}", exc_info=True)
+
+    async def stop(self, timeout: float = 10):
+        """停止接收新任务，在 timeout 秒内尽量发完已排队的任务"""
+        self._closed = True
+        self._capacity.set()
+        workers = list(self._workers.values())
+        if not workers:
+            return
+        deadline = time.monotonic() + timeout
+        while self._pending and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        if self._pending:
+            logger.warning(f"出站调度器停止时仍有 {self._pending} 个任务未发送")
@@ -0,0 +1,527 @@
+"""可替换的状态后端：进程内（默认）或多个 worker/副本共享的 SQLite
+
+限流计数、相册聚合、投稿统计与轮询主节点租约都通过后端访问。默认的进程内后端直接使用
+RateLimiter 和 MediaGroupAggregator；共享后端把状态放在同一个 SQLite 文件中，
+每个操作在一个 BEGIN IMMEDIATE 事务里完成（检查与写入合并为一次往返），
+多个 uvicorn worker 或同一主机上的多个副本可以同时使用。
+"""
+import asyncio
+import math
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple, Union
+from config import MEDIA_GROUP, RATE_LIMIT, STATE_BACKEND
+from utils import logger
+from bot.limiter import RateLimiter
+from bot.media_group import MAX_MEDIA_GROUP_ITEMS, MediaGroup, MediaGroupAggregator, MediaItem
+
+# 各实例定期续期的存活租约名前缀
+INSTANCE_LEASE_PREFIX = 'instance:'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rate_limits (
+    user_id INTEGER PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL,
+    blocked_until REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS media_groups (
+    group_id TEXT PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    chat_id INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    item_count INTEGER NOT NULL,
+    created REAL NOT NULL,
+    deadline REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS media_items (
+    group_id TEXT NOT NULL,
+    message_id INTEGER NOT NULL,
+    file_id TEXT NOT NULL,
+    file_unique_id TEXT NOT NULL,
+    media_type TEXT NOT NULL,
+    caption TEXT,
+    PRIMARY KEY (group_id, message_id)
+);
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    holder TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stats (
+    day INTEGER NOT NULL,
+    dimension TEXT NOT NULL,
+    key TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (day, dimension, key)
+);
+"""
+
+# 媒体组状态
+_GROUP_OPEN = 'open'
+_GROUP_CLAIMED = 'claimed'
+_GROUP_REJECTED = 'rejected'
+
+
+class StateBackend:
+    """进程内状态后端（单 worker 默认使用）"""
+    shared = False
+
+    def __init__(self):
+        self.instance_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    def rate_limiter(self) -> RateLimiter:
+        return RateLimiter()
+
+    def media_group_aggregator(self, on_flush: Callable[[MediaGroup], Awaitable[None]]) -> MediaGroupAggregator:
+        return MediaGroupAggregator(
+            on_flush,
+            quiet_period=MEDIA_GROUP['QUIET_PERIOD'],
+            max_items=MEDIA_GROUP['MAX_ITEMS'],
+            max_groups=MEDIA_GROUP['MAX_GROUPS'],
+            ttl=MEDIA_GROUP['TTL'],
+        )
+
+    def lease(self, name: str, ttl: float) -> 'Lease':
+        return Lease(name, self.instance_id, ttl)
+
+    def stats_store(self) -> Optional['SharedStats']:
+        """投稿统计的共享计数；进程内后端返回 None，统计各自保存到 stats.json"""
+        return None
+
+    def instance_lease(self, ttl: float) -> 'Lease':
+        """本实例的存活租约，运行期间需在 ttl 内续期"""
+        return self.lease(INSTANCE_LEASE_PREFIX + self.instance_id, ttl)
+
+    async def live_instances(self) -> Set[str]:
+        """仍在运行的实例；进程内后端只有本实例"""
+        return {self.instance_id}
+
+
+class Lease:
+    """进程内租约：只有一个进程，总能获得"""
+
+    def __init__(self, name: str, holder: str, ttl: float):
+        self.name = name
+        self.holder = holder
+        self.ttl = ttl
+        self.held = False
+
+    async def acquire(self) -> bool:
+        """获取或续期租约，返回当前是否持有"""
+        self.held = True
+        return True
+
+    async def release(self):
+        self.held = False
+
+
+class SQLiteStateBackend(StateBackend):
+    """基于 SQLite 文件的共享状态后端
+
+    连接只在线程池中使用并串行访问；跨进程的互斥由 BEGIN IMMEDIATE 的写锁保证，
+    busy_timeout 让并发的 worker 排队等待而不是直接报错。时间使用 time.time()，
+    因为各进程的 time.monotonic() 没有共同的起点。
+    """
+    shared = True
+
+    def __init__(self, path: Union[str, Path] = STATE_BACKEND['PATH'], busy_timeout: float = 5.0):
+        super().__init__()
+        self.path = Path(path)
+        self.busy_timeout = busy_timeout
+        self._conn: Optional[sqlite3.Connection] = None
+        self._conn_lock = threading.Lock()
+
+        # 统计
+        self.transaction_count = 0
+
+    def _open(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(
+            str(self.path), timeout=self.busy_timeout, check_same_thread=False, isolation_level=None
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        self._conn = conn
+
+    async def start(self):
+        await asyncio.to_thread(self._open)
+        logger.info(f"共享状态后端已打开: {self.path}（实例 {self.instance_id}）")
+
+    async def close(self):
+        if self._conn:
+            await asyncio.to_thread(self._conn.close)
+            self._conn = None
+
+    def _transaction(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        with self._conn_lock:
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(conn)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            self.transaction_count += 1
+            return result
+
+    async def run(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        """在线程池中以一个写事务执行 fn(conn)"""
+        return await asyncio.to_thread(self._transaction, fn)
+
+    def rate_limiter(self) -> 'SharedRateLimiter':
+        return SharedRateLimiter(self)
+
+    def media_group_aggregator(self, on_flush: Callable[[MediaGroup], Awaitable[None]]) -> 'SharedMediaGroupAggregator':
+        return SharedMediaGroupAggregator(
+            self,
+            on_flush,
+            quiet_period=MEDIA_GROUP['QUIET_PERIOD'],
+            max_items=MEDIA_GROUP['MAX_ITEMS'],
+            max_groups=MEDIA_GROUP['MAX_GROUPS'],
+            ttl=MEDIA_GROUP['TTL'],
+        )
+
+    def lease(self, name: str, ttl: float) -> 'SharedLease':
+        return SharedLease(self, name, self.instance_id, ttl)
+
+    def stats_store(self) -> 'SharedStats':
+        return SharedStats(self)
+
+    async def live_instances(self) -> Set[str]:
+        """存活租约未过期的实例"""
+        now = time.time()
+        rows = await self.run(lambda conn: conn.execute(
+            "SELECT holder FROM leases WHERE name LIKE ? AND expires > ?", (INSTANCE_LEASE_PREFIX + '%', now)
+        ).fetchall())
+        return {holder for (holder,) in rows} | {self.instance_id}
+
+
+class SharedRateLimiter:
+    """令牌桶限流，桶状态保存在共享后端中，算法与 RateLimiter 相同"""
+
+    def __init__(self, backend: SQLiteStateBackend, clock: Callable[[], float] = time.time):
+        self.MAX_MESSAGES = RATE_LIMIT['MAX_MESSAGES']
+        self.TIME_WINDOW = RATE_LIMIT['TIME_WINDOW']
+        self.COOLDOWN_TIME = RATE_LIMIT['COOLDOWN_TIME']
+        self.SWEEP_INTERVAL = RATE_LIMIT.get('SWEEP_INTERVAL', 300)
+        self._backend = backend
+        self._clock = clock
+        self._refill_rate = self.MAX_MESSAGES / self.TIME_WINDOW
+        self._next_sweep = clock() + self.SWEEP_INTERVAL
+        # 最近一次清理后的记录数，指标只读该缓存
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def configure(self, max_messages: int, time_window: float, cooldown_time: float):
+        """更新限流参数，共享表中的令牌数在下次访问时按新容量截断"""
+        self.MAX_MESSAGES = max_messages
+        self.TIME_WINDOW = time_window
+        self.COOLDOWN_TIME = cooldown_time
+        self._refill_rate = max_messages / time_window
+
+    def _acquire(self, conn: sqlite3.Connection, user_id: int, now: float) -> Tuple[bool, str]:
+        row = conn.execute(
+            "SELECT tokens, updated, blocked_until FROM rate_limits WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        if row is None:
+            conn.execute(
+                "INSERT INTO rate_limits VALUES (?, ?, ?, 0)", (user_id, self.MAX_MESSAGES - 1, now)
+            )
+            return True, ""
+
+        tokens, updated, blocked_until = row
+        # 检查是否在冷却中
+        if now < blocked_until:
+            remaining = math.ceil(blocked_until - now)
+            return False, f"您需要等待 {remaining} 秒后才能继续投稿"
+
+        # 检查消息频率
+        if now > updated:
+            tokens = min(self.MAX_MESSAGES, tokens + (now - updated) * self._refill_rate)
+            updated = now
+        if tokens < 1:
+            conn.execute(
+                "UPDATE rate_limits SET tokens = ?, updated = ?, blocked_until = ? WHERE user_id = ?",
+                (tokens, updated, now + self.COOLDOWN_TIME, user_id),
+            )
+            return False, f"发送过于频繁，已被限制 {self.COOLDOWN_TIME/60} 分钟"
+
+        conn.execute(
+            "UPDATE rate_limits SET tokens = ?, updated = ? WHERE user_id = ?",
+            (tokens - 1, updated, user_id),
+        )
+        return True, ""
+
+    async def acquire(self, user_id: int) -> Tuple[bool, str]:
+        """原子地检查并记录一条消息"""
+        now = self._clock()
+        if now >= self._next_sweep:
+            self._next_sweep = now + self.SWEEP_INTERVAL
+            await self.sweep(now)
+        return await self._backend.run(lambda conn: self._acquire(conn, user_id, now))
+
+    async def sweep(self, now: Optional[float] = None) -> int:
+        """清理空闲用户，返回清理的记录数"""
+        if now is None:
+            now = self._clock()
+
+        def delete(conn: sqlite3.Connection) -> int:
+            removed = conn.execute(
+                "DELETE FROM rate_limits WHERE updated <= ? AND blocked_until <= ?",
+                (now - self.TIME_WINDOW, now),
+            ).rowcount
+            self._size = conn.execute("SELECT COUNT(*) FROM rate_limits").fetchone()[0]
+            return removed
+        return await self._backend.run(delete)
+
+
+class SharedMediaGroupAggregator:
+    """跨 worker 的媒体组聚合
+
+    同一相册的文件可能被负载均衡分到不同 worker：每个文件写入共享表并顺延该组的
+    截止时间，收到文件的 worker 在截止时间到达时尝试认领；认领在事务中检查截止时间
+    和状态，只有一个 worker 能成功并取走全部文件，其余 worker 按最新截止时间重新等待
+    或放弃。接口与 MediaGroupAggregator 相同。
+    """
+
+    def __init__(
+        self,
+        backend: SQLiteStateBackend,
+        on_flush: Callable[[MediaGroup], Awaitable[None]],
+        quiet_period: float = 1.5,
+        max_items: int = MAX_MEDIA_GROUP_ITEMS,
+        max_groups: int = 1000,
+        ttl: float = 30,
+        clock: Callable[[], float] = time.time,
+    ):
+        self._backend = backend
+        self.on_flush = on_flush
+        self.quiet_period = quiet_period
+        self.max_items = max_items
+        self.max_groups = max_groups
+        self.ttl = ttl
+        self._clock = clock
+        # 本 worker 参与聚合的媒体组: group_id -> (bot, 定时器)
+        self._local: Dict[str, Tuple[Any, asyncio.TimerHandle]] = {}
+        self._flush_tasks: Set[asyncio.Task] = set()
+
+    def __contains__(self, group_id: str) -> bool:
+        return group_id in self._local
+
+    def __len__(self) -> int:
+        return len(self._local)
+
+    def _append(self, conn: sqlite3.Connection, group_id: str, user_id: int, chat_id: int,
+                item: MediaItem, now: float) -> Tuple[Optional[bool], int, float]:
+        row = conn.execute(
+            "SELECT state, item_count, created FROM media_groups WHERE group_id = ?", (group_id,)
+        ).fetchone()
+        if row is None:
+            # 清理过期的媒体组，超出上限时丢弃最早的
+            conn.execute("DELETE FROM media_groups WHERE created < ?", (now - 2 * self.ttl,))
+            conn.execute("DELETE FROM media_items WHERE group_id NOT IN (SELECT group_id FROM media_groups)")
+            overflow = conn.execute(
+                "SELECT group_id FROM media_groups WHERE state = ? ORDER BY created "
+                "LIMIT max(0, (SELECT COUNT(*) FROM media_groups WHERE state = ?) - ? + 1)",
+                (_GROUP_OPEN, _GROUP_OPEN, self.max_groups),
+            ).fetchall()
+            for (old_group,) in overflow:
+                logger.warning(f"媒体组缓冲已满，丢弃最早的媒体组 {old_group}")
+                conn.execute("DELETE FROM media_groups WHERE group_id = ?", (old_group,))
+                conn.execute("DELETE FROM media_items WHERE group_id = ?", (old_group,))
+            conn.execute(
+                "INSERT INTO media_groups VALUES (?, ?, ?, ?, 0, ?, ?)",
+                (group_id, user_id, chat_id, _GROUP_OPEN, now, now),
+            )
+            is_new, count, created = True, 0, now
+        else:
+            state, count, created = row
+            if state != _GROUP_OPEN:
+                return None, count, 0.0
+            is_new = False
+
+        conn.execute(
+            "INSERT OR IGNORE INTO media_items VALUES (?, ?, ?, ?, ?, ?)",
+            (group_id, *item),
+        )
+        count += 1
+        # 静默期与剩余存活时间取较小值，持续有新文件的媒体组也会在 ttl 内刷出
+        deadline = min(now + self.quiet_period, created + self.ttl)
+        conn.execute(
+            "UPDATE media_groups SET item_count = ?, deadline = ? WHERE group_id = ?",
+            (count, deadline, group_id),
+        )
+        return is_new, count, deadline
+
+    async def add(self, group_id: str, user_id: int, chat_id: int, bot: Any, item: MediaItem) -> bool:
+        """加入一条媒体消息，返回是否为新的媒体组；已被拒绝或已处理的媒体组直接丢弃"""
+        now = self._clock()
+        is_new, count, deadline = await self._backend.run(
+            lambda conn: self._append(conn, group_id, user_id, chat_id, item, now)
+        )
+        if is_new is None:
+            return False
+        self._schedule(group_id, bot, 0.0 if count >= self.max_items else deadline - now)
+        return is_new
+
+    async def reject(self, group_id: str):
+        """丢弃媒体组，并忽略其后续到达的文件"""
+        local = self._local.pop(group_id, None)
+        if local is not None:
+            local[1].cancel()
+
+        def mark(conn: sqlite3.Connection):
+            conn.execute("UPDATE media_groups SET state = ? WHERE group_id = ?", (_GROUP_REJECTED, group_id))
+            conn.execute("DELETE FROM media_items WHERE group_id = ?", (group_id,))
+        await self._backend.run(mark)
+
+    def _schedule(self, group_id: str, bot: Any, delay: float):
+        local = self._local.get(group_id)
+        if local is not None:
+            local[1].cancel()
+        loop = asyncio.get_running_loop()
+        timer = loop.call_later(max(0.0, delay), self._start_claim, group_id)
+        self._local[group_id] = (bot, timer)
+
+    def _start_claim(self, group_id: str, force: bool = False):
+        task = asyncio.get_running_loop().create_task(self._claim(group_id, force))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    def _take(self, conn: sqlite3.Connection, group_id: str, now: float,
+              force: bool) -> Tuple[Optional[float], Optional[MediaGroup]]:
+        row = conn.execute(
+            "SELECT user_id, chat_id, state, item_count, created, deadline FROM media_groups WHERE group_id = ?",
+            (group_id,),
+        ).fetchone()
+        if row is None or row[2] != _GROUP_OPEN:
+            return None, None
+        user_id, chat_id, _, count, created, deadline = row
+        # 其他 worker 收到了更晚的文件，按新的截止时间重新等待
+        if not force and now < deadline and count < self.max_items:
+            return deadline, None
+
+        conn.execute("UPDATE media_groups SET state = ? WHERE group_id = ?", (_GROUP_CLAIMED, group_id))
+        rows = conn.execute(
+            "SELECT message_id, file_id, file_unique_id, media_type, caption FROM media_items WHERE group_id = ?",
+            (group_id,),
+        ).fetchall()
+        conn.execute("DELETE FROM media_items WHERE group_id = ?", (group_id,))
+        group = MediaGroup(group_id, user_id, chat_id, None, created)
+        group.items = [MediaItem(*item) for item in rows]
+        return None, group
+
+    async def _claim(self, group_id: str, force: bool = False):
+        local = self._local.get(group_id)
+        if local is None:
+            return
+        bot = local[0]
+        now = self._clock()
+        try:
+            deadline, group = await self._backend.run(lambda conn: self._take(conn, group_id, now, force))
+        except Exception as e:
+            self._local.pop(group_id, None)
+            logger.error(f"认领媒体组 {group_id} 时出错: {e}", exc_info=True)
+            return
+        if deadline is not None:
+            self._schedule(group_id, bot, deadline - now)
+            return
+        self._local.pop(group_id, None)
+        if group is None:
+            return
+        group.bot = bot
+        try:
+            await self.on_flush(group)
+        except Exception as e:
+            logger.error(f"处理媒体组 {group.group_id} 时出错: {e}", exc_info=True)
+
+    async def flush_all(self):
+        """立即认领本 worker 参与的所有媒体组并等待处理完成"""
+        for group_id, (_, timer) in list(self._local.items()):
+            timer.cancel()
+            self._start_claim(group_id, force=True)
+        if self._flush_tasks:
+            await asyncio.gather(*self._flush_tasks, return_exceptions=True)
+
+
+class SharedStats:
+    """投稿统计的共享计数：各实例把增量累加到同一张表，读取时即所有实例的合计"""
+
+    def __init__(self, backend: SQLiteStateBackend):
+        self._backend = backend
+
+    async def add(self, rows: List[Tuple[int, str, str, int]]):
+        """累加 (天, 维度, 键, 计数) 行"""
+        await self._backend.run(lambda conn: conn.executemany(
+            "INSERT INTO stats VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(day, dimension, key) DO UPDATE SET count = count + excluded.count",
+            rows,
+        ))
+
+    async def load(self, since_day: int) -> List[Tuple[int, str, str, int]]:
+        """读取 since_day 及之后的计数，更早的行一并删除"""
+        def read(conn: sqlite3.Connection) -> List[Tuple[int, str, str, int]]:
+            conn.execute("DELETE FROM stats WHERE day < ?", (since_day,))
+            return conn.execute("SELECT day, dimension, key, count FROM stats").fetchall()
+        return await self._backend.run(read)
+
+
+class SharedLease(Lease):
+    """共享租约：同一时刻只有一个实例持有，持有者需在 ttl 内续期"""
+
+    def __init__(self, backend: SQLiteStateBackend, name: str, holder: str, ttl: float):
+        super().__init__(name, holder, ttl)
+        self._backend = backend
+
+    async def acquire(self) -> bool:
+        now = time.time()
+
+        def claim(conn: sqlite3.Connection) -> bool:
+            row = conn.execute("SELECT holder, expires FROM leases WHERE name = ?", (self.name,)).fetchone()
+            if row is not None and row[0] != self.holder and row[1] > now:
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO leases VALUES (?, ?, ?)", (self.name, self.holder, now + self.ttl)
+            )
+            return True
+        try:
+            self.held = await self._backend.run(claim)
+        except Exception as e:
+            # 无法确认时视为失去租约，避免两个实例同时轮询
+            logger.error(f"续期租约 {self.name} 失败: {e}", exc_info=True)
+            self.held = False
+        return self.held
+
+    async def release(self):
+        if not self.held:
+            return
+        self.held = False
+        await self._backend.run(lambda conn: conn.execute(
+            "DELETE FROM leases WHERE name = ? AND holder = ?", (self.name, self.holder)
+        ))
+
+
+def create_state_backend(path: Union[str, Path] = STATE_BACKEND['PATH']) -> StateBackend:
+    """按配置创建状态后端，path 为共享状态文件（每个租户一个）"""
+    kind = STATE_BACKEND['KIND']
+    if kind == 'sqlite':
+        return SQLiteStateBackend(path)
+    if kind != 'memory':
+        logger.warning(f"未知的状态后端 {kind}，使用进程内后端")
+    return StateBackend()
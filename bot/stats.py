@@ -0,0 +1,342 @@
+"""投稿统计：按天滚动的增量聚合，/stats 直接读取汇总结果
+
+每天一个桶，桶放在长度固定的环形数组里，过期的桶在被新的一天复用时从窗口汇总中
+减去。每次投稿结果只更新当天的桶和窗口汇总（几次字典/列表加一），查询时不需要
+遍历任何历史记录。汇总定期写入磁盘，重启后读回。
+
+使用共享状态后端时，多个 worker 不再各自写 stats.json（会互相覆盖），而是定期把
+增量累加到共享库，/stats 读取所有实例的合计。
+"""
+import asyncio
+import json
+import os
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+from config import STATS
+from utils import logger
+
+# 投稿结果，数组下标即结果编号
+OUTCOMES = (
+    'delivered',       # 已转发到频道
+    'rate_limited',    # 发送频率超限
+    'missing_fields',  # 缺少必填字段
+    'empty_fields',    # 必填字段为空
+    'forbidden',       # 包含违禁词
+    'duplicate',       # 重复投稿
+    'shed',            # 负载过高被拒绝
+    'queue_full',      # 出站队列已满
+    'failed',          # 发送失败
+    'error',           # 处理出错
+)
+_OUTCOME_INDEX = {name: index for index, name in enumerate(OUTCOMES)}
+REJECTIONS = OUTCOMES[1:]
+
+_LABELS = {
+    'delivered': '已转发',
+    'rate_limited': '频率超限',
+    'missing_fields': '缺少字段',
+    'empty_fields': '字段为空',
+    'forbidden': '违禁词',
+    'duplicate': '重复投稿',
+    'shed': '繁忙拒绝',
+    'queue_full': '队列已满',
+    'failed': '发送失败',
+    'error': '处理出错',
+}
+
+ChannelId = Union[int, str]
+
+
+def _local_day(timestamp: float) -> int:
+    """本地时区的天序号"""
+    return int((timestamp + time.localtime(timestamp).tm_gmtoff) // 86400)
+
+
+class _DayBucket:
+    """一天内的计数"""
+    __slots__ = ('day', 'outcomes', 'types', 'channels', 'users')
+
+    def __init__(self, day: int = -1):
+        self.day = day
+        self.outcomes = [0] * len(OUTCOMES)
+        self.types: Counter = Counter()
+        self.channels: Counter = Counter()
+        self.users: Counter = Counter()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'day': self.day,
+            'outcomes': dict(zip(OUTCOMES, self.outcomes)),
+            'types': dict(self.types),
+            'channels': dict(self.channels),
+            'users': {str(user_id): count for user_id, count in self.users.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> '_DayBucket':
+        bucket = cls(data['day'])
+        for name, count in data.get('outcomes', {}).items():
+            if name in _OUTCOME_INDEX:
+                bucket.outcomes[_OUTCOME_INDEX[name]] = count
+        bucket.types.update(data.get('types', {}))
+        bucket.channels.update(data.get('channels', {}))
+        bucket.users.update({int(user_id): count for user_id, count in data.get('users', {}).items()})
+        return bucket
+
+    def add(self, index: int, kind: Optional[str], channels: List[str], user_id: Optional[int]):
+        self.outcomes[index] += 1
+        if kind:
+            self.types[kind] += 1
+        for key in channels:
+            self.channels[key] += 1
+        if user_id is not None:
+            self.users[user_id] += 1
+
+    def to_rows(self) -> List[Tuple[int, str, str, int]]:
+        """共享统计表中的 (天, 维度, 键, 计数) 行"""
+        rows = [(self.day, 'outcome', name, count) for name, count in zip(OUTCOMES, self.outcomes) if count]
+        rows += [(self.day, 'type', kind, count) for kind, count in self.types.items()]
+        rows += [(self.day, 'channel', channel, count) for channel, count in self.channels.items()]
+        rows += [(self.day, 'user', str(user_id), count) for user_id, count in self.users.items()]
+        return rows
+
+    def add_row(self, dimension: str, key: str, count: int):
+        if dimension == 'outcome':
+            if key in _OUTCOME_INDEX:
+                self.outcomes[_OUTCOME_INDEX[key]] += count
+        elif dimension == 'type':
+            self.types[key] += count
+        elif dimension == 'channel':
+            self.channels[key] += count
+        elif dimension == 'user':
+            self.users[int(key)] += count
+
+
+class SubmissionStats:
+    """最近 days 天的投稿统计"""
+
+    def __init__(self, days: int = STATS['DAYS'], path: Optional[str] = STATS['PATH'],
+                 snapshot_interval: float = STATS['SNAPSHOT_INTERVAL'], shared=None):
+        self.days = days
+        self.path = Path(path) if path else None
+        self.snapshot_interval = snapshot_interval
+        self.shared = shared  # 共享状态后端的统计计数，设置后不再写 stats.json
+        self._delta: Dict[int, _DayBucket] = {}  # 尚未写入共享库的增量
+        self._buckets: List[_DayBucket] = [_DayBucket() for _ in range(days)]
+        # 窗口内所有桶的汇总，随每次记录与桶过期增量维护
+        self._outcomes = [0] * len(OUTCOMES)
+        self._types: Counter = Counter()
+        self._channels: Counter = Counter()
+        self._users: Counter = Counter()
+        self._dirty = False
+        # 当天的起止时间戳，同一天内不必重复换算时区
+        self._today = -1
+        self._today_range = (0.0, 0.0)
+
+    def _day(self, now: Optional[float]) -> int:
+        now = time.time() if now is None else now
+        start, end = self._today_range
+        if not start <= now < end:
+            self._today = _local_day(now)
+            offset = time.localtime(now).tm_gmtoff
+            start = self._today * 86400 - offset
+            self._today_range = (start, start + 86400)
+        return self._today
+
+    def _bucket(self, day: int) -> _DayBucket:
+        bucket = self._buckets[day % self.days]
+        if bucket.day != day:
+            self._expire(bucket)
+            bucket = self._buckets[day % self.days] = _DayBucket(day)
+        return bucket
+
+    def _expire(self, bucket: _DayBucket):
+        """把即将被复用的桶从窗口汇总中减去"""
+        if bucket.day < 0:
+            return
+        for index, count in enumerate(bucket.outcomes):
+            self._outcomes[index] -= count
+        # Counter 的 -= 会去掉不为正的项，窗口汇总只保留仍有计数的键
+        self._types -= bucket.types
+        self._channels -= bucket.channels
+        self._users -= bucket.users
+
+    def _rotate(self, today: int):
+        """让窗口外的桶过期，保证汇总只覆盖最近 days 天"""
+        for bucket in self._buckets:
+            if 0 <= bucket.day <= today - self.days:
+                self._expire(bucket)
+                bucket.__init__()
+
+    def record(self, outcome: str, user_id: Optional[int] = None, kind: Optional[str] = None,
+               channels: Iterable[ChannelId] = (), now: Optional[float] = None):
+        """记录一次投稿结果"""
+        index = _OUTCOME_INDEX[outcome]
+        day = self._day(now)
+        channels = [str(channel) for channel in channels]
+        # 提交者排行只统计成功转发的投稿
+        if outcome != 'delivered':
+            user_id = None
+        self._bucket(day).add(index, kind, channels, user_id)
+        self._outcomes[index] += 1
+        if kind:
+            self._types[kind] += 1
+        for key in channels:
+            self._channels[key] += 1
+        if user_id is not None:
+            self._users[user_id] += 1
+        if self.shared is not None:
+            delta = self._delta.get(day)
+            if delta is None:
+                delta = self._delta[day] = _DayBucket(day)
+            delta.add(index, kind, channels, user_id)
+        self._dirty = True
+
+    def summary(self, top: int = 5, now: Optional[float] = None) -> Dict[str, Any]:
+        """窗口汇总与最近一周每天的结果"""
+        today = self._day(now)
+        self._rotate(today)
+        recent = []
+        for day in range(today - min(self.days, 7) + 1, today + 1):
+            bucket = self._buckets[day % self.days]
+            outcomes = bucket.outcomes if bucket.day == day else [0] * len(OUTCOMES)
+            recent.append((day, dict(zip(OUTCOMES, outcomes))))
+        return {
+            'days': self.days,
+            'outcomes': dict(zip(OUTCOMES, self._outcomes)),
+            'types': dict(self._types.most_common()),
+            'channels': dict(self._channels.most_common()),
+            'top_submitters': self._users.most_common(top),
+            'recent': recent,
+        }
+
+    def render(self, top: int = 5) -> str:
+        """/stats 命令的回复文本"""
+        data = self.summary(top)
+        outcomes = data['outcomes']
+        total = sum(outcomes.values())
+        rejected = sum(outcomes[name] for name in REJECTIONS)
+        lines = [
+            f"📊 最近 {data['days']} 天投稿统计",
+            f"共 {total} 条，已转发 {outcomes['delivered']} 条，未通过 {rejected} 条",
+            "",
+            "📅 最近 7 天（已转发/未通过）：",
+        ]
+        for day, counts in data['recent']:
+            date = time.strftime('%m-%d', time.gmtime(day * 86400))
+            lines.append(f"{date}  {counts['delivered']}/{sum(counts[name] for name in REJECTIONS)}")
+        if data['types']:
+            lines += ["", "📝 按类型："] + [f"{kind}: {count}" for kind, count in data['types'].items()]
+        if data['channels']:
+            lines += ["", "📢 按频道："] + [f"{channel}: {count}" for channel, count in data['channels'].items()]
+        reasons = [(name, outcomes[name]) for name in REJECTIONS if outcomes[name]]
+        if reasons:
+            lines += ["", "🚫 未通过原因："] + [f"{_LABELS[name]}: {count}" for name, count in reasons]
+        if data['top_submitters']:
+            lines += ["", "🏆 投稿最多的用户："]
+            lines += [f"{rank}. {user_id}: {count}" for rank, (user_id, count)
+                      in enumerate(data['top_submitters'], 1)]
+        return "\n".join(lines)
+
+    async def aggregate(self) -> 'SubmissionStats':
+        """所有实例合计的统计；未使用共享后端时即本实例的统计"""
+        if self.shared is None:
+            return self
+        await self.save()
+        today = self._day(None)
+        buckets: Dict[int, _DayBucket] = {}
+        for day, dimension, key, count in await self.shared.load(today - self.days + 1):
+            bucket = buckets.get(day)
+            if bucket is None:
+                bucket = buckets[day] = _DayBucket(day)
+            bucket.add_row(dimension, key, count)
+        total = SubmissionStats(self.days, path=None)
+        total._restore(buckets.values(), today)
+        return total
+
+    # 快照
+
+    def _snapshot(self) -> Tuple[Dict[str, Any], bool]:
+        dirty, self._dirty = self._dirty, False
+        buckets = [bucket.to_dict() for bucket in self._buckets if bucket.day >= 0]
+        return {'days': self.days, 'saved_at': time.time(), 'buckets': buckets}, dirty
+
+    @staticmethod
+    def _write(path: Path, data: Dict[str, Any]):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    async def _save_shared(self):
+        """把增量累加到共享库"""
+        delta, self._delta = self._delta, {}
+        rows = [row for bucket in delta.values() for row in bucket.to_rows()]
+        if not rows:
+            return
+        try:
+            await self.shared.add(rows)
+        except Exception as e:
+            # 写入失败的增量并入下一次
+            for day, bucket in delta.items():
+                pending = self._delta.get(day)
+                if pending is None:
+                    self._delta[day] = bucket
+                    continue
+                for _, dimension, key, count in bucket.to_rows():
+                    pending.add_row(dimension, key, count)
+            logger.error(f"保存投稿统计失败: {e}", exc_info=True)
+
+    async def save(self):
+        """有新记录时把统计写入磁盘（写临时文件后替换，不会留下半截文件）"""
+        if self.shared is not None:
+            await self._save_shared()
+            return
+        if not self.path:
+            return
+        data, dirty = self._snapshot()
+        if not dirty:
+            return
+        try:
+            await asyncio.to_thread(self._write, self.path, data)
+        except Exception as e:
+            self._dirty = True
+            logger.error(f"保存投稿统计失败: {e}", exc_info=True)
+
+    def load(self):
+        """读回上次保存的统计，超出窗口的天数丢弃"""
+        if not self.path or not self.path.exists():
+            return
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+            buckets = (_DayBucket.from_dict(item) for item in data.get('buckets', []))
+            loaded = self._restore(buckets, _local_day(time.time()))
+            logger.info(f"已读回 {loaded} 天的投稿统计")
+        except Exception as e:
+            logger.error(f"读取投稿统计失败，从零开始统计: {e}", exc_info=True)
+
+    def _restore(self, buckets: Iterable[_DayBucket], today: int) -> int:
+        """放回窗口内的桶并计入汇总，返回放回的天数"""
+        loaded = 0
+        for bucket in buckets:
+            if bucket.day <= today - self.days or bucket.day > today:
+                continue
+            self._expire(self._buckets[bucket.day % self.days])
+            self._buckets[bucket.day % self.days] = bucket
+            for index, count in enumerate(bucket.outcomes):
+                self._outcomes[index] += count
+            self._types.update(bucket.types)
+            self._channels.update(bucket.channels)
+            self._users.update(bucket.users)
+            loaded += 1
+        return loaded
+
+    async def run(self):
+        """定期保存统计"""
+        while True:
+            await asyncio.sleep(self.snapshot_interval)
+            await self.save()
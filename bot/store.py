@@ -0,0 +1,259 @@
+"""投稿持久化：SQLite (WAL) + 后台批量提交"""
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Collection, Dict, List, Optional, Tuple, Union
+from config import SUBMISSION_STORE
+from utils import logger
+
+# 投递状态
+STATUS_PENDING = 'pending'
+STATUS_REPLAYING = 'replaying'  # 已被某个实例认领重放
+STATUS_DELIVERED = 'delivered'
+STATUS_FAILED = 'failed'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS submissions (
+    id TEXT PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    chat_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    fields TEXT NOT NULL,
+    text TEXT,
+    media TEXT NOT NULL,
+    target_channel TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    owner TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_submissions_status ON submissions (status);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+@dataclass
+class SubmissionRecord:
+    """一条待投递/已投递的投稿"""
+    id: str
+    user_id: int
+    chat_id: int
+    kind: str
+    fields: Dict[str, str]
+    text: Optional[str]
+    media: List[Tuple[str, str]]  # (media_type, file_id)
+    target_channel: Union[int, str]
+    status: str = STATUS_PENDING
+    created_at: float = field(default_factory=time.time)
+
+    def to_row(self) -> tuple:
+        return (
+            self.id, self.user_id, self.chat_id, self.kind,
+            json.dumps(self.fields, ensure_ascii=False), self.text,
+            json.dumps(self.media), str(self.target_channel), self.status,
+            self.created_at, time.time(),
+        )
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> 'SubmissionRecord':
+        return cls(
+            id=row['id'],
+            user_id=row['user_id'],
+            chat_id=row['chat_id'],
+            kind=row['kind'],
+            fields=json.loads(row['fields']),
+            text=row['text'],
+            media=[tuple(item) for item in json.loads(row['media'])],
+            target_channel=row['target_channel'],
+            status=row['status'],
+            created_at=row['created_at'],
+        )
+
+
+class SubmissionStore:
+    """投稿存储
+
+    所有写操作先进入内存队列，由唯一的后台写协程攒批后在线程池中以一个事务提交
+    （group commit），事件循环不会因磁盘 IO 阻塞。
+
+    每条投稿记录写入它的实例（owner）。多个实例共享同一个文件时，只有 owner 已不在
+    运行的未送达投稿才会被其他实例认领重放，见 claim_pending。
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path] = SUBMISSION_STORE['PATH'],
+        batch_size: int = SUBMISSION_STORE['BATCH_SIZE'],
+        flush_interval: float = SUBMISSION_STORE['FLUSH_INTERVAL'],
+        retention_days: float = SUBMISSION_STORE['RETENTION_DAYS'],
+        owner: Optional[str] = None,
+    ):
+        self.path = Path(path)
+        self.owner = owner
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retention_days = retention_days
+        self._conn: Optional[sqlite3.Connection] = None
+        # 连接只在线程池中使用，串行访问
+        self._conn_lock = threading.Lock()
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._writer: Optional[asyncio.Task] = None
+
+        # 统计
+        self.commit_count = 0
+        self.written_count = 0
+
+    @property
+    def backlog(self) -> int:
+        """尚未落盘的写操作数"""
+        return self._queue.qsize()
+
+    def _open(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        columns = {row['name'] for row in conn.execute("PRAGMA table_info(submissions)")}
+        if 'owner' not in columns:
+            conn.execute("ALTER TABLE submissions ADD COLUMN owner TEXT")
+        if self.retention_days:
+            cutoff = time.time() - self.retention_days * 86400
+            conn.execute(
+                "DELETE FROM submissions WHERE status NOT IN (?, ?) AND updated_at < ?",
+                (STATUS_PENDING, STATUS_REPLAYING, cutoff),
+            )
+        self._conn = conn
+
+    async def start(self):
+        """打开数据库并启动后台写协程"""
+        await asyncio.to_thread(self._open)
+        self._writer = asyncio.create_task(self._write_loop(), name='submission_store_writer')
+        logger.info(f"投稿存储已打开: {self.path}")
+
+    def record(self, submission: SubmissionRecord):
+        """写入新投稿（异步落盘）"""
+        self._queue.put_nowait(('insert', submission.to_row() + (self.owner,)))
+
+    def mark(self, submission_id: str, status: str):
+        """更新投递状态（异步落盘）"""
+        self._queue.put_nowait(('status', (status, time.time(), submission_id)))
+
+    def set_meta(self, key: str, value: str):
+        """写入运行状态（异步落盘）"""
+        self._queue.put_nowait(('meta', (key, value)))
+
+    async def get_meta(self, key: str) -> Optional[str]:
+        """读取运行状态"""
+        def query():
+            with self._conn_lock:
+                row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+            return row['value'] if row else None
+        return await asyncio.to_thread(query)
+
+    async def claim_pending(self, live_owners: Collection[str]) -> List[SubmissionRecord]:
+        """认领 owner 已不在运行的未送达投稿，返回本次认领到的记录
+
+        认领在一个写事务中把记录改为 replaying 并写入本实例，多个实例同时认领时
+        每条记录只会被其中一个拿到；认领后本实例退出的记录之后可再被认领。
+        """
+        # 本实例写入或已认领的记录正在本进程中发送，不再认领
+        owners = sorted({*live_owners, self.owner} - {None})
+        placeholders = ",".join("?" * len(owners))
+
+        def claim():
+            now = time.time()
+            with self._conn_lock:
+                conn = self._conn
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    conn.execute(
+                        "UPDATE submissions SET status = ?, owner = ?, updated_at = ? "
+                        f"WHERE status IN (?, ?) AND (owner IS NULL OR owner NOT IN ({placeholders}))",
+                        (STATUS_REPLAYING, self.owner, now, STATUS_PENDING, STATUS_REPLAYING, *owners),
+                    )
+                    rows = conn.execute(
+                        "SELECT * FROM submissions WHERE status = ? AND owner IS ? AND updated_at = ? "
+                        "ORDER BY created_at",
+                        (STATUS_REPLAYING, self.owner, now),
+                    ).fetchall()
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+            return [SubmissionRecord.from_row(row) for row in rows]
+        return await asyncio.to_thread(claim)
+
+    async def _write_loop(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            op = await self._queue.get()
+            if op is None:
+                break
+            batch.append(op)
+            # 等待一个很短的窗口把同一时间段的写操作合并到一次提交
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    op = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if op is None:
+                    stopping = True
+                    break
+                batch.append(op)
+            try:
+                await asyncio.to_thread(self._commit, batch)
+            except Exception as e:
+                logger.error(f"投稿存储写入失败（{len(batch)} 条）: {e}", exc_info=True)
+
+    def _commit(self, batch: List[tuple]):
+        inserts = [args for op, args in batch if op == 'insert']
+        updates = [args for op, args in batch if op == 'status']
+        meta = [args for op, args in batch if op == 'meta']
+        with self._conn_lock:
+            conn = self._conn
+            conn.execute("BEGIN")
+            try:
+                if inserts:
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO submissions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        inserts,
+                    )
+                if updates:
+                    conn.executemany(
+                        "UPDATE submissions SET status = ?, updated_at = ? WHERE id = ?",
+                        updates,
+                    )
+                if meta:
+                    conn.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", meta)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        self.commit_count += 1
+        self.written_count += len(batch)
+
+    async def close(self):
+        """写完队列中剩余的操作后关闭数据库"""
+        if self._writer:
+            # 哨兵排在所有已提交的写操作之后，写协程处理完再退出
+            self._queue.put_nowait(None)
+            await asyncio.gather(self._writer, return_exceptions=True)
+            self._writer = None
+        if self._conn:
+            await asyncio.to_thread(self._conn.close)
+            self._conn = None
+            logger.info("投稿存储已关闭")
@@ -0,0 +1,91 @@
+"""投稿模板解析，模板定义见 submission_types.json"""
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+
+# 支持多种冒号格式
+COLON_VARIANTS = ['：', ':', '∶', '︰', '﹕']
+
+
+@dataclass
+class ParsedSubmission:
+    """模板解析结果"""
+    kind: str  # 投稿类型 id
+    text: str
+    fields: Dict[str, str] = field(default_factory=dict)
+    missing_fields: List[str] = field(default_factory=list)
+    empty_fields: List[str] = field(default_factory=list)
+
+    @property
+    def is_valid(self) -> bool:
+        return not self.missing_fields and not self.empty_fields
+
+    @property
+    def error_message(self) -> str:
+        """与旧版 validate_template 一致的错误提示"""
+        if not self.text:
+            return "投稿内容不能为空"
+        if self.missing_fields:
+            return f"缺少必填字段: {', '.join(self.missing_fields)}"
+        if self.empty_fields:
+            return f"以下字段内容不能为空: {', '.join(self.empty_fields)}"
+        return ""
+
+
+class TemplateParser:
+    """启动时编译一次的模板解析器，单次遍历投稿文本"""
+
+    def __init__(
+        self,
+        required_fields: Dict[str, Sequence[str]],
+        marker_kinds: Dict[str, str],
+        default_kind: str,
+        valueless_fields: Optional[set] = None,
+    ):
+        self.required_fields = {kind: list(names) for kind, names in required_fields.items()}
+        self.marker_kinds = dict(marker_kinds)
+        self.default_kind = default_kind
+        self.valueless_fields = set(valueless_fields or ())
+
+        all_fields = {name for names in self.required_fields.values() for name in names}
+        # 长字段名优先，避免前缀相同的字段被短字段抢先匹配
+        alternation = '|'.join(re.escape(name) for name in sorted(all_fields, key=len, reverse=True))
+        colons = ''.join(re.escape(colon) for colon in COLON_VARIANTS)
+        markers = '|'.join(re.escape(marker) for marker in self.marker_kinds) or r'(?!)'
+        # 模板标记与字段行合并为一个正则，finditer 一次扫描即可完成解析
+        self._scan_re = re.compile(
+            rf'(?P<marker>{markers})'
+            rf'|^[ \t　]*(?P<field>{alternation})[ \t　]*(?:[{colons}](?P<value>.*))?$',
+            re.MULTILINE,
+        )
+
+    def parse(self, text: Optional[str]) -> ParsedSubmission:
+        """解析投稿文本，返回模板类型、字段值以及缺失/为空的字段"""
+        text = text or ""
+        kind = None
+        fields: Dict[str, str] = {}
+        for match in self._scan_re.finditer(text):
+            marker = match.group('marker')
+            if marker:
+                if kind is None:
+                    kind = self.marker_kinds[marker]
+                continue
+            name = match.group('field')
+            value = (match.group('value') or '').strip()
+            # 同一字段出现多次时以第一个非空值为准
+            if not fields.get(name):
+                fields[name] = value
+        if kind is None:
+            kind = self.default_kind
+
+        required = self.required_fields[kind]
+        missing = [name for name in required if name not in fields]
+        empty = [
+            name for name in required
+            if name in fields and not fields[name] and name not in self.valueless_fields
+        ]
+        if not text:
+            missing = list(required)
+        return ParsedSubmission(kind, text, fields, missing, empty)
+
@@ -0,0 +1,152 @@
+"""多租户：同一进程托管多个投稿机器人
+
+每个租户有自己的 Bot token、投稿类型（频道、模板、路由）、违禁词、限流参数、管理员
+和持久化文件；事件循环、发送 API 调用的 HTTP 连接池、准入控制与进程级后台任务由
+所有租户共享。未配置 TENANTS 时只有一个 default 租户，全部沿用原有的环境变量与存储路径。
+"""
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, List, Mapping, Optional
+
+DEFAULT_TENANT = 'default'
+# 租户 ID 会出现在 webhook 路径、数据目录和指标标签中
+_TENANT_ID_RE = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+def _settings(env: Optional[Mapping[str, str]]) -> Dict[str, Any]:
+    """租户相关的全局配置；env 为空时取 config 模块中启动时读取的值"""
+    import config
+    if env is None:
+        return {
+            'tenants': config.TENANTS_PATH,
+            'token': config.TELEGRAM_BOT_TOKEN,
+            'submission_types': config.SUBMISSION_TYPES_PATH,
+            'admin_user_ids': config.ADMIN_USER_IDS,
+            'webhook_secret': config.WEBHOOK_SECRET,
+        }
+    return {
+        'tenants': env.get('TENANTS'),
+        'token': env.get('TELEGRAM_BOT_TOKEN'),
+        'submission_types': env.get('SUBMISSION_TYPES', str(config.BASE_DIR / 'submission_types.json')),
+        'admin_user_ids': config.parse_user_ids(env.get('ADMIN_USER_IDS', '')),
+        'webhook_secret': env.get('WEBHOOK_SECRET'),
+    }
+
+
+@dataclass(frozen=True)
+class TenantConfig:
+    """一个租户的配置"""
+    id: str
+    token: Optional[str]
+    submission_types_path: str
+    forbidden_words_path: Optional[str] = None         # 为空时使用 bot/forbidden_words.py
+    rate_limit: Dict[str, float] = field(default_factory=dict)  # 覆盖 config.RATE_LIMIT 中的项
+    channels: Optional[Mapping[str, str]] = None       # channel_env 的取值，为空时读取环境变量
+    admin_user_ids: FrozenSet[int] = frozenset()
+    webhook_secret: Optional[str] = None
+    data_dir: Optional[Path] = None                    # 为空时使用 config 中原有的存储路径
+
+    @property
+    def webhook_path(self) -> str:
+        """默认租户使用 WEBHOOK_PATH，其余租户在其后加上租户 ID"""
+        import config
+        if self.id == DEFAULT_TENANT:
+            return config.WEBHOOK_PATH
+        return f"{config.WEBHOOK_PATH.rstrip('/')}/{self.id}"
+
+    def data_path(self, name: str, default: str) -> str:
+        """租户的存储文件路径"""
+        return str(self.data_dir / name) if self.data_dir else default
+
+    @classmethod
+    def from_config(cls, data: Dict[str, Any], base_dir: Path,
+                    env: Optional[Mapping[str, str]] = None) -> 'TenantConfig':
+        """env 为 token_env 等环境变量的取值来源，默认读取环境变量"""
+        import config
+        settings = _settings(env)
+        environ = os.environ if env is None else env
+        tenant_id = str(data['id'])
+        if not _TENANT_ID_RE.match(tenant_id):
+            raise ValueError(f"租户 ID 只能包含字母、数字、下划线和连字符: {tenant_id!r}")
+        token = data.get('token')
+        if token is None and data.get('token_env'):
+            token = environ.get(data['token_env'])
+        if not token:
+            raise ValueError(f"租户 {tenant_id} 未配置 Bot token（token 或 token_env）")
+        secret = data.get('webhook_secret')
+        if secret is None and data.get('webhook_secret_env'):
+            secret = environ.get(data['webhook_secret_env'])
+
+        def resolve(path: Optional[str]) -> Optional[str]:
+            return str(base_dir / path) if path else None
+
+        admins = data.get('admin_user_ids')
+        # 默认租户沿用原有的存储路径，从单机器人切换到租户配置文件时数据不丢失
+        data_dir = resolve(data.get('data_dir'))
+        if data_dir is None and tenant_id != DEFAULT_TENANT:
+            data_dir = config.BASE_DIR / 'data' / 'tenants' / tenant_id
+        return cls(
+            id=tenant_id,
+            token=token,
+            submission_types_path=resolve(data.get('submission_types')) or settings['submission_types'],
+            forbidden_words_path=resolve(data.get('forbidden_words')),
+            rate_limit=dict(data.get('rate_limit', {})),
+            channels={name: str(value) for name, value in data['channels'].items()}
+            if 'channels' in data else None,
+            admin_user_ids=frozenset(int(uid) for uid in admins) if admins is not None
+            else frozenset(settings['admin_user_ids']),
+            webhook_secret=secret,
+            data_dir=Path(data_dir) if data_dir else None,
+        )
+
+
+def default_tenant(env: Optional[Mapping[str, str]] = None) -> TenantConfig:
+    """未配置 TENANTS 时的唯一租户，沿用原有的环境变量"""
+    settings = _settings(env)
+    return TenantConfig(
+        id=DEFAULT_TENANT,
+        token=settings['token'],
+        submission_types_path=settings['submission_types'],
+        admin_user_ids=frozenset(settings['admin_user_ids']),
+        webhook_secret=settings['webhook_secret'],
+    )
+
+
+def load_tenants(path: Optional[str] = None, env: Optional[Mapping[str, str]] = None) -> List[TenantConfig]:
+    """读取租户配置文件；未配置时返回只含默认租户的列表"""
+    path = path or _settings(env)['tenants']
+    if not path:
+        return [default_tenant(env)]
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    tenants = [TenantConfig.from_config(item, Path(path).parent, env) for item in data['tenants']]
+    if not tenants:
+        raise ValueError("租户配置文件中至少需要一个租户")
+    ids = [tenant.id for tenant in tenants]
+    if len(set(ids)) != len(ids):
+        raise ValueError(f"租户 ID 重复: {ids}")
+    if len({tenant.token for tenant in tenants}) != len(tenants):
+        raise ValueError("多个租户使用了同一个 Bot token")
+    return tenants
+
+
+def find_tenant(tenant_id: str, env: Optional[Mapping[str, str]] = None) -> TenantConfig:
+    """按 ID 从当前配置中查找租户"""
+    for tenant in load_tenants(env=env):
+        if tenant.id == tenant_id:
+            return tenant
+    raise ValueError(f"租户配置中不存在租户 {tenant_id}")
+
+
+def load_forbidden_words(path: str) -> Dict[str, List[str]]:
+    """读取租户的违禁词文件，格式与 FORBIDDEN_WORDS 相同：{分类: [违禁词, ...]}"""
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def tenant_of(context) -> str:
+    """处理器所属的租户 ID，创建机器人时写入 Application.bot_data"""
+    return context.application.bot_data.get('tenant', DEFAULT_TENANT)
@@ -0,0 +1,139 @@
+"""Bot API HTTP 传输层"""
+import importlib.util
+import time
+from typing import Any, Dict
+import httpx
+from telegram.request import HTTPXRequest
+from config import HTTP_TRACE
+from utils import logger
+from bot.tenants import DEFAULT_TENANT
+from bot.metrics import (
+    TELEGRAM_API_ERRORS,
+    TELEGRAM_API_SECONDS,
+    TELEGRAM_CONNECT_SECONDS,
+    TELEGRAM_CONNECTIONS,
+    TELEGRAM_POOL_WAIT_SECONDS,
+)
+
+
+class InstrumentedHTTPXRequest(HTTPXRequest):
+    """记录每个 Bot API 方法调用耗时的 HTTPXRequest
+
+    开启 trace 时通过 httpcore 的 trace 扩展记录每个请求等待连接池的时间、
+    新建连接的耗时，以及连接是新建还是复用的。
+
+    同一实例可由多个租户的 Bot 共用，initialize/shutdown 按引用计数，最后一个使用者
+    停止时才关闭连接池。调用耗时按请求 URL 中的 Bot 地址（含 token）归属到租户。
+    """
+
+    def __init__(self, *args, pool: str = 'api', trace: bool = False, **kwargs):
+        self.pool = pool
+        self.users = 0
+        # Bot.base_url -> 租户 ID
+        self._tenants: Dict[str, str] = {}
+        self.requests = 0
+        self.new_connections = 0
+        self.reused_connections = 0
+        self.pool_wait_max = 0.0
+        self._pool_wait_total = 0.0
+        self._pool_wait = TELEGRAM_POOL_WAIT_SECONDS.labels(pool)
+        self._connect = TELEGRAM_CONNECT_SECONDS.labels(pool)
+        self._new = TELEGRAM_CONNECTIONS.labels(pool, "new")
+        self._reused = TELEGRAM_CONNECTIONS.labels(pool, "reused")
+        if trace:
+            httpx_kwargs = kwargs.setdefault('httpx_kwargs', {})
+            httpx_kwargs.setdefault('event_hooks', {}).setdefault('request', []).append(self._attach_trace)
+        super().__init__(*args, **kwargs)
+
+    @classmethod
+    def from_settings(cls, pool: str, settings: Dict[str, Any]) -> 'InstrumentedHTTPXRequest':
+        """按 config 中的 HTTP_API / HTTP_UPDATES 创建"""
+        http2 = settings['HTTP2']
+        if http2 and importlib.util.find_spec('h2') is None:
+            logger.warning(f"{pool} 连接池配置了 HTTP/2，但未安装 h2（pip install \"httpx[http2]\"），改用 HTTP/1.1")
+            http2 = False
+        return cls(
+            pool=pool,
+            trace=HTTP_TRACE,
+            connection_pool_size=settings['POOL_SIZE'],
+            connect_timeout=settings['CONNECT_TIMEOUT'],
+            read_timeout=settings['READ_TIMEOUT'],
+            write_timeout=settings['WRITE_TIMEOUT'],
+            media_write_timeout=settings['MEDIA_WRITE_TIMEOUT'],
+            pool_timeout=settings['POOL_TIMEOUT'],
+            http_version='2' if http2 else '1.1',
+            httpx_kwargs={
+                'limits': httpx.Limits(
+                    max_connections=settings['POOL_SIZE'],
+                    max_keepalive_connections=settings['KEEPALIVE'],
+                    keepalive_expiry=settings['KEEPALIVE_EXPIRY'],
+                ),
+            },
+        )
+
+    def add_tenant(self, base_url: str, tenant: str):
+        """登记使用本连接池的 Bot，base_url 为 Bot.base_url"""
+        self._tenants[base_url] = tenant
+
+    async def initialize(self):
+        self.users += 1
+        await super().initialize()
+
+    async def shutdown(self):
+        self.users = max(0, self.users - 1)
+        if self.users:
+            return
+        await super().shutdown()
+
+    async def _attach_trace(self, request: httpx.Request):
+        """httpx 请求钩子：为每个请求挂上 trace 回调"""
+        started = time.perf_counter()
+        connect_started = None
+
+        async def trace(event: str, info: dict):
+            nonlocal connect_started
+            if event == 'connection.connect_tcp.started':
+                # 连接池没有可复用的连接，分到名额后新建连接
+                connect_started = time.perf_counter()
+                self._record_wait(connect_started - started)
+                self.new_connections += 1
+                self._new.inc()
+            elif event.endswith('send_request_headers.started'):
+                now = time.perf_counter()
+                if connect_started is None:
+                    self._record_wait(now - started)
+                    self.reused_connections += 1
+                    self._reused.inc()
+                else:
+                    self._connect.observe(now - connect_started)
+
+        request.extensions['trace'] = trace
+
+    def _record_wait(self, seconds: float):
+        self.requests += 1
+        self._pool_wait_total += seconds
+        if seconds > self.pool_wait_max:
+            self.pool_wait_max = seconds
+        self._pool_wait.observe(seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'users': self.users,
+            'requests': self.requests,
+            'new_connections': self.new_connections,
+            'reused_connections': self.reused_connections,
+            'pool_wait_avg': self._pool_wait_total / self.requests if self.requests else 0.0,
+            'pool_wait_max': self.pool_wait_max,
+        }
+
+    async def do_request(self, url: str, method: str, *args, **kwargs):
+        base_url, _, api_method = url.rpartition('/')
+        tenant = self._tenants.get(base_url, DEFAULT_TENANT)
+        started = time.perf_counter()
+        try:
+            return await super().do_request(url, method, *args, **kwargs)
+        except Exception:
+            TELEGRAM_API_ERRORS.labels(tenant, api_method).inc()
+            raise
+        finally:
+            TELEGRAM_API_SECONDS.labels(tenant, api_method).observe(time.perf_counter() - started)
@@ -1,23 +1,203 @@
 import os
 from pathlib import Path
-from dotenv import load_dotenv
+from typing import Dict, Mapping, Set
+from dotenv import dotenv_values, load_dotenv
 
 # 获取项目根目录
 BASE_DIR = Path(__file__).resolve().parent
 
 
-# 加载环境变量
+# 加载环境变量；进程启动时已有的环境变量优先于 .env 中的同名配置
 env_path = BASE_DIR / '.env'
+_PROCESS_ENV = dict(os.environ)
 load_dotenv(env_path)
 
+
+def read_env() -> Dict[str, str]:
+    """重新读取 .env 与启动时的环境变量，热更新运行时配置时使用"""
+    values = {key: value for key, value in dotenv_values(env_path).items() if value is not None}
+    return {**values, **_PROCESS_ENV}
+
+
+def parse_user_ids(value: str) -> Set[int]:
+    """逗号分隔的用户 ID"""
+    return {int(uid) for uid in value.split(',') if uid.strip()}
+
+
+def parse_rate_limit(env: Mapping[str, str]) -> Dict[str, float]:
+    """速率限制配置"""
+    return {
+        'MAX_MESSAGES': int(env.get('RATE_LIMIT_MAX_MESSAGES', 10)),     # 每个时间窗口允许的最大消息数
+        'TIME_WINDOW': int(env.get('RATE_LIMIT_TIME_WINDOW', 600)),      # 时间窗口大小(秒)
+        'COOLDOWN_TIME': int(env.get('RATE_LIMIT_COOLDOWN_TIME', 900)),  # 超限后的冷却时间(秒)
+        'SWEEP_INTERVAL': 300,  # 清理空闲用户记录的间隔(秒)
+    }
+
+
 # Telegram 配置
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 BOOM_CHANNEL_ID = os.getenv('BOOM_CHANNEL_ID')
 RECORDING_CHANNEL_ID = os.getenv('RECORDING_CHANNEL_ID')
+# Bot API 服务地址，留空使用官方地址；可指向自建 Bot API 服务或基准测试用的本地模拟服务
+TELEGRAM_API_BASE_URL = os.getenv('TELEGRAM_API_BASE_URL')
+
+# Bot API HTTP 连接池：发送消息等 API 调用与 getUpdates 长轮询使用各自的连接池，
+# 长轮询占用连接时不会让发送排队，大量发送也不会拖慢接收更新
+HTTP_API = {
+    'POOL_SIZE': int(os.getenv('HTTP_API_POOL_SIZE', 128)),            # 最大连接数
+    'KEEPALIVE': int(os.getenv('HTTP_API_KEEPALIVE', 32)),             # 保持的空闲连接数
+    'KEEPALIVE_EXPIRY': float(os.getenv('HTTP_API_KEEPALIVE_EXPIRY', 60)),  # 空闲连接保持时长(秒)
+    'HTTP2': os.getenv('HTTP_API_HTTP2', 'false').lower() in ('1', 'true', 'yes'),  # 需要 h2，未安装时退回 HTTP/1.1
+    'CONNECT_TIMEOUT': float(os.getenv('HTTP_API_CONNECT_TIMEOUT', 5)),
+    'READ_TIMEOUT': float(os.getenv('HTTP_API_READ_TIMEOUT', 10)),
+    'WRITE_TIMEOUT': float(os.getenv('HTTP_API_WRITE_TIMEOUT', 10)),
+    'MEDIA_WRITE_TIMEOUT': float(os.getenv('HTTP_API_MEDIA_WRITE_TIMEOUT', 30)),  # 上传文件时的写超时
+    'POOL_TIMEOUT': float(os.getenv('HTTP_API_POOL_TIMEOUT', 3)),      # 等待空闲连接的最长时间
+}
+HTTP_UPDATES = {
+    'POOL_SIZE': int(os.getenv('HTTP_UPDATES_POOL_SIZE', 2)),          # 同一时间只有一个 getUpdates
+    'KEEPALIVE': int(os.getenv('HTTP_UPDATES_KEEPALIVE', 1)),
+    'KEEPALIVE_EXPIRY': float(os.getenv('HTTP_UPDATES_KEEPALIVE_EXPIRY', 60)),
+    'HTTP2': os.getenv('HTTP_UPDATES_HTTP2', 'false').lower() in ('1', 'true', 'yes'),
+    'CONNECT_TIMEOUT': float(os.getenv('HTTP_UPDATES_CONNECT_TIMEOUT', 5)),
+    'READ_TIMEOUT': float(os.getenv('HTTP_UPDATES_READ_TIMEOUT', 5)),   # 另加长轮询的 timeout
+    'WRITE_TIMEOUT': float(os.getenv('HTTP_UPDATES_WRITE_TIMEOUT', 5)),
+    'MEDIA_WRITE_TIMEOUT': float(os.getenv('HTTP_UPDATES_MEDIA_WRITE_TIMEOUT', 5)),
+    'POOL_TIMEOUT': float(os.getenv('HTTP_UPDATES_POOL_TIMEOUT', 1)),
+}
+# 记录连接池等待时间与连接复用情况（httpcore trace 扩展）
+HTTP_TRACE = os.getenv('HTTP_TRACE', 'true').lower() in ('1', 'true', 'yes')
+
+# 管理员用户 ID（逗号分隔），可使用 /reload 等管理命令
+ADMIN_USER_IDS = parse_user_ids(os.getenv('ADMIN_USER_IDS', ''))
+
+# 投稿类型配置文件（标记、字段、模板、按钮与目标频道）
+SUBMISSION_TYPES_PATH = os.getenv('SUBMISSION_TYPES', str(BASE_DIR / 'submission_types.json'))
+
+# 多租户配置文件（同一进程托管多个机器人，见 tenants.example.json），
+# 未设置时只运行一个使用上述环境变量的默认租户
+TENANTS_PATH = os.getenv('TENANTS')
+
+# 更新接收方式: polling（长轮询）或 webhook
+BOT_MODE = os.getenv('BOT_MODE', 'polling').lower()
+# Webhook 配置，BOT_MODE=webhook 时生效
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')  # 对外可访问的地址，例如 https://example.com
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram/webhook')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')  # 校验 X-Telegram-Bot-Api-Secret-Token，webhook 模式必须配置
+# 停止时是否删除 webhook；多个 worker/副本共用同一个 webhook 时保持关闭，否则一个实例重启会让其余实例收不到更新
+WEBHOOK_DELETE_ON_SHUTDOWN = os.getenv('WEBHOOK_DELETE_ON_SHUTDOWN', 'false').lower() in ('1', 'true', 'yes')
+
+# 日志配置
+LOGGING = {
+    'LEVEL': os.getenv('LOG_LEVEL', 'INFO').upper(),
+    'FORMAT': os.getenv('LOG_FORMAT', 'text').lower(),  # text 或 json
+    'QUEUE_SIZE': 10000,            # 待输出日志上限，写满后丢弃并计数
+    'SAMPLE_INTERVAL': 60,          # 高频日志的采样周期(秒)
+    'SAMPLE_LIMIT': 10,             # 每个采样周期内同类日志最多输出条数
+}
+
+# 速率限制配置，可热更新
+RATE_LIMIT = parse_rate_limit(os.environ)
+# 同时处理的更新数上限（同一用户的更新始终按顺序处理）
+CONCURRENT_UPDATES = int(os.getenv('CONCURRENT_UPDATES', 64))
+
+# 启动时是否丢弃重启期间积压的更新
+DROP_PENDING_UPDATES = os.getenv('DROP_PENDING_UPDATES', 'false').lower() in ('1', 'true', 'yes')
+
+# 投稿处理流水线配置
+PIPELINE = {
+    'ACK': os.getenv('PIPELINE_ACK', 'true').lower() in ('1', 'true', 'yes'),  # 收到投稿后立即回复
+    'QUEUE_SIZE': 100,          # 每个阶段的队列长度
+    'WORKERS': {                # 每个阶段的工作协程数
+        'validate': 2,
+        'moderate': 2,
+        'route': 1,
+        'publish': 4,
+    },
+}
+
+# 全局准入控制：并发上限与各优先级的排队时间预算(秒)
+ADMISSION = {
+    'MAX_CONCURRENT': int(os.getenv('ADMISSION_MAX_CONCURRENT', 32)),  # 同时处理的更新数
+    'MAX_WAITING': int(os.getenv('ADMISSION_MAX_WAITING', 200)),       # 排队等待的更新数上限
+    'NORMAL_BUDGET': float(os.getenv('ADMISSION_NORMAL_BUDGET', 5)),   # 文字投稿最长排队时间
+    'BULK_BUDGET': float(os.getenv('ADMISSION_BULK_BUDGET', 1)),       # 新相册最长排队时间
+}
+
+# 排障接口：未设置 DEBUG_TOKEN 时 /debug 路由不可用
+DEBUG = {
+    'TOKEN': os.getenv('DEBUG_TOKEN'),       # 请求头 X-Debug-Token
+    'LOOP_LAG_INTERVAL': 0.25,                # 事件循环延迟哨兵的唤醒间隔(秒)
+    'PROFILE_MAX_SECONDS': 60,                # 单次采样分析的最长时长
+    'PROFILE_INTERVAL': 0.005,                # 默认采样间隔(秒)
+}
+
+# 停止时等待处理中投稿与出站消息完成的总时长(秒)
+SHUTDOWN_TIMEOUT = float(os.getenv('SHUTDOWN_TIMEOUT', 20))
+
+# 投稿持久化配置
+SUBMISSION_STORE = {
+    'PATH': os.getenv('SUBMISSION_DB', str(BASE_DIR / 'data' / 'submissions.db')),
+    'BATCH_SIZE': 200,         # 单次提交的最大写操作数
+    'FLUSH_INTERVAL': 0.05,    # 攒批等待时间(秒)
+    'RETENTION_DAYS': 30,      # 已投递/失败记录保留天数
+    'REPLAY_INTERVAL': 60,     # 共享状态时检查其他实例遗留的未送达投稿的间隔(秒)
+}
+
+# 合集模式：纯文字投稿攒够一段时间或条数后合并为一条频道消息发送，相册仍单独发送
+DIGEST = {
+    'ENABLED': os.getenv('DIGEST_ENABLED', 'false').lower() in ('1', 'true', 'yes'),
+    'TYPES': {kind.strip() for kind in os.getenv('DIGEST_TYPES', 'recommend').split(',') if kind.strip()},
+    'WINDOW': float(os.getenv('DIGEST_WINDOW', 300)),      # 第一条投稿起最长等待时间(秒)
+    'MAX_ITEMS': int(os.getenv('DIGEST_MAX_ITEMS', 10)),   # 单个合集最多条数
+}
+
+# 投稿统计配置
+STATS = {
+    'DAYS': 30,                 # 统计窗口(天)
+    'PATH': os.getenv('STATS_PATH', str(BASE_DIR / 'data' / 'stats.json')),  # 定期保存的快照，共享状态后端时不使用
+    'SNAPSHOT_INTERVAL': 60,    # 保存间隔(秒)
+}
+
+# 重复投稿检测配置
+DEDUP = {
+    'ENABLED': os.getenv('DEDUP_ENABLED', 'true').lower() in ('1', 'true', 'yes'),
+    'WINDOW': 3 * 86400,        # 检测窗口(秒)
+    'MAX_ENTRIES': 50000,       # 索引最多保留的投稿数
+    'MIN_SIMILARITY': 0.8,      # MinHash 估计的相似度不低于该值视为近似重复
+}
+
+# 健康检查配置
+HEALTH = {
+    'PROBE_INTERVAL': float(os.getenv('HEALTH_PROBE_INTERVAL', 30)),  # 后台探测间隔(秒)
+    'PROBE_TIMEOUT': float(os.getenv('HEALTH_PROBE_TIMEOUT', 10)),    # 单次探测超时(秒)
+}
+
+# 出站发送限流配置（参考 Telegram 官方限制）
+SEND_RATE = {
+    'CHANNEL_PER_MINUTE': 20,   # 每个频道/群组每分钟最多消息数
+    'CHANNEL_BURST': 5,         # 每个频道/群组允许的突发消息数
+    'PRIVATE_PER_SECOND': 1,    # 每个私聊每秒最多消息数
+    'GLOBAL_PER_SECOND': 30,    # 全局每秒最多消息数
+    'MAX_RETRIES': 5,           # 网络错误最大重试次数
+    'RETRY_BASE_DELAY': 1.0,    # 重试退避基础时间(秒)
+    'MAX_PENDING': 5000,        # 排队任务上限
+    'HIGH_WATERMARK': 0.8,      # 排队超过该比例时投稿发布阶段等待，余量留给用户通知
+}
+
+# 状态后端: memory（进程内，单 worker）或 sqlite（多个 worker/副本共享同一个文件）
+STATE_BACKEND = {
+    'KIND': os.getenv('STATE_BACKEND', 'memory').lower(),
+    'PATH': os.getenv('STATE_DB', str(BASE_DIR / 'data' / 'state.db')),
+    'LEASE_TTL': float(os.getenv('STATE_LEASE_TTL', 15)),  # 轮询主节点租约有效期(秒)
+}
+# uvicorn worker 数，大于 1 时需要共享状态后端
+WEB_WORKERS = int(os.getenv('WEB_WORKERS', 1))
 
-# 速率限制配置
-RATE_LIMIT = {
-    'MAX_MESSAGES': 10,      # 每个时间窗口允许的最大消息数
-    'TIME_WINDOW': 600,     # 时间窗口大小(秒)
-    'COOLDOWN_TIME': 900,  # 超限后的冷却时间(秒)
+# 媒体组（相册）聚合配置
+MEDIA_GROUP = {
+    'QUIET_PERIOD': 1.5,   # 最后一个文件到达后等待的静默时间(秒)
+    'MAX_ITEMS': 10,       # 单个媒体组文件上限，达到后立即处理
+    'MAX_GROUPS': 1000,    # 同时缓冲的媒体组上限
+    'TTL': 30,             # 单个媒体组最长缓冲时间(秒)
 }
\ No newline at end of file
@@ -2,8 +2,19 @@ import asyncio
 from contextlib import asynccontextmanager
 from datetime import datetime, timezone
 import json
+from typing import Optional
+import secrets
+import threading
 from fastapi import FastAPI, Request
-from bot import create_bot, stop_bot, bot_state
+from telegram import Update
+from bot import (
+    BotState, create_bot, stop_bot, bot_states, managed_tasks, set_webhook, delete_webhook,
+    tenant_states,
+)
+from bot.debug import dump_tasks, loop_lag_monitor, profiler
+from bot.metrics import CONTENT_TYPE, render_metrics
+from bot.tenants import DEFAULT_TENANT, load_tenants
+from config import BOT_MODE, DEBUG, WEBHOOK_DELETE_ON_SHUTDOWN, WEBHOOK_PATH
 from utils import logger
 from fastapi import FastAPI, Response
 
@@ -12,20 +23,34 @@ from fastapi import FastAPI, Response
 async def lifespan(app: FastAPI):
     """应用生命周期管理"""
     try:
-        # 初始化机器人
-        await create_bot()
+        tenants = load_tenants()
+        # 未配置 secret 时任何人都能向 webhook 路径伪造更新，拒绝启动
+        missing = [tenant.id for tenant in tenants if not tenant.webhook_secret]
+        if BOT_MODE == 'webhook' and missing:
+            raise ValueError(f"BOT_MODE=webhook 时必须配置 webhook secret，以下租户未配置: {', '.join(missing)}")
+        # 初始化所有租户的机器人，共用同一个事件循环与 API 连接池
+        for tenant in tenants:
+            await create_bot(tenant)
+            if BOT_MODE == 'webhook':
+                await set_webhook(tenant.id)
         
         logger.info("应用初始化完成")
         yield
         
         # 关闭时清理
         logger.info("开始清理资源...")
-        for task in bot_state.tasks:
+        # 默认保留 webhook：其他 worker/副本仍在接收更新，本实例重启后会重新设置
+        if BOT_MODE == 'webhook' and WEBHOOK_DELETE_ON_SHUTDOWN:
+            for tenant_id in tenant_states():
+                await delete_webhook(tenant_id)
+
+        tasks = managed_tasks()
+        for task in tasks:
             if not task.done():
                 task.cancel()
         
-        if bot_state.tasks:
-            await asyncio.gather(*bot_state.tasks, return_exceptions=True)
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
 
         await stop_bot()
         logger.info("资源清理完成")
@@ -38,46 +63,44 @@ async def lifespan(app: FastAPI):
 # 创建FastAPI应用
 app = FastAPI(lifespan=lifespan)
 
+def _json_response(data: dict, status_code: int = 200) -> Response:
+    return Response(
+        content=json.dumps(data, ensure_ascii=False),
+        status_code=status_code,
+        media_type="application/json"
+    )
+
+
 @app.head("/health")
 @app.get("/health")
 async def health_check(request: Request):
-    """健康检查接口"""
+    """健康检查接口（读取后台探测的缓存结果，不访问 Telegram），所有租户正常才视为健康"""
     try:
+        monitors = {tenant_id: state.health for tenant_id, state in tenant_states().items()}
+        healthy = {
+            tenant_id: bool(health and health.bot_ok and not health.is_stale)
+            for tenant_id, health in monitors.items()
+        }
+        is_healthy = bool(healthy) and all(healthy.values())
         if request.method == "HEAD":
-            return Response(status_code=200)
-        
+            return Response(status_code=200 if is_healthy else 503)
+
+        checked = [health.checked_at for health in monitors.values() if health and health.checked_at]
         status = {
-            "bot": False,
-            "details": [],
+            "bot": bool(monitors) and all(health and health.bot_ok for health in monitors.values()),
+            "details": [
+                health.detail if health else "Bot 未初始化或未连接" for health in monitors.values()
+            ] or ["Bot 未初始化或未连接"],
+            # 多个租户时取最早的一次探测
+            "checked_at": min(checked) if checked else None,
+            "tenants": healthy,
             "timestamp": datetime.now(timezone.utc).isoformat()
         }
-
-        # 检查 bot 状态
-        try:
-            if bot_state.application and bot_state.application.bot:
-                me = await bot_state.application.bot.get_me()
-                if me and me.id:
-                    status["bot"] = True
-                    status["details"].append(f"Bot 正常运行 (ID: {me.id})")
-            else:
-                status["details"].append("Bot 未初始化或未连接")
-                logger.warning("健康检查 - Bot 未初始化")
-        except Exception as e:
-            status["details"].append(f"Bot 状态检查失败: {str(e)}")
-            logger.error(f"健康检查 - Bot 状态检查失败: {e}")
-
-        # 确定响应状态码和消息
-        is_healthy = all([status["bot"]])
         response_data = {
             "status": "healthy" if is_healthy else "unhealthy",
             "checks": status
         }
-
-        return Response(
-            content=json.dumps(response_data, ensure_ascii=False),
-            status_code=200 if is_healthy else 503,
-            media_type="application/json"
-        )
+        return _json_response(response_data, 200 if is_healthy else 503)
 
     except Exception as e:
         error_response = {
@@ -86,13 +109,174 @@ async def health_check(request: Request):
             "timestamp": datetime.now(timezone.utc).isoformat()
         }
         logger.error(f"健康检查执行失败: {e}", exc_info=True)
-        return Response(
-            content=json.dumps(error_response, ensure_ascii=False),
-            status_code=503,
-            media_type="application/json"
-        )
+        return _json_response(error_response, 503)
+
+
+@app.head("/health/live")
+@app.get("/health/live")
+async def liveness_check(request: Request):
+    """存活检查接口：进程能响应即存活，同时列出各租户的存活状态"""
+    if request.method == "HEAD":
+        return Response(status_code=200)
+    tenants = {
+        tenant_id: state.health.liveness()["status"] if state.health else "starting"
+        for tenant_id, state in tenant_states().items()
+    }
+    return _json_response({
+        "status": "alive",
+        "tenants": tenants,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+    })
+
+
+@app.head("/health/ready")
+@app.get("/health/ready")
+async def readiness_check(request: Request):
+    """就绪检查接口：只有一个租户时返回其就绪详情，多个租户时全部就绪才视为就绪"""
+    states = tenant_states()
+    if not states or any(state.health is None for state in states.values()):
+        return _json_response({"status": "not_ready", "detail": "Bot 未初始化"}, 503)
+
+    if len(states) == 1:
+        readiness = next(iter(states.values())).health.readiness()
+    else:
+        tenants = {tenant_id: state.health.readiness() for tenant_id, state in states.items()}
+        ready = all(item["status"] == "ready" for item in tenants.values())
+        readiness = {
+            "status": "ready" if ready else "not_ready",
+            "tenants": tenants,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        }
+    status_code = 200 if readiness["status"] == "ready" else 503
+    if request.method == "HEAD":
+        return Response(status_code=status_code)
+    return _json_response(readiness, status_code)
+
+
+@app.head("/health/ready/{tenant_id}")
+@app.get("/health/ready/{tenant_id}")
+async def tenant_readiness_check(request: Request, tenant_id: str):
+    """单个租户的就绪检查接口"""
+    state = tenant_states().get(tenant_id)
+    if state is None:
+        return _json_response({"status": "not_found", "detail": f"租户 {tenant_id} 不存在"}, 404)
+    if not state.health:
+        return _json_response({"status": "not_ready", "detail": "Bot 未初始化"}, 503)
+
+    readiness = state.health.readiness()
+    status_code = 200 if readiness["status"] == "ready" else 503
+    if request.method == "HEAD":
+        return Response(status_code=status_code)
+    return _json_response(readiness, status_code)
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus 指标接口"""
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE)
+
+
+def _check_debug_token(request: Request) -> Optional[Response]:
+    """排障接口鉴权，未配置令牌时路由不存在"""
+    if not DEBUG['TOKEN']:
+        return Response(status_code=404)
+    token = request.headers.get("X-Debug-Token", "")
+    # 按字节比较，请求头含非 ASCII 字符时 compare_digest(str, str) 会抛出 TypeError
+    if not secrets.compare_digest(token.encode(), DEBUG['TOKEN'].encode()):
+        logger.warning("排障接口令牌校验失败")
+        return Response(status_code=403)
+    return None
+
+
+@app.get("/debug/profile")
+async def debug_profile(request: Request, seconds: float = 10, interval: float = DEBUG['PROFILE_INTERVAL'],
+                        all_threads: bool = False):
+    """采样分析 seconds 秒，返回 flamegraph 折叠栈文本"""
+    denied = _check_debug_token(request)
+    if denied:
+        return denied
+    seconds = min(max(seconds, 0.1), DEBUG['PROFILE_MAX_SECONDS'])
+    # 采样线程持有 profiler 的锁休眠，间隔不超过采样时长，避免长时间占住锁和线程
+    interval = min(max(interval, 0.001), seconds)
+    if profiler.running:
+        return _json_response({"error": "已有采样正在进行"}, 409)
+    # 采样线程运行期间事件循环照常工作，默认只采事件循环所在线程
+    thread_ids = None if all_threads else [threading.get_ident()]
+    try:
+        output = await asyncio.to_thread(profiler.profile, seconds, interval, thread_ids)
+    except RuntimeError as e:
+        return _json_response({"error": str(e)}, 409)
+    return Response(content=output, media_type="text/plain; charset=utf-8")
+
+
+@app.get("/debug/tasks")
+async def debug_tasks(request: Request):
+    """列出所有存活的 asyncio 任务及其协程栈"""
+    denied = _check_debug_token(request)
+    if denied:
+        return denied
+    tasks = dump_tasks(managed_tasks())
+    return _json_response({"count": len(tasks), "tasks": tasks})
+
+
+@app.get("/debug/loop-lag")
+async def debug_loop_lag(request: Request):
+    """事件循环延迟直方图"""
+    denied = _check_debug_token(request)
+    if denied:
+        return denied
+    return _json_response(loop_lag_monitor.stats())
+
+
+async def _receive_update(request: Request, state: Optional[BotState]) -> Response:
+    """接收 Telegram 推送给某个租户的更新并放入其 update_queue"""
+    if BOT_MODE != 'webhook' or state is None or not state.application:
+        return Response(status_code=404)
+    if not state.accepting:
+        # 正在停止，Telegram 会稍后重试，更新不会丢失
+        return Response(status_code=503)
+
+    # 校验 Telegram 携带的 secret token（webhook 模式启动时已确保配置）
+    secret = state.tenant.webhook_secret or ""
+    token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+    if not secret or not secrets.compare_digest(token.encode(), secret.encode()):
+        logger.warning(f"租户 {state.tenant.id} 的 webhook 请求 secret token 校验失败")
+        return Response(status_code=403)
+
+    try:
+        data = await request.json()
+        update = Update.de_json(data, state.application.bot)
+    except Exception as e:
+        logger.error(f"解析 webhook 更新失败: {e}")
+        return Response(status_code=400)
+
+    await state.application.update_queue.put(update)
+    return Response(status_code=200)
+
+
+@app.post(WEBHOOK_PATH)
+async def telegram_webhook(request: Request):
+    """默认租户的 webhook"""
+    return await _receive_update(request, bot_states.get(DEFAULT_TENANT))
+
+
+@app.post(WEBHOOK_PATH.rstrip('/') + "/{tenant_id}")
+async def tenant_webhook(request: Request, tenant_id: str):
+    """其他租户的 webhook，路径为 WEBHOOK_PATH/<租户 ID>"""
+    if tenant_id == DEFAULT_TENANT:
+        return Response(status_code=404)
+    return await _receive_update(request, bot_states.get(tenant_id))
     
     
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    from config import STATE_BACKEND, WEB_WORKERS
+    workers = WEB_WORKERS
+    if workers > 1 and STATE_BACKEND['KIND'] == 'memory':
+        # 进程内状态无法在 worker 之间共享，限流和相册聚合会失效
+        logger.warning("多 worker 需要设置 STATE_BACKEND=sqlite，当前以单 worker 运行")
+        workers = 1
+    if workers > 1:
+        uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
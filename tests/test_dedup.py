@@ -0,0 +1,43 @@
+"""重复投稿检测"""
+import asyncio
+from bot.dedup import DuplicateDetector
+from bot.handlers import SubmissionHandler
+from bot.pipeline import SubmissionContext
+from bot.sender import OutboundScheduler
+
+TEXT = "老师花名：小美\n联系方式：@xiaomei\n价格：1000\n地址：北京朝阳\n评价：环境干净，服务很好\n服务：全套"
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append((chat_id, text))
+
+
+async def _moderate(handler, bot, user_id, message_id, text):
+    ctx = SubmissionContext(bot, f"{user_id}:{message_id}", user_id, user_id, text, [])
+    ctx = await handler._stage_validate(ctx)
+    assert ctx is not None
+    return await handler._stage_moderate(ctx)
+
+
+def test_same_text_twice_is_rejected():
+    async def run():
+        handler = SubmissionHandler(OutboundScheduler())
+        bot = FakeBot()
+        assert await _moderate(handler, bot, 1, 1, TEXT) is not None
+        assert await _moderate(handler, bot, 1, 2, TEXT) is None
+        assert "请勿重复投稿" in bot.sent[-1][1]
+    asyncio.run(run())
+
+
+def test_near_duplicates_only_match_same_user():
+    detector = DuplicateDetector(window=3600, max_entries=100)
+    detector.add('1:1', TEXT, scope=1)
+    similar = TEXT.replace("服务很好", "服务非常好")
+    assert detector.find(similar, scope=2) is None
+    assert detector.find(similar, scope=1).reason == 'near'
+    # 完全相同的内容不论是谁提交都视为重复
+    assert detector.find(TEXT, scope=2).reason == 'exact'
@@ -0,0 +1,68 @@
+"""合集拆分与发送"""
+import asyncio
+from telegram.error import BadRequest
+from bot.digest import SEPARATOR, DigestEntry, pack_digest, telegram_length
+from bot.handlers import SubmissionHandler
+from bot.sender import OutboundScheduler
+
+
+async def _noop(ok):
+    pass
+
+
+def _header(count):
+    return f"合集（{count} 条）\n\n"
+
+
+def test_entries_fill_messages_up_to_limit():
+    entries = [DigestEntry("a" * 40, _noop) for _ in range(5)]
+    # 表头 9 + 投稿 40 + 分隔符 9 + 投稿 40 = 98，每条消息放两条投稿
+    messages = pack_digest(entries, _header, limit=100)
+    assert [len(chunk) for _, chunk in messages] == [2, 2, 1]
+    assert all(telegram_length(text) <= 100 for text, _ in messages)
+
+
+def test_entry_too_long_for_header_is_sent_alone():
+    limit = 100
+    header_length = telegram_length(_header(3))
+    short = DigestEntry("短投稿", _noop)
+    # 单独发送不超出 limit，但加上表头后超出
+    oversized = DigestEntry("长" * (limit - header_length + 1), _noop)
+    messages = pack_digest([short, oversized, short], _header, limit=limit)
+
+    assert [chunk for _, chunk in messages] == [[short], [oversized], [short]]
+    assert messages[1][0] == oversized.text
+    assert all(telegram_length(text) <= limit for text, _ in messages)
+
+
+def test_rejected_digest_is_resent_entry_by_entry():
+    class Bot:
+        def __init__(self):
+            self.sent = []
+
+        async def send_message(self, chat_id, text, **kwargs):
+            if "无法解析" in text:
+                raise BadRequest("Can't parse entities")
+            self.sent.append(text)
+
+    async def run():
+        bot = Bot()
+        handler = SubmissionHandler(OutboundScheduler())
+        results = {}
+        done = asyncio.Event()
+
+        def entry(text):
+            async def on_done(ok):
+                results[text] = ok
+                if len(results) == 2:
+                    done.set()
+            return DigestEntry(text, on_done)
+
+        entries = [entry("正常投稿"), entry("无法解析")]
+        await handler._publish_digest(bot, -1001, SEPARATOR.join(item.text for item in entries), entries)
+        await asyncio.wait_for(done.wait(), 5)
+        return bot.sent, results
+
+    sent, results = asyncio.run(run())
+    assert sent == ["正常投稿"]
+    assert results == {"正常投稿": True, "无法解析": False}
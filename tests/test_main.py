@@ -0,0 +1,43 @@
+"""HTTP 接口鉴权"""
+from fastapi.testclient import TestClient
+import main
+from bot import BotState
+from bot.tenants import TenantConfig
+
+
+class _Application:
+    def __init__(self):
+        self.bot = None
+        self.update_queue = None
+
+
+def test_webhook_secret_with_non_ascii_header_is_rejected(monkeypatch):
+    state = BotState(
+        tenant=TenantConfig(id='webhook_test', token='1:TEST', submission_types_path='', webhook_secret='secret'),
+        application=_Application(),
+        accepting=True,
+    )
+    monkeypatch.setattr(main, 'BOT_MODE', 'webhook')
+    monkeypatch.setitem(main.bot_states, 'webhook_test', state)
+    client = TestClient(main.app)
+    response = client.post(
+        f"{main.WEBHOOK_PATH.rstrip('/')}/webhook_test", json={},
+        headers={"X-Telegram-Bot-Api-Secret-Token": "sécret".encode('utf-8')},
+    )
+    assert response.status_code == 403
+
+
+def test_debug_token_with_non_ascii_header_is_rejected(monkeypatch):
+    monkeypatch.setitem(main.DEBUG, 'TOKEN', 'secret')
+    client = TestClient(main.app)
+    response = client.get("/debug/loop-lag", headers={"X-Debug-Token": "sécret".encode('utf-8')})
+    assert response.status_code == 403
+    assert client.get("/debug/loop-lag", headers={"X-Debug-Token": "secret"}).status_code == 200
+
+
+def test_profile_interval_is_capped_by_duration(monkeypatch):
+    monkeypatch.setitem(main.DEBUG, 'TOKEN', 'secret')
+    client = TestClient(main.app)
+    response = client.get("/debug/profile?seconds=0.2&interval=1e9", headers={"X-Debug-Token": "secret"})
+    assert response.status_code == 200
+    assert not main.profiler.running
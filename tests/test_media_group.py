@@ -0,0 +1,27 @@
+"""媒体组聚合"""
+import asyncio
+from bot.media_group import MediaGroupAggregator, MediaItem
+
+
+def _item(message_id, caption=None):
+    return MediaItem(message_id, f"file{message_id}", f"uid{message_id}", 'photo', caption)
+
+
+def test_late_item_after_flush_is_dropped():
+    flushed = []
+
+    async def on_flush(group):
+        flushed.append([item.message_id for item in group.items])
+
+    async def run():
+        aggregator = MediaGroupAggregator(on_flush, quiet_period=0.01)
+        assert await aggregator.add('g1', 1, 1, None, _item(1, 'caption'))
+        assert not await aggregator.add('g1', 1, 1, None, _item(2))
+        await asyncio.sleep(0.05)
+        # 静默期之后到达的文件不会开启新的媒体组
+        assert not await aggregator.add('g1', 1, 1, None, _item(3))
+        await asyncio.sleep(0.05)
+        assert 'g1' not in aggregator
+
+    asyncio.run(run())
+    assert flushed == [[1, 2]]
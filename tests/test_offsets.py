@@ -0,0 +1,43 @@
+"""更新水位的恢复与失效"""
+import asyncio
+import time
+from bot.offsets import OFFSET_KEY, OFFSET_TIME_KEY, RESTORE_MAX_AGE, UpdateOffsetTracker
+
+
+class FakeStore:
+    def __init__(self, meta):
+        self.meta = dict(meta)
+
+    async def get_meta(self, key):
+        return self.meta.get(key)
+
+    def set_meta(self, key, value):
+        self.meta[key] = value
+
+
+def _tracker(update_id, saved_at):
+    tracker = UpdateOffsetTracker(FakeStore({OFFSET_KEY: str(update_id), OFFSET_TIME_KEY: str(saved_at)}))
+    asyncio.run(tracker.load())
+    return tracker
+
+
+def test_restored_watermark_expires_after_newer_update():
+    tracker = _tracker(1000, time.time())
+    assert tracker.should_skip(999)
+    assert tracker.should_skip(1000)
+    assert not tracker.should_skip(1001)
+    # 之后 ID 较小的更新不再被跳过
+    assert not tracker.should_skip(1000)
+
+
+def test_renumbered_updates_are_not_skipped():
+    tracker = _tracker(10_000_000, time.time())
+    assert not tracker.should_skip(5)
+    tracker.begin(5)
+    tracker.done(5)
+    assert tracker.watermark == 5
+
+
+def test_stale_watermark_is_ignored():
+    tracker = _tracker(1000, time.time() - RESTORE_MAX_AGE - 1)
+    assert not tracker.should_skip(999)
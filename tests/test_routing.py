@@ -0,0 +1,25 @@
+"""投稿路由"""
+import pytest
+from bot.routing import RouteRule, parse_number
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('800', 800),
+    ('1,500', 1500),
+    ('1，500元', 1500),
+    ('¥ 1 200', 1200),
+    ('1,234,567', 1234567),
+    ('1,500.5', 1500.5),
+    ('1.5k', 1500),
+    ('2w', 20000),
+    ('3千', 3000),
+    ('价格 600-800', 600),
+    ('面议', None),
+])
+def test_parse_number(value, expected):
+    assert parse_number(value) == expected
+
+
+def test_range_needs_two_bounds():
+    with pytest.raises(ValueError, match='平价'):
+        RouteRule.from_config({'name': '平价', 'field': '价格', 'range': [800]})
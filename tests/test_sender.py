@@ -0,0 +1,27 @@
+"""出站发送调度"""
+import asyncio
+from telegram.error import RetryAfter
+from bot.sender import OutboundJob, OutboundScheduler
+
+
+def test_retry_after_gives_up_after_max_retries():
+    calls = []
+
+    async def send():
+        calls.append(1)
+        raise RetryAfter(0)
+
+    async def run():
+        scheduler = OutboundScheduler(channel_per_minute=6000, max_retries=2)
+        failed = asyncio.get_running_loop().create_future()
+
+        async def on_failure(error):
+            failed.set_result(error)
+
+        assert scheduler.submit(OutboundJob(chat_id=-1001, send=send, on_failure=on_failure))
+        error = await asyncio.wait_for(failed, 5)
+        await scheduler.stop(1)
+        return error
+
+    assert isinstance(asyncio.run(run()), RetryAfter)
+    assert len(calls) == 3
@@ -0,0 +1,52 @@
+"""共享状态后端"""
+import asyncio
+from bot.media_group import MediaItem
+from bot.state_backend import SharedMediaGroupAggregator, SQLiteStateBackend
+from bot.stats import SubmissionStats
+
+
+def test_aged_media_groups_drop_their_items(tmp_path):
+    now = [0.0]
+
+    async def on_flush(group):
+        pass
+
+    async def run():
+        backend = SQLiteStateBackend(tmp_path / 'state.db')
+        await backend.start()
+        aggregator = SharedMediaGroupAggregator(backend, on_flush, ttl=30, clock=lambda: now[0])
+        # 处理该媒体组的 worker 退出，媒体组一直停留在 open 状态
+        await aggregator.add('g1', 1, 1, None, MediaItem(1, 'f1', 'u1', 'photo', None))
+        now[0] = 100.0
+        await aggregator.add('g2', 1, 1, None, MediaItem(2, 'f2', 'u2', 'photo', None))
+        rows = await backend.run(lambda conn: conn.execute(
+            "SELECT group_id FROM media_items ORDER BY group_id").fetchall())
+        for _, timer in aggregator._local.values():
+            timer.cancel()
+        await backend.close()
+        return rows
+
+    assert asyncio.run(run()) == [('g2',)]
+
+
+def test_worker_stats_are_summed_in_shared_backend(tmp_path):
+    async def run():
+        backends = [SQLiteStateBackend(tmp_path / 'state.db') for _ in range(2)]
+        for backend in backends:
+            await backend.start()
+        workers = [SubmissionStats(path=None, shared=backend.stats_store()) for backend in backends]
+        workers[0].record('delivered', 1, 'recommend', [-100])
+        workers[0].record('duplicate', 2)
+        await workers[0].save()
+        workers[1].record('delivered', 1, 'recommend', [-100])
+        # 未保存的增量在 /stats 汇总时写入
+        total = (await workers[1].aggregate()).summary()
+        for backend in backends:
+            await backend.close()
+        return total
+
+    total = asyncio.run(run())
+    assert total['outcomes']['delivered'] == 2
+    assert total['outcomes']['duplicate'] == 1
+    assert total['channels'] == {'-100': 2}
+    assert total['top_submitters'] == [(1, 2)]
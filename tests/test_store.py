@@ -0,0 +1,35 @@
+"""投稿存储的重放认领"""
+import asyncio
+from bot.store import STATUS_REPLAYING, SubmissionRecord, SubmissionStore
+
+
+def _record(submission_id):
+    return SubmissionRecord(submission_id, 1, 1, 'recommend', {}, 'text', [], -1001)
+
+
+def test_pending_rows_are_claimed_once_and_only_from_exited_owners(tmp_path):
+    path = tmp_path / 'submissions.db'
+
+    async def run():
+        live = SubmissionStore(path, owner='live')
+        exited = SubmissionStore(path, owner='exited')
+        first = SubmissionStore(path, owner='first')
+        second = SubmissionStore(path, owner='second')
+        for store in (live, exited, first, second):
+            await store.start()
+        live.record(_record('live:1'))
+        exited.record(_record('exited:1'))
+        await live.close()
+        await exited.close()
+
+        alive = {'live', 'first', 'second'}
+        claimed_first = await first.claim_pending(alive)
+        claimed_second = await second.claim_pending(alive)
+        await first.close()
+        await second.close()
+        return claimed_first, claimed_second
+
+    claimed_first, claimed_second = asyncio.run(run())
+    # 仍在运行的实例写入的投稿不被认领，已退出实例的投稿只被认领一次
+    assert [(record.id, record.status) for record in claimed_first] == [('exited:1', STATUS_REPLAYING)]
+    assert claimed_second == []
@@ -0,0 +1,35 @@
+"""多租户配置"""
+import asyncio
+import config
+from bot.handlers import SubmissionHandler
+from bot.runtime import build_snapshot, set_snapshot
+from bot.sender import OutboundScheduler
+from bot.tenants import TenantConfig
+
+
+def test_tenant_rate_limit_applies_without_reload():
+    tenant = TenantConfig(
+        id='rate_limit_test', token='1:TEST', submission_types_path=config.SUBMISSION_TYPES_PATH,
+        rate_limit={'MAX_MESSAGES': 2},
+    )
+    set_snapshot(build_snapshot(tenant=tenant))
+
+    async def run():
+        handler = SubmissionHandler(OutboundScheduler(), tenant=tenant.id)
+        assert handler.rate_limiter.MAX_MESSAGES == 2
+        return [(await handler.rate_limiter.acquire(42))[0] for _ in range(5)]
+
+    assert asyncio.run(run()) == [True, True, False, False, False]
+
+
+def test_reload_reads_edited_env_file(tmp_path, monkeypatch):
+    env_file = tmp_path / '.env'
+    env_file.write_text('RATE_LIMIT_MAX_MESSAGES=3\nADMIN_USER_IDS=7,8\n', encoding='utf-8')
+    monkeypatch.setattr(config, 'env_path', env_file)
+    monkeypatch.setattr(config, '_PROCESS_ENV', {'TELEGRAM_BOT_TOKEN': '1:TEST'})
+    assert build_snapshot(reload_sources=True).rate_limit['MAX_MESSAGES'] == 3
+
+    env_file.write_text('RATE_LIMIT_MAX_MESSAGES=5\nADMIN_USER_IDS=9\n', encoding='utf-8')
+    snapshot = build_snapshot(2, reload_sources=True)
+    assert snapshot.rate_limit['MAX_MESSAGES'] == 5
+    assert snapshot.tenant.admin_user_ids == {9}
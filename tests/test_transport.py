@@ -0,0 +1,13 @@
+"""Bot API 传输层"""
+import importlib.util
+import config
+from bot.transport import InstrumentedHTTPXRequest
+
+
+def test_http2_falls_back_without_h2(monkeypatch):
+    find_spec = importlib.util.find_spec
+    monkeypatch.setattr(
+        importlib.util, 'find_spec', lambda name, *args: None if name == 'h2' else find_spec(name, *args)
+    )
+    request = InstrumentedHTTPXRequest.from_settings('api', {**config.HTTP_API, 'HTTP2': True})
+    assert request.http_version == '1.1'
@@ -1,5 +1,15 @@
+import atexit
+import copy
+import json
 import logging
-from typing import Optional
+import os
+import queue
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+from config import LOGGING
 
 # 修改初始化组件定义
 _INITIALIZED_COMPONENTS = {
@@ -23,16 +33,164 @@ def reset_initialization(component: Optional[str] = None) -> None:
         _INITIALIZED_COMPONENTS = {k: False for k in _INITIALIZED_COMPONENTS}
         logger.info("已重置所有组件的初始化状态")
 
+_IMPORTED_AT = time.monotonic()
+_exception_formatter = logging.Formatter()
+
+
+class _ContextFilter(logging.Filter):
+    """在产生日志的协程中附加关联 ID"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.submission_id = submission_id_var.get()
+        record.user_id = user_id_var.get()
+        return True
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """队列写满时丢弃日志并计数，不阻塞事件循环"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 只合并消息参数，格式化留给后台线程
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行 JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key in ('submission_id', 'user_id'):
+            value = getattr(record, key, None)
+            if value is not None:
+                data[key] = value
+        if record.exc_info:
+            data['exc_info'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data['exc_info'] = record.exc_text
+        return json.dumps(data, ensure_ascii=False)
+
+
+class _TextFormatter(logging.Formatter):
+    """文本格式，存在关联 ID 时追加在消息末尾"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        ids = [
+            f"{key}={value}" for key in ('submission_id', 'user_id')
+            if (value := getattr(record, key, None)) is not None
+        ]
+        record.context = f" [{' '.join(ids)}]" if ids else ""
+        return super().format(record)
+
+
+# 当前协程处理的投稿与用户，由处理器设置，日志自动携带
+submission_id_var: ContextVar[Optional[str]] = ContextVar('submission_id', default=None)
+user_id_var: ContextVar[Optional[int]] = ContextVar('user_id', default=None)
+
+
+@contextmanager
+def log_context(submission_id: Optional[str] = None, user_id: Optional[int] = None):
+    """在代码块内为日志设置关联 ID"""
+    tokens = []
+    if submission_id is not None:
+        tokens.append((submission_id_var, submission_id_var.set(submission_id)))
+    if user_id is not None:
+        tokens.append((user_id_var, user_id_var.set(user_id)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+class SampledLogger:
+    """高频日志采样：同一 key 在每个周期内最多输出 limit 条，超出的只计数，
+    下个周期第一条日志附带被省略的条数"""
+
+    def __init__(self, target: logging.Logger, interval: float = LOGGING['SAMPLE_INTERVAL'],
+                 limit: int = LOGGING['SAMPLE_LIMIT']):
+        self._logger = target
+        self.interval = interval
+        self.limit = limit
+        # key -> [周期开始时间, 本周期已输出条数, 被省略条数]
+        self._windows: Dict[str, list] = {}
+
+    def log(self, level: int, key: str, msg: str, *args):
+        if not self._logger.isEnabledFor(level):
+            return
+        now = time.monotonic()
+        window = self._windows.get(key)
+        if window is None or now - window[0] >= self.interval:
+            suppressed = window[2] if window else 0
+            window = self._windows[key] = [now, 0, 0]
+            if suppressed:
+                msg = f"{msg}（上个周期省略了 {suppressed} 条同类日志）"
+        if window[1] >= self.limit:
+            window[2] += 1
+            return
+        window[1] += 1
+        self._logger.log(level, msg, *args, stacklevel=2)
+
+    def warning(self, key: str, msg: str, *args):
+        self.log(logging.WARNING, key, msg, *args)
+
+    def info(self, key: str, msg: str, *args):
+        self.log(logging.INFO, key, msg, *args)
+
+
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-# 创建一个控制台处理器，将日志输出到控制台
+logger.setLevel(LOGGING['LEVEL'])
+logger.propagate = False
+# 日志先写入内存队列，由后台线程格式化并输出到控制台，事件循环不会因 stdout 阻塞
 console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.DEBUG)
-# 定义日志格式
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+if LOGGING['FORMAT'] == 'json':
+    formatter = JsonFormatter()
+else:
+    formatter = _TextFormatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s%(context)s')
 console_handler.setFormatter(formatter)
-# 将处理器添加到日志记录器
-logger.addHandler(console_handler)
+queue_handler = _DroppingQueueHandler(queue.Queue(LOGGING['QUEUE_SIZE']))
+queue_handler.addFilter(_ContextFilter())
+logger.addHandler(queue_handler)
+log_listener = QueueListener(queue_handler.queue, console_handler, respect_handler_level=True)
+log_listener.start()
+# 进程退出前输出队列中剩余的日志
+atexit.register(log_listener.stop)
+
+sampled_logger = SampledLogger(logger)
+
+def process_uptime() -> float:
+    """进程启动至今的秒数（Linux 读取 /proc，其他平台从本模块导入时算起）"""
+    try:
+        with open('/proc/self/stat') as f:
+            # 进程名可能包含空格，从最后一个右括号之后开始按空格切分
+            fields = f.read().rsplit(')', 1)[1].split()
+        start_ticks = int(fields[19])
+        with open('/proc/uptime') as f:
+            system_uptime = float(f.read().split()[0])
+        return system_uptime - start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return time.monotonic() - _IMPORTED_AT
+
 
 def mark_initialized(component: str, force: bool = False) -> bool:
     """标记组件为已初始化状态